@@ -10,9 +10,19 @@ setup(name="ximc_device",
       author="timerke",
       author_email="timerke@mail.ru",
       packages=find_packages(),
+      entry_points={
+          "console_scripts": [
+              "ximc-device=ximc_device.cli:main",
+          ],
+      },
+      extras_require={
+          "arrow": ["pyarrow"],
+          "pandas": ["pandas"],
+      },
       install_requires=[
           "ipympl",
           "libximc",
           "matplotlib",
+          "numpy",
       ],
       python_requires=">=3.6")
@@ -1,6 +1,26 @@
+from ximc_device.approach import ApproachPlan, ApproachPositioner
 from ximc_device.control_panel import ControlPanel
 from ximc_device.device import XimcDevice
+from ximc_device.device_info import DeviceInfo
+from ximc_device.fleet_panel import FleetPanel
+from ximc_device.flyscan import FlyScan, FlyScanBin
+from ximc_device.group import DeviceGroup
+from ximc_device.guard import AxisGuard, GroupGuard, LimitError
+from ximc_device.journal import JournalWriter, ReplayDevice
+from ximc_device.motion import MotionProfile, MoveSettings
 from ximc_device.open_panel import OpenPanel
+from ximc_device.planner import ScanPlan, ScanPlanner
+from ximc_device.poll import PollGovernor, PollProfile
+from ximc_device.simulator import ScaledClock, SimulatedDevice, VirtualClock
+from ximc_device.snapshot import DeviceSnapshot, find_drift
+from ximc_device.status_board import StatusBoardReader, StatusBoardWriter
+from ximc_device.telemetry import Telemetry, TelemetryBuffer
+from ximc_device.watchdog import AlarmLimits, LatencyHistogram, Watchdog
 
 
-__all__ = ["ControlPanel", "OpenPanel", "XimcDevice"]
+__all__ = ["AlarmLimits", "ApproachPlan", "ApproachPositioner", "AxisGuard", "ControlPanel", "DeviceGroup",
+           "DeviceInfo", "DeviceSnapshot", "FleetPanel", "FlyScan", "FlyScanBin", "GroupGuard", "JournalWriter",
+           "LatencyHistogram", "LimitError", "MotionProfile", "MoveSettings", "OpenPanel", "PollGovernor",
+           "PollProfile", "ReplayDevice", "ScaledClock", "ScanPlan", "ScanPlanner", "SimulatedDevice",
+           "StatusBoardReader", "StatusBoardWriter", "Telemetry", "TelemetryBuffer", "VirtualClock", "Watchdog",
+           "XimcDevice", "find_drift"]
@@ -0,0 +1,211 @@
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from ximc_device.motion import estimate_move_time, MoveSettings
+
+
+class ApproachMove(NamedTuple):
+    """
+    Move to one target. If overshoot is not None, the device first moves to
+    overshoot position and then approaches the target from the required side.
+    """
+
+    target: float
+    overshoot: Optional[float]
+    time: float
+
+
+class ApproachPlan(NamedTuple):
+    """
+    Plan of positioning through sequence of targets with backlash compensation.
+    Baseline time is the time of positioning in which every target is approached
+    with extra move (as fixed-side compensation does).
+    """
+
+    moves: List[ApproachMove]
+    direction: int
+    time: float
+    baseline_time: float
+
+    @property
+    def compensations(self) -> int:
+        """
+        :return: number of extra moves in plan.
+        """
+
+        return sum(1 for move in self.moves if move.overshoot is not None)
+
+    @property
+    def time_saved(self) -> float:
+        """
+        :return: predicted time saved compared to baseline in seconds.
+        """
+
+        return self.baseline_time - self.time
+
+
+class ApproachPositioner:
+    """
+    Class moves device through sequence of targets so that every target is
+    approached from the same side, which removes backlash (play) from
+    positioning error. Unlike play compensation of controller, the approach
+    side is chosen by looking at the whole sequence of targets, and extra move
+    is made only if the device comes to target from the wrong side.
+    Play compensation of controller (ENGINE_ANTIPLAY flag) must be disabled.
+    All positions are in steps.
+    """
+
+    def __init__(self, device, backlash: float, overshoot: Optional[float] = None,
+                 approach_speed: Optional[float] = None, direction: Optional[int] = None) -> None:
+        """
+        :param device: XimcDevice or SimulatedDevice;
+        :param backlash: backlash in steps;
+        :param overshoot: distance from target to overshoot position, by default it is equal to backlash;
+        :param approach_speed: speed of the final approach after overshoot in steps/sec, by default
+        usual speed is used;
+        :param direction: 1 to approach targets moving to the right, -1 moving to the left, if None
+        then direction is chosen for each sequence of targets.
+        """
+
+        if direction not in (None, 1, -1):
+            raise ValueError("Direction must be 1, -1 or None")
+        self._approach_speed: Optional[float] = approach_speed
+        self._backlash: float = abs(backlash)
+        self._device = device
+        self._direction: Optional[int] = direction
+        self._last_direction: int = 0
+        self._overshoot: float = abs(overshoot) if overshoot is not None else self._backlash
+
+    def _get_approach_settings(self, settings: MoveSettings) -> MoveSettings:
+        """
+        :param settings: usual motion settings.
+        :return: motion settings for the final approach.
+        """
+
+        if self._approach_speed is None:
+            return settings
+        return settings._replace(speed=self._approach_speed)
+
+    def _get_state(self) -> Tuple[float, int]:
+        """
+        :return: current position in steps and direction of the current motion (1, -1 or 0).
+        """
+
+        params = self._device.get_params()
+        if not params:
+            raise RuntimeError("Failed to read status of device")
+        speed = params["speed"]
+        return params["position"], (speed > 0) - (speed < 0)
+
+    def _move(self, position: float, timeout: Optional[float]) -> None:
+        """
+        Method moves device to position and waits for the end of motion.
+        :param position: position in steps;
+        :param timeout: maximum time of motion in seconds.
+        """
+
+        self._device.move_to_position(int(round(position)))
+        if not self._device.wait_for_stop(timeout):
+            self._device.stop_motion()
+            raise TimeoutError(f"Device did not reach position {position} in {timeout} sec")
+
+    def _plan(self, targets: Sequence[float], settings: MoveSettings, position: Optional[float],
+              last_direction: Optional[int]) -> ApproachPlan:
+        """
+        :param targets: targets in steps;
+        :param settings: motion settings;
+        :param position: start position or None for current position of device;
+        :param last_direction: direction of the last motion or None to determine it.
+        :return: the fastest plan.
+        """
+
+        if position is None or last_direction is None:
+            current_position, current_direction = self._get_state()
+            position = current_position if position is None else position
+            if last_direction is None:
+                last_direction = current_direction or self._last_direction
+        directions = (self._direction,) if self._direction else (1, -1)
+        plans = [self._plan_for_direction(targets, position, last_direction, direction, settings)
+                 for direction in directions]
+        return min(plans, key=lambda plan: plan.time)
+
+    def _plan_for_direction(self, targets: Sequence[float], position: float, last_direction: int,
+                            direction: int, settings: MoveSettings) -> ApproachPlan:
+        """
+        :param targets: targets;
+        :param position: current position;
+        :param last_direction: direction of the last motion (0 if unknown);
+        :param direction: approach direction;
+        :param settings: motion settings.
+        :return: plan for given approach direction.
+        """
+
+        approach_settings = self._get_approach_settings(settings)
+        moves = []
+        total_time = 0
+        baseline_time = 0
+        for target in targets:
+            overshoot_position = target - direction * self._overshoot
+            compensated_time = estimate_move_time(overshoot_position - position, settings, False)
+            compensated_time += estimate_move_time(target - overshoot_position, approach_settings, False)
+            baseline_time += compensated_time
+            distance = target - position
+            # After reversal the play is taken up only by a move not shorter than backlash
+            takes_up_play = last_direction == direction or distance * direction >= self._backlash
+            if (distance * direction > 0 and takes_up_play) or (distance == 0 and last_direction == direction):
+                move = ApproachMove(target, None, estimate_move_time(distance, settings, False))
+            else:
+                move = ApproachMove(target, overshoot_position, compensated_time)
+            moves.append(move)
+            total_time += move.time
+            position = target
+            last_direction = direction
+        return ApproachPlan(moves, direction, total_time, baseline_time)
+
+    def plan(self, targets: Sequence[float], position: Optional[float] = None,
+             last_direction: Optional[int] = None) -> ApproachPlan:
+        """
+        Method plans positioning through targets without moving device.
+        :param targets: targets in steps;
+        :param position: start position, by default the current position of device;
+        :param last_direction: direction of the last motion (1, -1 or 0 if unknown), by default it
+        is determined from the current speed of device or from the previous run.
+        :return: plan.
+        """
+
+        settings = self._device.get_move_settings()
+        if settings is None:
+            raise RuntimeError("Failed to read motion settings of device")
+        return self._plan(targets, settings, position, last_direction)
+
+    def run(self, targets: Sequence[float], callback=None, timeout: Optional[float] = None) -> ApproachPlan:
+        """
+        Method moves device through targets. After each target is reached, callback
+        is called with the index of target and target position.
+        :param targets: targets in steps;
+        :param callback: function to call in each target (for example, to make measurement);
+        :param timeout: maximum time of one move in seconds.
+        :return: executed plan.
+        """
+
+        settings = self._device.get_move_settings()
+        if settings is None:
+            raise RuntimeError("Failed to read motion settings of device")
+        if settings.antiplay:
+            raise RuntimeError("Play compensation of controller must be disabled")
+        plan = self._plan(targets, settings, None, None)
+        approach_settings = self._get_approach_settings(settings)
+        for index, move in enumerate(plan.moves):
+            if move.overshoot is not None:
+                self._move(move.overshoot, timeout)
+                if approach_settings is not settings:
+                    self._device.set_move_settings(approach_settings)
+                try:
+                    self._move(move.target, timeout)
+                finally:
+                    if approach_settings is not settings:
+                        self._device.set_move_settings(settings)
+            elif move.time:
+                self._move(move.target, timeout)
+            self._last_direction = plan.direction
+            if callback:
+                callback(index, move.target)
+        return plan
@@ -0,0 +1,155 @@
+import math
+import threading
+import time
+from typing import Any, List, NamedTuple, Sequence
+import numpy as np
+from ximc_device.telemetry import STEPS_CHANNELS, Telemetry, USER_UNIT_CHANNELS
+
+
+# Channels of captured samples. "slot" is the number of sample in schedule (slots of missed samples
+# are absent), "time" is the time of sample in seconds from the start of capture
+STEPS_DTYPE = np.dtype([("slot", np.uint32), ("time", np.float64)] + STEPS_CHANNELS)
+USER_UNIT_DTYPE = np.dtype([("slot", np.uint32), ("time", np.float64)] + USER_UNIT_CHANNELS)
+SPIN_TIME: float = 0.002
+START_DELAY: float = 0.05
+
+
+class CaptureStats(NamedTuple):
+    """
+    Statistics of capture. Jitter is difference between real and scheduled time of sample.
+    """
+
+    samples: int
+    missed: int
+    rate: float
+    jitter_mean: float
+    jitter_std: float
+    jitter_max: float
+
+
+def wait_until(moment: float) -> None:
+    """
+    Function sleeps until given moment of time.perf_counter. The last SPIN_TIME
+    seconds are spent in loop that only releases GIL, because sleep is not
+    precise enough.
+    :param moment: moment to wait for.
+    """
+
+    remaining = moment - time.perf_counter()
+    if remaining > SPIN_TIME:
+        time.sleep(remaining - SPIN_TIME)
+    while time.perf_counter() < moment:
+        time.sleep(0)
+
+
+def _capture_loop(device, start: float, rate: float, slots: int, in_user_unit: bool, data: Telemetry) -> int:
+    """
+    Function reads status of device by schedule and writes samples to array.
+    Time of each slot is counted from the start, so delays do not accumulate.
+    If reading takes longer than period, the slots that have already passed are
+    skipped.
+    :param device: device;
+    :param start: moment of time.perf_counter when capture starts;
+    :param rate: number of samples per second;
+    :param slots: number of slots in schedule;
+    :param in_user_unit: if True then position and speed are read in user unit;
+    :param data: telemetry for samples, its length must be not less than number of slots.
+    :return: number of captured samples.
+    """
+
+    period = 1 / rate
+    slot_column = data["slot"]
+    time_column = data["time"]
+    columns = [(name, data[name]) for name in data.channels if name not in ("slot", "time")]
+    read = device.get_params_in_user_unit if in_user_unit else device.get_params
+    count = 0
+    slot = 0
+    while slot < slots:
+        wait_until(start + slot * period)
+        sample_time = time.perf_counter()
+        params = read()
+        if params:
+            slot_column[count] = slot
+            time_column[count] = sample_time - start
+            for name, column in columns:
+                column[count] = params[name]
+            count += 1
+        slot += 1
+        late_slot = int((time.perf_counter() - start) / period)
+        if late_slot > slot:
+            slot = late_slot
+    return count
+
+
+def capture(device, duration: float, rate: float, in_user_unit: bool = False) -> Telemetry:
+    """
+    Function captures status of device with fixed rate.
+    :param device: device (XimcDevice or SimulatedDevice);
+    :param duration: duration of capture in seconds;
+    :param rate: number of samples per second;
+    :param in_user_unit: if True then position and speed are read in user unit.
+    :return: telemetry with samples (see STEPS_DTYPE and USER_UNIT_DTYPE).
+    """
+
+    return capture_many([device], duration, rate, in_user_unit)[0]
+
+
+def capture_many(devices: Sequence[Any], duration: float, rate: float, in_user_unit: bool = False
+                 ) -> List[Telemetry]:
+    """
+    Function captures status of several devices with one time base: every device
+    is read in its own thread by the same schedule, so samples with the same slot
+    are taken at the same moment.
+    :param devices: devices;
+    :param duration: duration of capture in seconds;
+    :param rate: number of samples per second;
+    :param in_user_unit: if True then position and speed are read in user unit.
+    :return: telemetry with samples for each device.
+    """
+
+    if rate <= 0 or duration < 0:
+        raise ValueError("Rate must be positive and duration must be non-negative")
+    slots = int(math.floor(duration * rate)) + 1
+    dtype = USER_UNIT_DTYPE if in_user_unit else STEPS_DTYPE
+    arrays = [Telemetry.empty(dtype, slots) for _ in devices]
+    counts = [0] * len(devices)
+    start = time.perf_counter() + START_DELAY
+
+    def run(index: int) -> None:
+        counts[index] = _capture_loop(devices[index], start, rate, slots, in_user_unit, arrays[index])
+
+    if len(devices) == 1:
+        run(0)
+    else:
+        threads = [threading.Thread(target=run, args=(index,), daemon=True) for index in range(len(devices))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    # Slicing returns views, samples are not copied
+    return [array[:count] for array, count in zip(arrays, counts)]
+
+
+def capture_stats(data: Telemetry, rate: float, duration: float = None) -> CaptureStats:
+    """
+    Function calculates statistics of capture.
+    :param data: captured samples;
+    :param rate: scheduled number of samples per second;
+    :param duration: duration of capture, if given then missed samples at the end are counted too.
+    :return: statistics.
+    """
+
+    if duration is not None:
+        slots = int(math.floor(duration * rate)) + 1
+    else:
+        slots = int(data["slot"][-1]) + 1 if len(data) else 0
+    if not len(data):
+        return CaptureStats(0, slots, 0, 0, 0, 0)
+    jitter = data["time"] - data["slot"] / rate
+    elapsed = data["time"][-1] - data["time"][0]
+    return CaptureStats(samples=len(data),
+                        missed=slots - len(data),
+                        rate=float((len(data) - 1) / elapsed) if elapsed > 0 else 0,
+                        jitter_mean=float(jitter.mean()),
+                        jitter_std=float(jitter.std()),
+                        jitter_max=float(np.abs(jitter).max()))
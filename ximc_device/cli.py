@@ -0,0 +1,425 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any, Callable, Dict, List, Optional, TextIO
+from ximc_device import utils as ut
+from ximc_device.device import XimcDevice
+from ximc_device.journal import ReplayDevice
+from ximc_device.motion import MVCMD_RUNNING
+from ximc_device.poll import PollGovernor
+from ximc_device.simulator import SimulatedDevice
+
+
+def _open_device(device_uri: str, multiplier: Optional[float] = None, init_virtual: bool = False):
+    """
+    Function opens device by URI. URI with xi-sim scheme opens simulated device,
+    URI with xi-emu scheme opens virtual controller, URI with xi-replay scheme
+    replays journal (for example, xi-replay:///path/to/journal?speed=10).
+    :param device_uri: URI of device;
+    :param multiplier: number of steps in user unit;
+    :param init_virtual: if True then settings and position of virtual controller are
+    initialized (see XimcDevice), otherwise virtual controller is opened as it is.
+    :return: opened device or None if device failed to open.
+    """
+
+    if device_uri.startswith("xi-sim:"):
+        device = SimulatedDevice(device_uri, True, multiplier)
+    elif device_uri.startswith("xi-replay:"):
+        parts = urllib.parse.urlsplit(device_uri)
+        speed = urllib.parse.parse_qs(parts.query).get("speed", ["1"])[0]
+        device = ReplayDevice(parts.path, speed=float(speed) or None, user_multiplier=multiplier)
+    else:
+        device = XimcDevice(device_uri, init_virtual and device_uri.startswith("xi-emu:"), multiplier)
+    if device.device_id <= 0:
+        print(f"Failed to open device {device_uri}", file=sys.stderr)
+        return None
+    return device
+
+
+def _positive_float(value: str) -> float:
+    """
+    Function converts argument of command line to positive number.
+    :param value: text of argument.
+    :return: number.
+    """
+
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid float value: {value!r}")
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"value must be positive: {value!r}")
+    return number
+
+
+def _run_parallel(func: Callable[[str], Any], items: List[str], jobs: int) -> List[Any]:
+    """
+    Function calls function for all items in thread pool.
+    :param func: function to call;
+    :param items: arguments for function;
+    :param jobs: maximum number of threads.
+    :return: results in the order of items.
+    """
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(jobs, len(items)))) as executor:
+        return list(executor.map(func, items))
+
+
+def _write_json(data: Any) -> None:
+    json.dump(data, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+def _get_info(device_uri: str) -> Optional[Dict[str, str]]:
+    """
+    :param device_uri: URI of device.
+    :return: dictionary with full information about device or None if device failed to open.
+    """
+
+    device = _open_device(device_uri)
+    if device is None:
+        return None
+    try:
+        return dict(device.get_device_full_info() or [])
+    finally:
+        device.close_device()
+
+
+def scan(args: argparse.Namespace) -> int:
+    """
+    Command searches for controllers. Enumerations with different hints are done in parallel.
+    """
+
+    results = _run_parallel(lambda hint: ut.find_devices(hint, include_virtual=False), args.hints, args.jobs)
+    found_devices = []
+    for devices in results:
+        for device in devices:
+            if device not in found_devices:
+                found_devices.append(device)
+    if args.virtual:
+        found_devices.append(("virtual", ut.get_virtual_device_uri()))
+
+    data = [{"type": device_type, "uri": device_uri} for device_type, device_uri in found_devices]
+    if args.info:
+        for item, device_info in zip(data, _run_parallel(_get_info, [item["uri"] for item in data], args.jobs)):
+            item["info"] = device_info
+    _write_json(data)
+    return 0
+
+
+def info(args: argparse.Namespace) -> int:
+    """
+    Command prints full information about controllers. Controllers are queried in parallel.
+    """
+
+    results = _run_parallel(_get_info, args.uris, args.jobs)
+    _write_json(dict(zip(args.uris, results)))
+    return 0 if all(result is not None for result in results) else 1
+
+
+def move(args: argparse.Namespace) -> int:
+    """
+    Command starts motion to given position and optionally waits for its end.
+    """
+
+    device = _open_device(args.uri, args.multiplier, args.init_virtual)
+    if device is None:
+        return 1
+    try:
+        if args.multiplier:
+            device.move_to_position_in_user_unit(args.position)
+        else:
+            device.move_to_position(int(args.position))
+        stopped = device.wait_for_stop(args.timeout) if args.wait else True
+        position = device.get_position_in_user_unit() if args.multiplier else device.get_position()
+        _write_json({"uri": args.uri, "position": position, "stopped": stopped})
+        return 0 if stopped else 2
+    finally:
+        device.close_device()
+
+
+def wait(args: argparse.Namespace) -> int:
+    """
+    Command waits until controller stops.
+    """
+
+    device = _open_device(args.uri)
+    if device is None:
+        return 1
+    try:
+        return 0 if device.wait_for_stop(args.timeout) else 2
+    finally:
+        device.close_device()
+
+
+def monitor(args: argparse.Namespace) -> int:
+    """
+    Command prints status of controllers with given rate in CSV or JSON lines format.
+    """
+
+    devices = [_open_device(device_uri, args.multiplier) for device_uri in args.uris]
+    if any(device is None for device in devices):
+        for device in devices:
+            if device is not None:
+                device.close_device()
+        return 1
+
+    output: TextIO = open(args.output, "w", newline="") if args.output else sys.stdout
+    writer = None
+    interval = 1 / args.rate
+    start = time.monotonic()
+    sample_index = 0
+    try:
+        while args.count is None or sample_index < args.count:
+            now = time.monotonic()
+            if args.duration is not None and now - start > args.duration:
+                break
+            for device in devices:
+                params = device.get_params_in_user_unit() if args.multiplier else device.get_params()
+                if not params:
+                    continue
+                row = {"time": round(now - start, 6), "uri": device.device_uri, **params}
+                if args.format == "jsonl":
+                    output.write(json.dumps(row) + "\n")
+                else:
+                    if writer is None:
+                        writer = csv.DictWriter(output, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+            output.flush()
+            sample_index += 1
+            # The next sample time is counted from the start so that delays do not accumulate
+            time.sleep(max(start + sample_index * interval - time.monotonic(), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        for device in devices:
+            device.close_device()
+    return 0
+
+
+def _measure_throughput(func: Callable[[], Any], threads: int, count: int) -> Dict[str, Any]:
+    """
+    Function calls function from several threads at the same time.
+    :param func: function to call;
+    :param threads: number of threads;
+    :param count: number of calls in each thread.
+    :return: dictionary with total throughput and number of failed calls (calls that
+    returned empty result or raised exception).
+    """
+
+    barrier = threading.Barrier(threads + 1)
+
+    def worker() -> int:
+        failed = 0
+        barrier.wait()
+        for _ in range(count):
+            try:
+                if not func():
+                    failed += 1
+            except Exception:
+                failed += 1
+        return failed
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(worker) for _ in range(threads)]
+        barrier.wait()
+        start = time.perf_counter()
+        failed = sum(future.result() for future in futures)
+        total = time.perf_counter() - start
+    return {"threads": threads,
+            "calls": threads * count,
+            "calls_per_sec": threads * count / total if total else None,
+            "failed": failed}
+
+
+def bench(args: argparse.Namespace) -> int:
+    """
+    Command measures latency and throughput of status requests. With --threads the
+    status is requested from several threads at once to check how throughput scales.
+    """
+
+    device = _open_device(args.uri)
+    if device is None:
+        return 1
+    try:
+        functions = {"get_params": device.get_params,
+                     "get_position": device.get_position,
+                     "check_moving": device.check_moving}
+        data = {}
+        for name, func in functions.items():
+            latencies = []
+            start = time.perf_counter()
+            for _ in range(args.count):
+                call_start = time.perf_counter()
+                func()
+                latencies.append(time.perf_counter() - call_start)
+            total = time.perf_counter() - start
+            latencies.sort()
+            data[name] = {"calls": args.count,
+                          "calls_per_sec": args.count / total if total else None,
+                          "min_ms": latencies[0] * 1000,
+                          "mean_ms": statistics.mean(latencies) * 1000,
+                          "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+                          "max_ms": latencies[-1] * 1000}
+        scaling = {}
+        if args.threads:
+            # get_params goes to controller under command lock, get_latest_params reads the last status
+            for name, func in (("get_params", device.get_params),
+                               ("get_latest_params", lambda: device.get_latest_params(max_age=0.01))):
+                scaling[name] = [_measure_throughput(func, threads, args.count) for threads in args.threads]
+        _write_json({"uri": args.uri, "results": data, "scaling": scaling})
+        return 0
+    finally:
+        device.close_device()
+
+
+def _print_motion(device: XimcDevice, governor: PollGovernor, duration: Optional[float] = None,
+                  print_period: float = 0.5, target: Optional[float] = None) -> None:
+    """
+    Function polls status of moving device with period chosen by governor and prints
+    position when phase of motion changes or print period has passed.
+    :param device: device;
+    :param governor: governor of status polling;
+    :param duration: if given then motion is stopped after this number of seconds;
+    :param print_period: minimum period of printing in seconds;
+    :param target: target position in user unit, if given then governor polls fast before deceleration.
+    """
+
+    start = time.monotonic()
+    last_print = None
+    last_phase = None
+    governor.reset()
+    governor.set_target(target)
+    while True:
+        params = device.get_params_in_user_unit()
+        governor.update(params)
+        if not params or not params["moving_status"] & MVCMD_RUNNING:
+            return
+        now = time.monotonic()
+        if governor.phase != last_phase or now - last_print >= print_period:
+            print(f"\tMoving to {params['position']:.3f} ({governor.phase}, polling at {governor.rate:.1f} Hz)")
+            last_print = now
+            last_phase = governor.phase
+        if duration is not None and now - start > duration:
+            device.stop_motion()
+            duration = None
+        time.sleep(governor.period)
+
+
+def demo(args: argparse.Namespace) -> int:
+    """
+    Command opens the first found controller and moves it.
+    """
+
+    devices_type_and_uri = ut.search_devices()
+    if not devices_type_and_uri:
+        return 0
+
+    is_virtual = devices_type_and_uri[0][0].lower() == "virtual"
+    device = XimcDevice(devices_type_and_uri[0][1], is_virtual)
+    ut.print_device_info(device)
+
+    governor = PollGovernor(device.device_uri)
+    for position in (5, -13):
+        print(f"\nPosition before moving to position {position:.3f}: {device.get_position_in_user_unit():.3f}")
+        device.move_to_position_in_user_unit(position)
+        _print_motion(device, governor, target=position)
+        print(f"Position after moving to position {position:.3f}: {device.get_position_in_user_unit():.3f}")
+
+    print(f"\nPosition before moving to right {device.get_position_in_user_unit():.3f}")
+    device.move_right()
+    _print_motion(device, governor, 4)
+
+    device.close_device()
+    return 0
+
+
+def create_parser() -> argparse.ArgumentParser:
+    """
+    :return: parser of command line arguments.
+    """
+
+    parser = argparse.ArgumentParser(prog="ximc-device", description="Command line tool to work with XIMC controllers")
+    parser.add_argument("--jobs", type=int, default=8, help="maximum number of controllers queried in parallel")
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser_scan = subparsers.add_parser("scan", help="search for controllers")
+    parser_scan.add_argument("--hint", dest="hints", action="append",
+                             help="hint string for enumeration, can be given several times (default: addr=)")
+    parser_scan.add_argument("--info", action="store_true", help="read full information about found controllers")
+    parser_scan.add_argument("--virtual", action="store_true", help="add virtual controller to results")
+    parser_scan.set_defaults(func=scan)
+
+    parser_info = subparsers.add_parser("info", help="print full information about controllers")
+    parser_info.add_argument("uris", nargs="+", help="URI of controllers")
+    parser_info.set_defaults(func=info)
+
+    parser_move = subparsers.add_parser("move", help="move controller to position")
+    parser_move.add_argument("uri", help="URI of controller")
+    parser_move.add_argument("position", type=float, help="position in steps (or in user units with --multiplier)")
+    parser_move.add_argument("--multiplier", type=float, help="number of steps in user unit")
+    parser_move.add_argument("--wait", action="store_true", help="wait for the end of motion")
+    parser_move.add_argument("--timeout", type=float, help="maximum time to wait in seconds")
+    parser_move.add_argument("--init-virtual", action="store_true",
+                             help="initialize settings and position of virtual controller (xi-emu) before moving")
+    parser_move.set_defaults(func=move)
+
+    parser_wait = subparsers.add_parser("wait", help="wait until controller stops")
+    parser_wait.add_argument("uri", help="URI of controller")
+    parser_wait.add_argument("--timeout", type=float, help="maximum time to wait in seconds")
+    parser_wait.set_defaults(func=wait)
+
+    parser_monitor = subparsers.add_parser("monitor", help="print status of controllers with given rate")
+    parser_monitor.add_argument("uris", nargs="+", help="URI of controllers")
+    parser_monitor.add_argument("--rate", type=_positive_float, default=10, help="number of samples per second")
+    parser_monitor.add_argument("--duration", type=float, help="duration of monitoring in seconds")
+    parser_monitor.add_argument("--count", type=int, help="number of samples")
+    parser_monitor.add_argument("--format", choices=("csv", "jsonl"), default="csv", help="output format")
+    parser_monitor.add_argument("--output", help="output file (default: stdout)")
+    parser_monitor.add_argument("--multiplier", type=float, help="number of steps in user unit")
+    parser_monitor.set_defaults(func=monitor)
+
+    parser_bench = subparsers.add_parser("bench", help="measure latency of status requests")
+    parser_bench.add_argument("uri", help="URI of controller")
+    parser_bench.add_argument("--count", type=int, default=1000, help="number of requests of each type")
+    parser_bench.add_argument("--threads", type=int, nargs="+",
+                              help="numbers of threads to check throughput scaling (for example, 1 2 4 8)")
+    parser_bench.set_defaults(func=bench)
+
+    parser_demo = subparsers.add_parser("demo", help="open the first found controller and move it")
+    parser_demo.set_defaults(func=demo)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Entry point of ximc-device command.
+    :param argv: command line arguments.
+    :return: exit code.
+    """
+
+    logging.basicConfig(format="[%(asctime)s %(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S",
+                        level=logging.WARNING)
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 1
+    if getattr(args, "hints", False) is None:
+        args.hints = ["addr="]
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
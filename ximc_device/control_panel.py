@@ -1,13 +1,18 @@
+import math
 import queue
 import threading
 import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Optional, Sequence
 import ipywidgets as widgets
 import matplotlib.pyplot as plt
 from IPython.display import clear_output, display
 from ximc_device import utils as ut
+from ximc_device.guard import LimitError
+from ximc_device.motion import estimate_move_time, MVCMD_RUNNING
 from ximc_device.open_panel import OpenPanel
+from ximc_device.poll import PollGovernor
+from ximc_device.telemetry import TelemetryBuffer
 
 
 class ControlPanel:
@@ -31,6 +36,14 @@ class ControlPanel:
         if self._open_panel:
             self._open_panel.set_control_panel(self)
 
+    @property
+    def telemetry(self) -> TelemetryBuffer:
+        """
+        :return: buffer with telemetry of the last motion.
+        """
+
+        return self._figures_thread.telemetry
+
     def _check_device(self) -> bool:
         """
         Method checks that the device is open and can be operated.
@@ -46,6 +59,43 @@ class ControlPanel:
             ut.print_flush("To move motor, you must first open device")
         return False
 
+    def _predict_duration(self, position: float) -> Optional[float]:
+        """
+        :param position: target position in user unit.
+        :return: expected duration of motion from current position to target in seconds
+        or None if motion settings or current position are not available.
+        """
+
+        device = self._open_panel.device
+        move_settings = device.get_move_settings()
+        current_position = device.get_position_in_user_unit()
+        if move_settings is None or current_position is None:
+            return None
+        distance = (position - current_position) * device.user_multiplier
+        return estimate_move_time(distance, move_settings)
+
+    def _check_limits(self, position: float) -> bool:
+        """
+        Method checks motion to position with soft limits of device.
+        :param position: target position in user unit.
+        :return: True if motion is allowed.
+        """
+
+        device = self._open_panel.device
+        if device.guard is None:
+            return True
+        try:
+            current_position = device.get_position()
+            if current_position is None:
+                raise LimitError("Failed to read position to check soft limits")
+            device.guard.check_move(current_position, position * device.user_multiplier)
+        except LimitError as exc:
+            with self.output:
+                clear_output(wait=True)
+                ut.print_flush(f"Motion is forbidden: {exc}")
+            return False
+        return True
+
     def _create_widgets(self) -> widgets.VBox:
         """
         Method creates widgets for control panel.
@@ -92,12 +142,21 @@ class ControlPanel:
         """
 
         if self._check_device():
-            self._open_panel.device.stop_motion()
             shift = self.int_text_widget_shift.value
             current_position = self._open_panel.device.get_position_in_user_unit()
+            if current_position is None:
+                with self.output:
+                    clear_output(wait=True)
+                    ut.print_flush("Failed to read position to move on shift")
+                return
             position_to_move = current_position + shift
+            # Rejected target must not change state of device, so motion is stopped only after check
+            if not self._check_limits(position_to_move):
+                return
+            self._open_panel.device.stop_motion()
             self._figures_thread.add_task(self._open_panel.device.move_to_position_in_user_unit, position_to_move,
-                                          device=self._open_panel.device)
+                                          device=self._open_panel.device, target=position_to_move,
+                                          duration=self._predict_duration(position_to_move))
 
     def move_right(self) -> None:
         """
@@ -115,10 +174,23 @@ class ControlPanel:
         """
 
         if self._check_device():
-            self._open_panel.device.stop_motion()
             position = self.int_text_widget_position.value
+            if not self._check_limits(position):
+                return
+            self._open_panel.device.stop_motion()
             self._figures_thread.add_task(self._open_panel.device.move_to_position_in_user_unit, position,
-                                          device=self._open_panel.device)
+                                          device=self._open_panel.device, target=position,
+                                          duration=self._predict_duration(position))
+
+    def set_limits(self, left: float, right: float) -> None:
+        """
+        Method sets bounds of widget with position to soft limits of device.
+        :param left: left limit in user unit;
+        :param right: right limit in user unit.
+        """
+
+        self.int_text_widget_position.min = math.ceil(left) if math.isfinite(left) else -1000
+        self.int_text_widget_position.max = math.floor(right) if math.isfinite(right) else 1000
 
     def set_user_unit(self, user_unit: str) -> None:
         """
@@ -134,18 +206,27 @@ class ControlPanel:
 
     def stop_motion(self) -> None:
         """
-        Method stops motion.
+        Method stops motion. Stop command does not wait for the current task of
+        device, so button works while long command is executed.
         """
 
         if self._check_device():
-            self._open_panel.device.stop_motion()
+            self._open_panel.device.emergency_stop()
 
 
 class FiguresOutput:
     """
     Class performs device movement tasks and draws graphs in a separate thread.
+    During motion status is polled with period chosen by PollGovernor. Buffer of
+    telemetry is enlarged (up to MAX_CAPACITY samples) when expected duration of
+    motion to position is longer than buffer holds at the fastest polling. Duration
+    of continuous motion (to left or right) is unknown, so for long motion only the
+    last samples are kept and figures show the end of motion.
     """
 
+    DRAW_PERIOD: float = 0.5
+    MAX_CAPACITY: int = 500000
+
     def __init__(self, user_unit: str) -> None:
         """
         :param user_unit: user unit (for example, mm, deg).
@@ -153,8 +234,9 @@ class FiguresOutput:
 
         self._user_unit: str = user_unit
         self._axs: Dict[str, Any] = None
-        self._lock: threading.Lock = threading.Lock()
+        self._governor: PollGovernor = PollGovernor()
         self._running: bool = False
+        self._telemetry: TelemetryBuffer = TelemetryBuffer()
         self._tasks: queue.Queue = queue.Queue()
         self._thread: threading.Thread = threading.Thread(target=self.run_thread)
         self._create_figs()
@@ -167,26 +249,37 @@ class FiguresOutput:
 
         return self._box
 
+    @property
+    def poll_rate(self) -> float:
+        """
+        :return: effective rate of status polling during the last motion (requests per second).
+        """
+
+        return self._governor.rate
+
+    @property
+    def telemetry(self) -> TelemetryBuffer:
+        """
+        :return: buffer with telemetry of the last motion in user unit, time is counted from the start of motion.
+        """
+
+        return self._telemetry
+
     def _create_figs(self) -> None:
         """
         Method creates matplotlib figures and places them on ipywidgets.
         """
 
         self._data = {"position": {"y_label": "Position, {}",
-                                   "color": "red",
-                                   "values": []},
+                                   "color": "red"},
                       "speed": {"y_label": "Speed, {}/sec",
-                                "color": "orange",
-                                "values": []},
+                                "color": "orange"},
                       "power_current": {"y_label": "Current, mA",
-                                        "color": "green",
-                                        "values": []},
+                                        "color": "green"},
                       "power_voltage": {"y_label": "Voltage, V",
-                                        "color": "blue",
-                                        "values": []},
+                                        "color": "blue"},
                       "temperature": {"y_label": "Temperature, °C",
-                                      "color": "purple",
-                                      "values": []}}
+                                      "color": "purple"}}
         plt.ioff()
         self._figs = {}
         self._axs = {}
@@ -208,8 +301,22 @@ class FiguresOutput:
         h_box_2 = widgets.HBox([self._figs["power_current"].canvas, self._figs["power_voltage"].canvas])
         self._box = widgets.VBox([h_box_1, h_box_2, self._figs["temperature"].canvas])
 
+    def _draw(self) -> None:
+        """
+        Method draws telemetry of motion on figures.
+        """
+
+        data = self._telemetry.view()
+        times = data["time"]
+        for param_name in self._data:
+            values = data[param_name]
+            self._axs[param_name].lines[0].set_data(times, values)
+            self._axs[param_name].set_xlim([-1, times[-1] + 1])
+            self._axs[param_name].set_ylim([self._get_min_limit(values), self._get_max_limit(values)])
+            plt.draw()
+
     @staticmethod
-    def _get_max_limit(values: List[float]) -> float:
+    def _get_max_limit(values: Sequence[float]) -> float:
         """
         Method returns upper bound for list of numbers.
         :param values: list of numbers.
@@ -224,7 +331,7 @@ class FiguresOutput:
         return 1.1 * max_value
 
     @staticmethod
-    def _get_min_limit(values: List[float]) -> float:
+    def _get_min_limit(values: Sequence[float]) -> float:
         """
         Method returns lower bound for list of numbers.
         :param values: list of numbers.
@@ -238,6 +345,22 @@ class FiguresOutput:
             return -1
         return 0.9 * min_value
 
+    def _prepare_telemetry(self, duration: Optional[float]) -> None:
+        """
+        Method clears buffer of telemetry and enlarges it if motion of given duration
+        does not fit in buffer when status is polled with the shortest period.
+        :param duration: expected duration of motion in seconds or None if duration is unknown.
+        """
+
+        if duration is not None and math.isfinite(duration):
+            # Reserve for time of status requests and draws that are not counted in duration
+            samples = 2 * math.ceil(duration / self._governor.profile.transient_period) + 1
+            capacity = min(samples, self.MAX_CAPACITY)
+            if capacity > self._telemetry.capacity:
+                self._telemetry = TelemetryBuffer(capacity=capacity)
+                return
+        self._telemetry.clear()
+
     def add_task(self, task, *args, **kwargs) -> None:
         """
         Method adds new task to do.
@@ -246,37 +369,46 @@ class FiguresOutput:
         :param kwargs: keyword arguments for task function.
         """
 
-        with self._lock:
-            self._tasks.put(lambda: self.do_task(task, *args, **kwargs))
+        self._tasks.put(lambda: self.do_task(task, *args, **kwargs))
 
     def do_task(self, move_function, *args, **kwargs) -> None:
         """
         Method performs task of starting a specific device movement.
         :param move_function: device move function;
         :param args: non-keyword arguments for move function;
-        :param kwargs: keyword arguments for move functions.
+        :param kwargs: keyword arguments for move functions: device, target position in
+        user unit and expected duration of motion in seconds (None if unknown).
         """
 
         device = kwargs["device"]
         start_time = datetime.now()
-        params = device.get_params_in_user_unit()
-        for param_name, param_data in self._data.items():
-            param_data["values"] = [params[param_name]]
-        times = [0]
-        move_function(*args)
-        while device.check_moving():
+        self._governor = PollGovernor(device.device_uri)
+        self._governor.set_target(kwargs.get("target"))
+        self._prepare_telemetry(kwargs.get("duration"))
+        self._telemetry.append(0, device.get_params_in_user_unit())
+        try:
+            move_function(*args)
+        except LimitError:
+            # Target was checked by control panel, but motion became forbidden before the task was started
+            return
+        last_draw = None
+        moving = True
+        while moving:
             device_params = device.get_params_in_user_unit()
+            self._governor.update(device_params)
             if device_params:
+                moving = bool(device_params["moving_status"] & MVCMD_RUNNING)
                 delta_time = datetime.now() - start_time
-                times.append(delta_time.total_seconds())
-                for param_name, param_data in self._data.items():
-                    param_data["values"].append(device_params[param_name])
-                    self._axs[param_name].lines[0].set_data(times, param_data["values"])
-                    self._axs[param_name].set_xlim([-1, max(times) + 1])
-                    self._axs[param_name].set_ylim([self._get_min_limit(param_data["values"]),
-                                                    self._get_max_limit(param_data["values"])])
-                    plt.draw()
-            time.sleep(0.5)
+                self._telemetry.append(delta_time.total_seconds(), device_params)
+            else:
+                moving = device.check_moving()
+            # Status is read as often as governor allows, but figures are redrawn with fixed period
+            draw_due = last_draw is None or time.monotonic() - last_draw >= self.DRAW_PERIOD
+            if len(self._telemetry) and (not moving or draw_due):
+                last_draw = time.monotonic()
+                self._draw()
+            if moving:
+                time.sleep(self._governor.period)
 
     def run_thread(self) -> None:
         """
@@ -284,11 +416,11 @@ class FiguresOutput:
         """
 
         while self._running:
-            with self._lock:
-                if not self._tasks.empty():
-                    task = self._tasks.get()
-                    task()
-            time.sleep(0.5)
+            try:
+                task = self._tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            task()
 
     def set_user_unit(self, user_unit: str) -> None:
         """
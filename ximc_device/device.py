@@ -1,18 +1,27 @@
 import ctypes
 import logging
+import math
 import sys
+import threading
 import time
 from typing import Any, Callable, Dict, List, Optional, Tuple
 import libximc
-from ximc_device import utils as ut
-
-
-logging.basicConfig(format="[%(asctime)s %(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S", level=logging.INFO)
+from ximc_device import capture, utils as ut
+from ximc_device.device_info import DeviceInfo
+from ximc_device.device_logger import DeviceLogger
+from ximc_device.guard import AxisGuard, LimitError
+from ximc_device.journal import JournalWriter
+from ximc_device.motion import microsteps_per_step, MoveSettings
+from ximc_device.snapshot import DeviceSnapshot, fields_to_structure, structure_to_fields
+from ximc_device.status_board import StatusBoardWriter
+from ximc_device.telemetry import Telemetry
 
 
 def check_open(func) -> Callable:
     """
-    Decorator to check if device is on.
+    Decorator to check if device is on. Decorated function is executed under the
+    command lock of device, so commands to one controller from different threads
+    do not overlap. If device has journal, the call is written to it.
     :param func: decorated function.
     """
 
@@ -24,16 +33,21 @@ def check_open(func) -> Callable:
         :return: result of decorated function.
         """
 
-        if self.device_id > 0:
-            return func(self, *args, **kwargs)
-        logging.info("Device not open")
+        with self._lock:
+            if self.device_id > 0:
+                if self._journal is not None:
+                    return self._journal.call(self, func, args, kwargs)
+                return func(self, *args, **kwargs)
+        self.logger.error(func.__name__, None, "Device not open", level=logging.INFO)
 
     return wrapper
 
 
 class XimcDevice:
     """
-    Class to control XIMC controller.
+    Class to control XIMC controller. Object can be used from several threads:
+    libximc calls to one controller are serialized with lock, and the latest
+    received status can be read without waiting for the lock.
     """
 
     ACCEL_IN_STEPS: int = 1
@@ -43,24 +57,40 @@ class XimcDevice:
     CONTROLLER_NAME: str = "VirtualXimc"
     DECEL_IN_STEPS: int = 1
     DECEL_IN_USER_UNIT: float = 1
+    SNAPSHOT_SECTIONS: Tuple[Tuple[str, str, str, str], ...] = (
+        # Engine settings are written first because microstep mode affects other settings
+        ("engine", "engine_settings_t", "get_engine_settings", "set_engine_settings"),
+        ("move", "move_settings_t", "get_move_settings", "set_move_settings"),
+        ("calibration", "calibration_settings_t", "get_calibration_settings", "set_calibration_settings"),
+        ("borders", "edges_settings_t", "get_edges_settings", "set_edges_settings"),
+        ("limits", "secure_settings_t", "get_secure_settings", "set_secure_settings"),
+        ("name", "controller_name_t", "get_controller_name", "set_controller_name"))
     SPEED_IN_STEPS: int = 5
     SPEED_IN_USER_UNIT: float = 5
     UANTIPLAY_SPEED_IN_STEPS: int = 0
     USER_MULTIPLIER: float = 1 / 400
     USPEED_IN_STEPS: int = 0
 
-    def __init__(self, device_uri: str, is_virtual: bool, user_multiplier: float = None, defer_open: bool = False
-                 ) -> None:
+    def __init__(self, device_uri: str, is_virtual: bool, user_multiplier: float = None, defer_open: bool = False,
+                 journal: Optional[JournalWriter] = None) -> None:
         """
         :param device_uri: URI of device to open;
         :param is_virtual: if True then device is virtual;
         :param user_multiplier: coefficient for converting motor steps to user unit;
-        :param defer_open: if True then device will not be opened.
+        :param defer_open: if True then device will not be opened;
+        :param journal: journal to write calls of device methods.
         """
 
         self._device_id: int = -1
         self._device_uri: str = device_uri
+        self._info: Optional[DeviceInfo] = None
+        self._guard: Optional[AxisGuard] = None
         self._is_virtual: bool = is_virtual
+        self._journal: Optional[JournalWriter] = journal
+        self._latest_params: Dict[bool, Tuple[float, Dict[str, Any]]] = {}
+        self._lock: threading.RLock = threading.RLock()
+        self._logger: DeviceLogger = DeviceLogger(device_uri)
+        self._status_board: Optional[StatusBoardWriter] = None
         self._user_multiplier: float = 1 / user_multiplier if user_multiplier else self.USER_MULTIPLIER
         self._user_unit: libximc.calibration_t = libximc.calibration_t()
         if not defer_open:
@@ -74,6 +104,14 @@ class XimcDevice:
 
         return self._device_id
 
+    @property
+    def device_info(self) -> Optional[DeviceInfo]:
+        """
+        :return: information about controller read when it was opened.
+        """
+
+        return self._info
+
     @property
     def device_uri(self) -> str:
         """
@@ -82,6 +120,58 @@ class XimcDevice:
 
         return self._device_uri
 
+    @property
+    def guard(self) -> Optional[AxisGuard]:
+        """
+        :return: soft limits of device in steps.
+        """
+
+        return self._guard
+
+    @property
+    def journal(self) -> Optional[JournalWriter]:
+        """
+        :return: journal to which calls of device methods are written.
+        """
+
+        return self._journal
+
+    @property
+    def logger(self) -> DeviceLogger:
+        """
+        :return: logger of device with error counters and records.
+        """
+
+        return self._logger
+
+    @property
+    def status_board(self) -> Optional[StatusBoardWriter]:
+        """
+        :return: shared memory board to which received statuses are published.
+        """
+
+        return self._status_board
+
+    @property
+    def user_multiplier(self) -> float:
+        """
+        :return: coefficient for converting motor steps to user unit (number of steps in user unit).
+        """
+
+        return 1 / self._user_multiplier
+
+    def _check_move(self, position: float) -> None:
+        """
+        Method checks motion from current position to given position with soft limits.
+        :param position: target position in steps.
+        """
+
+        if self._guard is not None:
+            current_position = self.get_position()
+            if current_position is None:
+                raise LimitError("Failed to read position to check soft limits")
+            self._guard.check_move(current_position, position)
+
     def _get_bootloader_or_firmware_version(self, firmware: bool = False) -> str:
         """
         Method returns firmware of bootloader version of controller.
@@ -93,8 +183,10 @@ class XimcDevice:
         major = ctypes.c_uint()
         minor = ctypes.c_uint()
         release = ctypes.c_uint()
-        if func(self._device_id, ctypes.byref(major), ctypes.byref(minor), ctypes.byref(release)) == libximc.Result.Ok:
+        result = func(self._device_id, ctypes.byref(major), ctypes.byref(minor), ctypes.byref(release))
+        if result == libximc.Result.Ok:
             return f"{major.value}.{minor.value}.{release.value}"
+        self._logger.error(func.__name__, result, "Failed to get %s version", "firmware" if firmware else "bootloader")
         return "None"
 
     def _get_controller_name(self) -> str:
@@ -103,28 +195,27 @@ class XimcDevice:
         """
 
         controller_name = libximc.controller_name_t()
-        if libximc.lib.get_controller_name(self._device_id, ctypes.byref(controller_name)) == libximc.Result.Ok:
+        result = libximc.lib.get_controller_name(self._device_id, ctypes.byref(controller_name))
+        if result == libximc.Result.Ok:
             return controller_name.ControllerName.decode()
-        logging.warning("Failed to get controller name")
+        self._logger.error("get_controller_name", result, "Failed to get controller name")
         return "None"
 
-    def _get_device_information(self) -> List[Tuple[str, str]]:
+    def _get_device_information(self) -> Tuple[str, str, str, str]:
         """
-        :return: main device information.
+        :return: main device information (manufacturer, manufacturer ID, product description
+        and hardware version).
         """
 
         device_information = libximc.device_information_t()
         result = libximc.lib.get_device_information(self._device_id, ctypes.byref(device_information))
         if result == libximc.Result.Ok:
-            return [("Manufacturer", ctypes.string_at(device_information.Manufacturer).decode()),
-                    ("Manufacturer ID", ctypes.string_at(device_information.ManufacturerId).decode()),
-                    ("Product description", ctypes.string_at(device_information.ProductDescription).decode()),
-                    ("Hardware version", f"{device_information.Major}.{device_information.Minor}."
-                                         f"{device_information.Release}")]
-        return [("Manufacturer", "None"),
-                ("Manufacturer ID", "None"),
-                ("Product description", "None"),
-                ("Hardware version", "None")]
+            return (ctypes.string_at(device_information.Manufacturer).decode(),
+                    ctypes.string_at(device_information.ManufacturerId).decode(),
+                    ctypes.string_at(device_information.ProductDescription).decode(),
+                    f"{device_information.Major}.{device_information.Minor}.{device_information.Release}")
+        self._logger.error("get_device_information", result, "Failed to get device information")
+        return "None", "None", "None", "None"
 
     def _get_engine_microstep_mode(self) -> int:
         """
@@ -132,9 +223,10 @@ class XimcDevice:
         """
 
         engine_settings = libximc.engine_settings_t()
-        if libximc.lib.get_engine_settings(self._device_id, ctypes.byref(engine_settings)) == libximc.Result.Ok:
+        result = libximc.lib.get_engine_settings(self._device_id, ctypes.byref(engine_settings))
+        if result == libximc.Result.Ok:
             return engine_settings.MicrostepMode
-        logging.warning("Failed to get engine settings")
+        self._logger.error("get_engine_settings", result, "Failed to get engine settings")
         return 0
 
     def _get_serial_number(self) -> str:
@@ -143,10 +235,41 @@ class XimcDevice:
         """
 
         serial_number = libximc.serial_number_t()
-        if libximc.lib.get_serial_number(self._device_id, ctypes.byref(serial_number)) == libximc.Result.Ok:
+        result = libximc.lib.get_serial_number(self._device_id, ctypes.byref(serial_number))
+        if result == libximc.Result.Ok:
             return str(serial_number.SN)
+        self._logger.error("get_serial_number", result, "Failed to get serial number")
         return "None"
 
+    def _get_travel_limit(self, direction: int) -> Optional[int]:
+        """
+        :param direction: direction of motion (1 or -1).
+        :return: position in steps where continuous motion must stop because of soft
+        limits, None if there is no limit.
+        """
+
+        if self._guard is None:
+            return None
+        current_position = self.get_position()
+        if current_position is None:
+            raise LimitError("Failed to read position to check soft limits")
+        limit = self._guard.travel_limit(current_position, direction)
+        if math.isinf(limit):
+            return None
+        return math.floor(limit) if direction > 0 else math.ceil(limit)
+
+    def _read_device_info(self) -> DeviceInfo:
+        """
+        :return: information about controller read from controller.
+        """
+
+        return DeviceInfo(ut.get_libximc_version(),
+                          *self._get_device_information(),
+                          serial_number=self._get_serial_number(),
+                          firmware_version=self._get_bootloader_or_firmware_version(True),
+                          bootloader_version=self._get_bootloader_or_firmware_version(False),
+                          friendly_name=self._get_controller_name())
+
     def _set_controller_name(self) -> None:
         """
         Method sets default friendly controller name for virtual device.
@@ -155,8 +278,10 @@ class XimcDevice:
         controller_name = libximc.controller_name_t()
         controller_name.ControllerName = self.CONTROLLER_NAME.encode("utf-8")
         controller_name.CtrlFlags = ctypes.c_uint(0)
-        if libximc.lib.set_controller_name(self._device_id, ctypes.byref(controller_name)) != libximc.Result.Ok:
-            logging.warning("Failed to set friendly controller name %s", self.CONTROLLER_NAME)
+        result = libximc.lib.set_controller_name(self._device_id, ctypes.byref(controller_name))
+        if result != libximc.Result.Ok:
+            self._logger.error("set_controller_name", result, "Failed to set friendly controller name %s",
+                               self.CONTROLLER_NAME)
 
     def _set_move_settings(self) -> None:
         """
@@ -171,8 +296,9 @@ class XimcDevice:
         move_settings.AntiplaySpeed = ctypes.c_uint(self.ANTIPLAY_SPEED_IN_STEPS)
         move_settings.uAntiplaySpeed = ctypes.c_uint(self.UANTIPLAY_SPEED_IN_STEPS)
         move_settings.MoveFlags = ctypes.c_uint(0)
-        if libximc.lib.set_move_settings(self._device_id, ctypes.byref(move_settings)) != libximc.Result.Ok:
-            logging.warning("Failed to set motion settings")
+        result = libximc.lib.set_move_settings(self._device_id, ctypes.byref(move_settings))
+        if result != libximc.Result.Ok:
+            self._logger.error("set_move_settings", result, "Failed to set motion settings")
 
     def _set_move_settings_with_user_unit(self) -> None:
         """
@@ -185,9 +311,10 @@ class XimcDevice:
         move_settings.Decel = ctypes.c_float(self.DECEL_IN_USER_UNIT)
         move_settings.AntiplaySpeed = ctypes.c_float(self.ANTIPLAY_SPEED_IN_USER_UNIT)
         move_settings.MoveFlags = ctypes.c_uint(0)
-        if libximc.lib.set_move_settings_calb(self._device_id, ctypes.byref(move_settings),
-                                              ctypes.byref(self._user_unit)) != libximc.Result.Ok:
-            logging.warning("Failed to set motion settings with user unit")
+        result = libximc.lib.set_move_settings_calb(self._device_id, ctypes.byref(move_settings),
+                                                    ctypes.byref(self._user_unit))
+        if result != libximc.Result.Ok:
+            self._logger.error("set_move_settings_calb", result, "Failed to set motion settings with user unit")
 
     def _set_params_for_virtual(self) -> None:
         """
@@ -209,9 +336,26 @@ class XimcDevice:
         position.uPosition = ctypes.c_int(0)
         position.EncPosition = ctypes.c_longlong(0)
         position.PosFlags = ctypes.c_uint(0)
-        if libximc.lib.set_position(self._device_id, ctypes.byref(position)) != libximc.Result.Ok or \
-                libximc.lib.command_zero(self._device_id) != libximc.Result.Ok:
-            logging.warning("Failed to set zero position")
+        result = libximc.lib.set_position(self._device_id, ctypes.byref(position))
+        if result != libximc.Result.Ok:
+            self._logger.error("set_position", result, "Failed to set zero position")
+            return
+        result = libximc.lib.command_zero(self._device_id)
+        if result != libximc.Result.Ok:
+            self._logger.error("command_zero", result, "Failed to set zero position")
+
+    def capture(self, duration: float, rate: float, in_user_unit: bool = False) -> Telemetry:
+        """
+        Method reads status of device with fixed rate using monotonic clock. Sample
+        times are scheduled from the start of capture, so delays do not accumulate.
+        Jitter and missed samples can be calculated with capture.capture_stats.
+        :param duration: duration of capture in seconds;
+        :param rate: number of samples per second;
+        :param in_user_unit: if True then position and speed are read in user unit.
+        :return: telemetry with samples (see capture.STEPS_DTYPE and capture.USER_UNIT_DTYPE).
+        """
+
+        return capture.capture(self, duration, rate, in_user_unit)
 
     @check_open
     def check_moving(self) -> bool:
@@ -228,22 +372,92 @@ class XimcDevice:
         Method closes device.
         """
 
-        if libximc.lib.close_device(ctypes.byref(ctypes.c_int(self._device_id))) != libximc.Result.Ok:
-            logging.warning("Failed to close device")
+        self._info = None
+        self._latest_params = {}
+        result = libximc.lib.close_device(ctypes.byref(ctypes.c_int(self._device_id)))
+        if result != libximc.Result.Ok:
+            self._logger.error("close_device", result, "Failed to close device")
+        self._device_id = -1
+
+    def emergency_stop(self, immediate: bool = False) -> bool:
+        """
+        Method sends stop command without waiting for command lock, so the stop is not
+        queued behind long commands of other threads (libximc allows commands from
+        different threads). The call is not written to journal.
+        :param immediate: if True then motion is stopped immediately (command_stop), otherwise
+        smoothly (command_sstp).
+        :return: True if command was sent.
+        """
+
+        device_id = self._device_id
+        if device_id <= 0:
+            return False
+        name = "command_stop" if immediate else "command_sstp"
+        result = getattr(libximc.lib, name)(device_id)
+        if result != libximc.Result.Ok:
+            self._logger.error(name, result, "Failed to stop moving")
+            return False
+        return True
 
     @check_open
     def get_device_full_info(self) -> List[Tuple[str, str]]:
         """
-        :return: full device information.
+        :return: full device information. Information is read once when device is opened.
+        """
+
+        if self._info is None:
+            self._info = self._read_device_info()
+        return self._info.as_list()
+
+    def get_latest_params(self, in_user_unit: bool = False, max_age: Optional[float] = None,
+                          timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Method returns the latest status received by any thread with get_params or
+        get_params_in_user_unit. The method does not wait for commands executed in
+        other threads, the controller is queried only if there is no status yet or
+        it is older than max_age.
+        :param in_user_unit: if True then status in user unit is returned;
+        :param max_age: maximum age of status in seconds, if None then status of any age is used;
+        :param timeout: maximum time in seconds to wait for command lock to query controller,
+        if None then time is not limited.
+        :return: dictionary with parameters of controller, empty dictionary if controller
+        was not queried because command lock was busy longer than timeout.
         """
 
-        data = [("libximc version", ut.get_libximc_version())]
-        data.extend(self._get_device_information())
-        data.append(("Serial number", self._get_serial_number()))
-        data.append(("Firmware version", self._get_bootloader_or_firmware_version(True)))
-        data.append(("Bootloader version", self._get_bootloader_or_firmware_version(False)))
-        data.append(("Friendly name", self._get_controller_name()))
-        return data
+        latest = self._latest_params.get(in_user_unit)
+        if latest is not None and (max_age is None or time.monotonic() - latest[0] <= max_age):
+            return dict(latest[1])
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            return {}
+        try:
+            params = self.get_params_in_user_unit() if in_user_unit else self.get_params()
+        finally:
+            self._lock.release()
+        return params or {}
+
+    @check_open
+    def get_move_settings(self) -> Optional[MoveSettings]:
+        """
+        :return: motion settings in steps (microsteps are converted to fractions of step).
+        """
+
+        move_settings = libximc.move_settings_t()
+        result = libximc.lib.get_move_settings(self._device_id, ctypes.byref(move_settings))
+        if result != libximc.Result.Ok:
+            self._logger.error("get_move_settings", result, "Failed to get motion settings")
+            return None
+
+        antiplay = 0
+        engine_settings = libximc.engine_settings_t()
+        if libximc.lib.get_engine_settings(self._device_id, ctypes.byref(engine_settings)) == libximc.Result.Ok and \
+                engine_settings.EngineFlags & libximc.EngineFlags.ENGINE_ANTIPLAY:
+            antiplay = engine_settings.Antiplay
+        microsteps = microsteps_per_step(self._user_unit.MicrostepMode)
+        return MoveSettings(speed=move_settings.Speed + move_settings.uSpeed / microsteps,
+                            accel=move_settings.Accel,
+                            decel=move_settings.Decel,
+                            antiplay_speed=move_settings.AntiplaySpeed + move_settings.uAntiplaySpeed / microsteps,
+                            antiplay=antiplay)
 
     @check_open
     def get_params(self) -> Dict[str, Any]:
@@ -253,15 +467,21 @@ class XimcDevice:
         """
 
         status = libximc.status_t()
-        if libximc.lib.get_status(self._device_id, ctypes.byref(status)) == libximc.Result.Ok:
-            return {"moving_status": status.MvCmdSts,
-                    "position": status.CurPosition,
-                    "u_position": status.uCurPosition,
-                    "speed": status.CurSpeed,
-                    "u_speed": status.uCurSpeed,
-                    "power_current": status.Ipwr,
-                    "power_voltage": status.Upwr / 100,
-                    "temperature": status.CurT / 10}
+        result = libximc.lib.get_status(self._device_id, ctypes.byref(status))
+        if result == libximc.Result.Ok:
+            params = {"moving_status": status.MvCmdSts,
+                      "position": status.CurPosition,
+                      "u_position": status.uCurPosition,
+                      "speed": status.CurSpeed,
+                      "u_speed": status.uCurSpeed,
+                      "power_current": status.Ipwr,
+                      "power_voltage": status.Upwr / 100,
+                      "temperature": status.CurT / 10}
+            self._latest_params[False] = time.monotonic(), params
+            if self._status_board is not None:
+                self._status_board.publish(self._device_uri, params, False)
+            return dict(params)
+        self._logger.error("get_status", result, "Failed to get status")
         return {}
 
     @check_open
@@ -272,14 +492,19 @@ class XimcDevice:
         """
 
         status = libximc.status_calb_t()
-        if libximc.lib.get_status_calb(self._device_id, ctypes.byref(status), ctypes.byref(self._user_unit)) ==\
-                libximc.Result.Ok:
-            return {"moving_status": status.MvCmdSts,
-                    "position": status.CurPosition,
-                    "speed": status.CurSpeed,
-                    "power_current": status.Ipwr,
-                    "power_voltage": status.Upwr / 100,
-                    "temperature": status.CurT / 10}
+        result = libximc.lib.get_status_calb(self._device_id, ctypes.byref(status), ctypes.byref(self._user_unit))
+        if result == libximc.Result.Ok:
+            params = {"moving_status": status.MvCmdSts,
+                      "position": status.CurPosition,
+                      "speed": status.CurSpeed,
+                      "power_current": status.Ipwr,
+                      "power_voltage": status.Upwr / 100,
+                      "temperature": status.CurT / 10}
+            self._latest_params[True] = time.monotonic(), params
+            if self._status_board is not None:
+                self._status_board.publish(self._device_uri, params, True)
+            return dict(params)
+        self._logger.error("get_status_calb", result, "Failed to get status in user units")
         return {}
 
     @check_open
@@ -289,8 +514,11 @@ class XimcDevice:
         """
 
         position = libximc.get_position_t()
-        if libximc.lib.get_position(self._device_id, ctypes.byref(position)) == libximc.Result.Ok:
+        result = libximc.lib.get_position(self._device_id, ctypes.byref(position))
+        if result == libximc.Result.Ok:
             return position.Position
+        self._logger.error("get_position", result, "Failed to get position")
+        return None
 
     @check_open
     def get_position_in_user_unit(self) -> Optional[float]:
@@ -299,67 +527,176 @@ class XimcDevice:
         """
 
         position = libximc.get_position_calb_t()
-        if libximc.lib.get_position_calb(self._device_id, ctypes.byref(position), ctypes.byref(self._user_unit)) == \
-                libximc.Result.Ok:
+        result = libximc.lib.get_position_calb(self._device_id, ctypes.byref(position), ctypes.byref(self._user_unit))
+        if result == libximc.Result.Ok:
             return position.Position
+        self._logger.error("get_position_calb", result, "Failed to get position in user units")
+        return None
 
     @check_open
     def move_left(self) -> None:
         """
-        Method runs device to left.
+        Method runs device to left. If device has soft limits, it stops at limit.
         """
 
-        if libximc.lib.command_left(self._device_id) != libximc.Result.Ok:
-            logging.warning("Failed to start move to left")
+        limit = self._get_travel_limit(-1)
+        if limit is not None:
+            self.move_to_position(limit)
+            return
+        result = libximc.lib.command_left(self._device_id)
+        if result != libximc.Result.Ok:
+            self._logger.error("command_left", result, "Failed to start move to left")
 
     @check_open
     def move_right(self) -> None:
         """
-        Method runs device to right.
+        Method runs device to right. If device has soft limits, it stops at limit.
         """
 
-        if libximc.lib.command_right(self._device_id) != libximc.Result.Ok:
-            logging.debug("Failed to start move to right")
+        limit = self._get_travel_limit(1)
+        if limit is not None:
+            self.move_to_position(limit)
+            return
+        result = libximc.lib.command_right(self._device_id)
+        if result != libximc.Result.Ok:
+            self._logger.error("command_right", result, "Failed to start move to right")
 
     @check_open
     def move_to_position(self, position: int) -> None:
         """
-        Method runs device to given position in steps.
+        Method runs device to given position in steps. If target or path is out of
+        soft limits, LimitError is raised and command is not sent.
         :param position: position to move.
         """
 
-        if libximc.lib.command_move(self._device_id, position, 0) != libximc.Result.Ok:
-            logging.warning("Failed to start move to position %d", position)
+        self._check_move(position)
+        result = libximc.lib.command_move(self._device_id, position, 0)
+        if result != libximc.Result.Ok:
+            self._logger.error("command_move", result, "Failed to start move to position %d", position)
 
     @check_open
     def move_to_position_in_user_unit(self, position: float) -> None:
         """
-        Method runs device to given position in user unit.
+        Method runs device to given position in user unit. If target or path is out of
+        soft limits, LimitError is raised and command is not sent.
         :param position: position to move.
         """
 
-        if libximc.lib.command_move_calb(self._device_id, ctypes.c_float(position), ctypes.byref(self._user_unit)) != \
-                libximc.Result.Ok:
-            logging.warning("Failed to start move to position %f in user units", position)
+        self._check_move(position / self._user_multiplier)
+        result = libximc.lib.command_move_calb(self._device_id, ctypes.c_float(position), ctypes.byref(self._user_unit))
+        if result != libximc.Result.Ok:
+            self._logger.error("command_move_calb", result, "Failed to start move to position %f in user units",
+                               position)
 
     def open_device(self) -> None:
         """
         Method opens device.
         """
 
-        device_id = libximc.lib.open_device(self._device_uri.encode())
-        if device_id <= 0:
-            logging.warning("Failed to open device %s", self._device_uri)
-            return
-        self._device_id = device_id
-        logging.debug("Device with ID %d was opened", self._device_id)
+        with self._lock:
+            device_id = libximc.lib.open_device(self._device_uri.encode())
+            if device_id <= 0:
+                self._logger.error("open_device", device_id, "Failed to open device %s", self._device_uri)
+                return
+            self._device_id = device_id
+            self._logger.debug("Device with ID %d was opened", self._device_id)
 
-        self._user_unit = libximc.calibration_t()
-        self._user_unit.A = self._user_multiplier
-        self._user_unit.MicrostepMode = self._get_engine_microstep_mode()
+            self._user_unit = libximc.calibration_t()
+            self._user_unit.A = self._user_multiplier
+            self._user_unit.MicrostepMode = self._get_engine_microstep_mode()
+
+            if self._is_virtual:
+                self._set_params_for_virtual()
+            self._info = self._read_device_info()
+
+    @check_open
+    def restore(self, snapshot: DeviceSnapshot, current: Optional[DeviceSnapshot] = None) -> List[str]:
+        """
+        Method writes to controller only those sections of snapshot that differ from
+        current settings.
+        :param snapshot: snapshot to restore;
+        :param current: current snapshot of controller, if None then it is read from controller.
+        :return: names of sections that were written.
+        """
+
+        if current is None:
+            current = self.snapshot(snapshot.sections)
+        differing = set(snapshot.diff(current))
+        written = []
+        for section, structure_name, _, setter_name in self.SNAPSHOT_SECTIONS:
+            if section not in differing:
+                continue
+            structure = fields_to_structure(snapshot[section], getattr(libximc, structure_name)())
+            result = getattr(libximc.lib, setter_name)(self._device_id, ctypes.byref(structure))
+            if result == libximc.Result.Ok:
+                written.append(section)
+            else:
+                self._logger.error(setter_name, result, "Failed to restore %s settings", section)
+        if "engine" in written:
+            self._user_unit.MicrostepMode = self._get_engine_microstep_mode()
+        if "name" in written and self._info is not None:
+            self._info = self._info._replace(friendly_name=self._get_controller_name())
+        return written
+
+    def set_guard(self, guard: Optional[AxisGuard]) -> None:
+        """
+        Method sets soft limits. Targets of motion commands are checked before they are
+        sent to controller, continuous motion to left or right stops at limits.
+        :param guard: soft limits in steps or None to remove limits.
+        """
 
-        if self._is_virtual:
-            self._set_params_for_virtual()
+        with self._lock:
+            self._guard = guard
+
+    def set_journal(self, journal: Optional[JournalWriter]) -> None:
+        """
+        Method starts or stops writing calls of device methods to journal.
+        :param journal: journal or None to stop writing.
+        """
+
+        with self._lock:
+            self._journal = journal
+
+    @check_open
+    def set_move_settings(self, move_settings: MoveSettings) -> bool:
+        """
+        Method writes motion settings to controller. Fractions of step are converted
+        to microsteps. Play compensation (antiplay) is a part of engine settings and
+        is not written.
+        :param move_settings: motion settings in steps.
+        :return: True if settings were written.
+        """
+
+        microsteps = microsteps_per_step(self._user_unit.MicrostepMode)
+        # Fraction that rounds up to whole step is carried to integer field, microstep field is less than microsteps
+        speed, u_speed = divmod(round(move_settings.speed * microsteps), microsteps)
+        antiplay_speed, u_antiplay_speed = divmod(round(move_settings.antiplay_speed * microsteps), microsteps)
+        settings = libximc.move_settings_t()
+        settings.Speed = ctypes.c_uint(int(speed))
+        settings.uSpeed = ctypes.c_uint(int(u_speed))
+        settings.Accel = ctypes.c_uint(int(move_settings.accel))
+        settings.Decel = ctypes.c_uint(int(move_settings.decel))
+        settings.AntiplaySpeed = ctypes.c_uint(int(antiplay_speed))
+        settings.uAntiplaySpeed = ctypes.c_uint(int(u_antiplay_speed))
+        settings.MoveFlags = ctypes.c_uint(0)
+        result = libximc.lib.set_move_settings(self._device_id, ctypes.byref(settings))
+        if result != libximc.Result.Ok:
+            self._logger.error("set_move_settings", result, "Failed to set motion settings")
+            return False
+        return True
+
+    def set_status_board(self, status_board: Optional[StatusBoardWriter]) -> None:
+        """
+        Method starts or stops publishing statuses received with get_params and
+        get_params_in_user_unit to shared memory board. Slot of device is reserved at
+        once, so board that cannot hold device is rejected here, not in polling loop.
+        :param status_board: board or None to stop publishing.
+        """
+
+        if status_board is not None and status_board.register(self._device_uri) < 0:
+            raise ValueError(f"Status board {status_board.name} has no free slot for {self._device_uri}")
+        with self._lock:
+            self._status_board = status_board
 
     @check_open
     def set_user_multiplier(self, multiplier: float) -> None:
@@ -370,6 +707,27 @@ class XimcDevice:
 
         self._user_multiplier = 1 / multiplier
         self._user_unit.A = self._user_multiplier
+        self._latest_params.pop(True, None)
+
+    @check_open
+    def snapshot(self, sections: Optional[List[str]] = None) -> DeviceSnapshot:
+        """
+        Method reads settings of controller in one pass.
+        :param sections: names of sections to read (see SNAPSHOT_SECTIONS), by default all sections.
+        :return: snapshot of settings, sections that failed to be read are missing.
+        """
+
+        data = {}
+        for section, structure_name, getter_name, _ in self.SNAPSHOT_SECTIONS:
+            if sections is not None and section not in sections:
+                continue
+            structure = getattr(libximc, structure_name)()
+            result = getattr(libximc.lib, getter_name)(self._device_id, ctypes.byref(structure))
+            if result == libximc.Result.Ok:
+                data[section] = structure_to_fields(structure)
+            else:
+                self._logger.error(getter_name, result, "Failed to read %s settings", section)
+        return DeviceSnapshot(data)
 
     @check_open
     def stop_motion(self) -> None:
@@ -377,42 +735,37 @@ class XimcDevice:
         Method stops movement.
         """
 
-        if libximc.lib.command_sstp(self._device_id) != libximc.Result.Ok:
-            logging.warning("Failed to stop moving")
+        result = libximc.lib.command_sstp(self._device_id)
+        if result != libximc.Result.Ok:
+            self._logger.error("command_sstp", result, "Failed to stop moving")
+
+    @check_open
+    def stop_motion_immediately(self) -> None:
+        """
+        Method stops movement immediately.
+        """
+
+        result = libximc.lib.command_stop(self._device_id)
+        if result != libximc.Result.Ok:
+            self._logger.error("command_stop", result, "Failed to stop moving")
+
+    def wait_for_stop(self, timeout: Optional[float] = None, interval: float = 0.1) -> bool:
+        """
+        Method waits until motion ends. Lock is not held while waiting, so motion
+        can be stopped from another thread.
+        :param timeout: maximum time to wait in seconds;
+        :param interval: interval between status requests in seconds.
+        :return: True if device stopped.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.check_moving():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval)
+        return True
 
 
 if __name__ == "__main__":
-    devices_type_and_uri = ut.search_devices()
-    if not devices_type_and_uri:
-        sys.exit(0)
-
-    is_virtual = devices_type_and_uri[0][0].lower() == "virtual"
-    device = XimcDevice(devices_type_and_uri[0][1], is_virtual)
-    ut.print_device_info(device)
-
-    POS_1 = 5
-    print(f"\nPosition before moving to position {POS_1:.3f}: {device.get_position_in_user_unit():.3f}")
-    device.move_to_position_in_user_unit(POS_1)
-    while device.check_moving():
-        print(f"\tMoving to {device.get_position_in_user_unit():.3f}")
-        time.sleep(0.5)
-    print(f"Position after moving to position {POS_1:.3f}: {device.get_position_in_user_unit():.3f}")
-
-    POS_2 = -13
-    print(f"\nPosition before moving to position {POS_2:.3f}: {device.get_position_in_user_unit():.3f}")
-    device.move_to_position_in_user_unit(POS_2)
-    while device.check_moving():
-        print(f"\tMoving to {device.get_position_in_user_unit():.3f}")
-        time.sleep(0.5)
-
-    print(f"\nPosition before moving to right {device.get_position_in_user_unit():.3f}")
-    device.move_right()
-    i = 0
-    while device.check_moving():
-        print(f"\tMoving to {device.get_position_in_user_unit():.3f}")
-        i += 1
-        time.sleep(1)
-        if i > 3:
-            device.stop_motion()
-
-    device.close_device()
+    from ximc_device.cli import main
+    sys.exit(main())
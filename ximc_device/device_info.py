@@ -0,0 +1,26 @@
+from typing import List, NamedTuple, Tuple
+
+
+class DeviceInfo(NamedTuple):
+    """
+    Information about controller that does not change while controller is open.
+    """
+
+    libximc_version: str = "None"
+    manufacturer: str = "None"
+    manufacturer_id: str = "None"
+    product_description: str = "None"
+    hardware_version: str = "None"
+    serial_number: str = "None"
+    firmware_version: str = "None"
+    bootloader_version: str = "None"
+    friendly_name: str = "None"
+
+    def as_list(self) -> List[Tuple[str, str]]:
+        """
+        :return: list with readable names and values of fields.
+        """
+
+        return list(zip(("libximc version", "Manufacturer", "Manufacturer ID", "Product description",
+                         "Hardware version", "Serial number", "Firmware version", "Bootloader version",
+                         "Friendly name"), self))
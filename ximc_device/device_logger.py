@@ -0,0 +1,129 @@
+import collections
+import logging
+import threading
+import time
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+
+class ErrorRecord(NamedTuple):
+    """
+    Record about failed operation with controller.
+    """
+
+    timestamp: float
+    operation: str
+    result: Optional[int]
+    message: str
+    args: Tuple[Any, ...]
+
+    def format(self) -> str:
+        """
+        :return: formatted message of record.
+        """
+
+        message = self.message % self.args if self.args else self.message
+        if self.result is None:
+            return message
+        return f"{message} (result {self.result})"
+
+
+class DeviceLogger:
+    """
+    Logger for one device. Repeated errors of the same operation with the same
+    result are written to log not more often than once in given interval, the
+    number of suppressed messages is added to the next written message. All
+    errors are counted and the last ones are kept as structured records.
+    Messages are formatted only if they are really written.
+    """
+
+    LOGGER_NAME: str = "ximc_device.device"
+    MAX_RECORDS: int = 100
+    MIN_INTERVAL: float = 5
+
+    def __init__(self, name: str, min_interval: float = None, max_records: int = None) -> None:
+        """
+        :param name: name of device (for example, URI), it is used as name of child logger;
+        :param min_interval: minimum interval in seconds between two identical messages in log;
+        :param max_records: number of the last error records to keep.
+        """
+
+        self._counters: Dict[str, int] = collections.defaultdict(int)
+        self._last_emitted: Dict[Tuple[str, Optional[int]], float] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._logger: logging.Logger = logging.getLogger(self.LOGGER_NAME).getChild(name.replace(".", "_"))
+        self._min_interval: float = self.MIN_INTERVAL if min_interval is None else min_interval
+        self._records: Deque[ErrorRecord] = collections.deque(maxlen=max_records or self.MAX_RECORDS)
+        self._suppressed: Dict[Tuple[str, Optional[int]], int] = collections.defaultdict(int)
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        """
+        :return: dictionary with number of errors for each operation.
+        """
+
+        with self._lock:
+            return dict(self._counters)
+
+    @property
+    def logger(self) -> logging.Logger:
+        """
+        :return: standard logger to which messages are written.
+        """
+
+        return self._logger
+
+    @property
+    def records(self) -> List[ErrorRecord]:
+        """
+        :return: the last error records.
+        """
+
+        with self._lock:
+            return list(self._records)
+
+    def debug(self, message: str, *args) -> None:
+        self._logger.debug(message, *args)
+
+    def error(self, operation: str, result: Optional[int], message: str, *args, level: int = logging.WARNING
+              ) -> None:
+        """
+        Method registers failed operation.
+        :param operation: name of operation (usually name of libximc function);
+        :param result: result code returned by libximc;
+        :param message: message with %-style placeholders;
+        :param args: arguments for message;
+        :param level: logging level of message.
+        """
+
+        key = (operation, result)
+        now = time.monotonic()
+        with self._lock:
+            self._counters[operation] += 1
+            self._records.append(ErrorRecord(time.time(), operation, result, message, args))
+            last_emitted = self._last_emitted.get(key)
+            if last_emitted is not None and now - last_emitted < self._min_interval:
+                self._suppressed[key] += 1
+                return
+            self._last_emitted[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+
+        if not self._logger.isEnabledFor(level):
+            return
+        if result is not None:
+            message += " (result %d)"
+            args += (result,)
+        if suppressed:
+            message += " [%d similar messages suppressed]"
+            args += (suppressed,)
+        self._logger.log(level, message, *args)
+
+    def reset(self) -> None:
+        """
+        Method clears error counters and records.
+        """
+
+        with self._lock:
+            self._counters.clear()
+            self._last_emitted.clear()
+            self._records.clear()
+            self._suppressed.clear()
@@ -0,0 +1,477 @@
+import collections
+import concurrent.futures
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from IPython.display import clear_output, display
+from ipywidgets import widgets
+from ximc_device import utils as ut
+from ximc_device.device import XimcDevice
+from ximc_device.motion import MVCMD_RUNNING
+from ximc_device.poll import PollGovernor
+from ximc_device.telemetry import TelemetryBuffer
+
+
+def _get_sparkline(values: Sequence[float], width: int, height: int, color: str) -> str:
+    """
+    Function draws line of values as small SVG image.
+    :param values: values;
+    :param width: width of image in pixels;
+    :param height: height of image in pixels;
+    :param color: color of line.
+    :return: HTML code of image.
+    """
+
+    if len(values) < 2:
+        return f'<svg width="{width}" height="{height}"></svg>'
+    min_value = min(values)
+    value_range = max(values) - min_value or 1
+    x_step = (width - 2) / (len(values) - 1)
+    points = " ".join(f"{1 + index * x_step:.1f},{height - 1 - (value - min_value) / value_range * (height - 2):.1f}"
+                      for index, value in enumerate(values))
+    return (f'<svg width="{width}" height="{height}"><polyline points="{points}" fill="none" stroke="{color}" '
+            f'stroke-width="1"/></svg>')
+
+
+class _DeviceRow:
+    """
+    Row of fleet panel with widgets and telemetry of one device.
+    """
+
+    SPARKLINE_COLOR: str = "red"
+    SPARKLINE_HEIGHT: int = 30
+    SPARKLINE_WIDTH: int = 200
+
+    def __init__(self, device, panel: "FleetPanel", capacity: int) -> None:
+        """
+        :param device: device;
+        :param panel: fleet panel;
+        :param capacity: number of samples in sparkline.
+        """
+
+        self._device = device
+        self._due: float = time.monotonic()
+        self._governor: PollGovernor = PollGovernor(device.device_uri)
+        self._panel: "FleetPanel" = panel
+        self._params: Dict[str, Any] = {}
+        self._pending: Optional[concurrent.futures.Future] = None
+        self._telemetry: TelemetryBuffer = TelemetryBuffer(capacity=capacity)
+        self._create_widgets()
+
+    @property
+    def box(self) -> widgets.HBox:
+        """
+        :return: box with widgets of row.
+        """
+
+        return self._box
+
+    @property
+    def device(self):
+        """
+        :return: device.
+        """
+
+        return self._device
+
+    @property
+    def due(self) -> float:
+        """
+        :return: moment of time.monotonic when status should be read next time (inf while reading).
+        """
+
+        return self._due
+
+    @property
+    def governor(self) -> PollGovernor:
+        """
+        :return: governor of status polling.
+        """
+
+        return self._governor
+
+    @property
+    def telemetry(self) -> TelemetryBuffer:
+        """
+        :return: buffer with the last samples of device.
+        """
+
+        return self._telemetry
+
+    def _create_widgets(self) -> None:
+        """
+        Method creates widgets of row.
+        """
+
+        layout = widgets.Layout(width="40px")
+        self.label_device = widgets.Label(value=self._device.device_uri, layout=widgets.Layout(width="200px"))
+        self.button_move_left = widgets.Button(icon="arrow-left", tooltip="Move left", layout=layout)
+        self.button_move_left.on_click(lambda _: self._panel.submit(self.move_left))
+        self.button_stop = widgets.Button(icon="stop", tooltip="Stop", layout=layout)
+        self.button_stop.on_click(lambda _: self._device.emergency_stop())
+        self.button_move_right = widgets.Button(icon="arrow-right", tooltip="Move right", layout=layout)
+        self.button_move_right.on_click(lambda _: self._panel.submit(self.move_right))
+        self.float_text_position = widgets.FloatText(value=0, layout=widgets.Layout(width="80px"))
+        self.button_move_to = widgets.Button(description="Move to", layout=widgets.Layout(width="70px"))
+        self.button_move_to.on_click(lambda _: self._panel.submit(self.move_to_position,
+                                                                  self.float_text_position.value))
+        self.label_status = widgets.Label(value="", layout=widgets.Layout(width="220px"))
+        self.html_sparkline = widgets.HTML(value=_get_sparkline([], self.SPARKLINE_WIDTH, self.SPARKLINE_HEIGHT,
+                                                                self.SPARKLINE_COLOR))
+        self.button_close = widgets.Button(icon="lock", tooltip="Close device", layout=layout)
+        self.button_close.on_click(lambda _: self._panel.close_device(self._device.device_uri))
+        self._box = widgets.HBox([self.label_device, self.button_move_left, self.button_stop, self.button_move_right,
+                                  self.float_text_position, self.button_move_to, self.label_status,
+                                  self.html_sparkline, self.button_close])
+
+    def move_left(self) -> None:
+        """
+        Method starts motion to left, target of previous motion is forgotten by governor.
+        """
+
+        self._governor.set_target(None)
+        self._device.move_left()
+
+    def move_right(self) -> None:
+        """
+        Method starts motion to right, target of previous motion is forgotten by governor.
+        """
+
+        self._governor.set_target(None)
+        self._device.move_right()
+
+    def move_to_position(self, position: float) -> None:
+        """
+        Method moves device to position. Governor gets target and deceleration in user
+        unit (status is polled in user unit), so it polls fast before deceleration.
+        :param position: target position in user unit.
+        """
+
+        move_settings = self._device.get_move_settings()
+        decel = move_settings.decel / self._device.user_multiplier if move_settings is not None else None
+        self._governor.set_target(position, decel)
+        self._device.move_to_position_in_user_unit(position)
+
+    def render(self, user_unit: str) -> None:
+        """
+        Method shows the latest status of device in widgets.
+        :param user_unit: user unit (for example, mm, deg).
+        """
+
+        params = self._params
+        if not params:
+            self.label_status.value = "No status"
+            return
+        state = "moving" if params["moving_status"] & MVCMD_RUNNING else "stopped"
+        self.label_status.value = f"{params['position']:.3f} {user_unit}, {state}"
+        self.html_sparkline.value = _get_sparkline(self._telemetry.view()["position"], self.SPARKLINE_WIDTH,
+                                                   self.SPARKLINE_HEIGHT, self.SPARKLINE_COLOR)
+
+    def sample(self, start: float) -> None:
+        """
+        Method reads status of device, appends it to telemetry and schedules the next reading.
+        :param start: moment of time.monotonic from which time of samples is counted.
+        """
+
+        params = {}
+        try:
+            params = self._device.get_params_in_user_unit()
+        finally:
+            self._due = time.monotonic() + self._governor.update(params)
+        if params:
+            self._telemetry.append(time.monotonic() - start, params)
+        self._params = params
+
+    def submit_sample(self, executor: concurrent.futures.Executor, start: float
+                      ) -> Optional[concurrent.futures.Future]:
+        """
+        Method starts reading of status in executor if it is time to read and previous
+        reading is finished.
+        :param executor: executor;
+        :param start: moment of time.monotonic from which time of samples is counted.
+        :return: future of reading or None if reading is not started.
+        """
+
+        if self._due > time.monotonic() or (self._pending is not None and not self._pending.done()):
+            return None
+        self._due = math.inf
+        self._pending = executor.submit(self.sample, start)
+        return self._pending
+
+
+class FleetPanel:
+    """
+    Class for panel with widgets to open and control many devices. All devices
+    are polled by one sampler thread, and status reads and commands of all devices
+    are executed by one pool of threads, so the number of threads does not depend
+    on the number of devices. Period of polling is chosen for every device by
+    PollGovernor from its motion state and shared among devices on the same link.
+    Each device has a row with controls and sparkline of position, and rows are
+    redrawn in batches of limited size with fixed period.
+    """
+
+    BATCH_SIZE: int = 8
+    DEFAULT_USER_UNITS_MULTIPLIER: float = 400
+    MAX_WORKERS: int = 4
+    PERIOD: float = 0.5
+    SPARKLINE_SIZE: int = 100
+    USER_UNIT: str = "user unit"
+
+    def __init__(self, devices: Optional[Sequence[Any]] = None, max_workers: Optional[int] = None,
+                 period: Optional[float] = None, batch_size: Optional[int] = None,
+                 user_unit: Optional[str] = None) -> None:
+        """
+        :param devices: devices that are already open;
+        :param max_workers: number of threads to read status and run commands;
+        :param period: period of redrawing rows in seconds;
+        :param batch_size: maximum number of rows redrawn per period;
+        :param user_unit: user unit (for example, mm, deg).
+        """
+
+        self._batch_size: int = batch_size or self.BATCH_SIZE
+        self._devices_type_and_uri: List[Tuple[str, str]] = []
+        self._dirty: "collections.OrderedDict[str, None]" = collections.OrderedDict()
+        self._executor: concurrent.futures.ThreadPoolExecutor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or self.MAX_WORKERS, thread_name_prefix="ximc_fleet")
+        self._lock: threading.Lock = threading.Lock()
+        self._period: float = period or self.PERIOD
+        self._rows: Dict[str, _DeviceRow] = {}
+        self._start: float = time.monotonic()
+        self._stop_event: threading.Event = threading.Event()
+        self._thread: threading.Thread = threading.Thread(target=self.run_thread, daemon=True)
+        self._wake_event: threading.Event = threading.Event()
+        self._user_unit: str = user_unit or self.USER_UNIT
+        self._create_widgets()
+        for device in devices or []:
+            self.add_device(device)
+        self._thread.start()
+
+    @property
+    def devices(self) -> List[Any]:
+        """
+        :return: devices on panel.
+        """
+
+        with self._lock:
+            return [row.device for row in self._rows.values()]
+
+    def _create_widgets(self) -> None:
+        """
+        Method creates widgets to search and open devices and box for rows of devices.
+        """
+
+        self.button_refresh = widgets.Button(description="Refresh", icon="rotate-right",
+                                             tooltip="Refresh list of available devices")
+        self.button_refresh.on_click(lambda _: self.search_devices())
+        self.drop_down_devices = widgets.Dropdown(options=[], description="Devices:")
+        self.float_text_user_unit = widgets.BoundedFloatText(
+            value=self.DEFAULT_USER_UNITS_MULTIPLIER, min=0.00000001, max=1000000, layout=widgets.Layout(width="100px"),
+            description="Multiplier:")
+        self.button_open = widgets.Button(description="Open device", icon="unlock")
+        self.button_open.on_click(lambda _: self.open_device())
+        self.button_stop_all = widgets.Button(description="Stop all", icon="stop")
+        self.button_stop_all.on_click(lambda _: self.stop_motion())
+        h_box = widgets.HBox([self.button_refresh, self.drop_down_devices, self.float_text_user_unit,
+                              self.button_open, self.button_stop_all])
+        self.v_box_rows = widgets.VBox([])
+        self.output = widgets.Output()
+        display(widgets.VBox([h_box, self.v_box_rows, self.output]))
+
+    def _render(self) -> None:
+        """
+        Method redraws rows of devices whose status has changed. At most batch size
+        rows are redrawn at once, the rest are redrawn in the next periods.
+        """
+
+        with self._lock:
+            batch = []
+            while self._dirty and len(batch) < self._batch_size:
+                device_uri, _ = self._dirty.popitem(last=False)
+                if device_uri in self._rows:
+                    batch.append(self._rows[device_uri])
+        for row in batch:
+            row.render(self._user_unit)
+
+    def _report_error(self, function, future: concurrent.futures.Future) -> None:
+        """
+        Method prints exception of finished command to output of panel.
+        :param function: function that was run;
+        :param future: future of function.
+        """
+
+        if future.cancelled() or future.exception() is None:
+            return
+        with self.output:
+            ut.print_flush(f"Failed to run {getattr(function, '__name__', function)}: {future.exception()}")
+
+    def _set_dirty(self, device_uri: str) -> None:
+        """
+        Method marks row of device for redrawing and wakes sampler thread to schedule the next reading.
+        :param device_uri: URI of device.
+        """
+
+        with self._lock:
+            self._dirty[device_uri] = None
+        self._wake_event.set()
+
+    def _update_rows_box(self) -> None:
+        """
+        Method places rows of devices in box.
+        """
+
+        with self._lock:
+            self.v_box_rows.children = [row.box for row in self._rows.values()]
+
+    def _update_shares(self) -> None:
+        """
+        Method tells governors how many devices are polled through the same link.
+        """
+
+        with self._lock:
+            links = collections.Counter(row.governor.link for row in self._rows.values())
+            for row in self._rows.values():
+                row.governor.set_share(links[row.governor.link])
+
+    def add_device(self, device) -> None:
+        """
+        Method adds open device to panel.
+        :param device: device (XimcDevice or SimulatedDevice).
+        """
+
+        with self._lock:
+            if device.device_uri in self._rows:
+                raise ValueError(f"Device {device.device_uri} is already on panel")
+            self._rows[device.device_uri] = _DeviceRow(device, self, self.SPARKLINE_SIZE)
+        self._update_rows_box()
+        self._update_shares()
+        self._wake_event.set()
+
+    def close_device(self, device_uri: str) -> None:
+        """
+        Method removes device from panel and closes it.
+        :param device_uri: URI of device.
+        """
+
+        with self._lock:
+            row = self._rows.pop(device_uri, None)
+            self._dirty.pop(device_uri, None)
+        if row is None:
+            return
+        self._update_rows_box()
+        self._update_shares()
+        self.submit(row.device.close_device)
+        with self.output:
+            ut.print_flush(f"Device {device_uri} was closed")
+
+    def get_poll_rate(self, device_uri: str) -> float:
+        """
+        :param device_uri: URI of device.
+        :return: effective rate of status polling of device (requests per second).
+        """
+
+        with self._lock:
+            return self._rows[device_uri].governor.rate
+
+    def get_telemetry(self, device_uri: str) -> TelemetryBuffer:
+        """
+        :param device_uri: URI of device.
+        :return: buffer with the last samples of device.
+        """
+
+        with self._lock:
+            return self._rows[device_uri].telemetry
+
+    def open_device(self) -> None:
+        """
+        Method opens device selected in list and adds it to panel.
+        """
+
+        with self.output:
+            clear_output(wait=True)
+            for device_type, device_uri in self._devices_type_and_uri:
+                if f"{device_uri} ({device_type})" == self.drop_down_devices.value:
+                    if device_uri in self._rows:
+                        ut.print_flush(f"Device {device_uri} is already open")
+                        return
+                    device = XimcDevice(device_uri, device_type.lower() == "virtual", self.float_text_user_unit.value)
+                    if device.device_id > 0:
+                        self.add_device(device)
+                        ut.print_flush(f"Device {device_uri} was opened")
+                    else:
+                        ut.print_flush(f"Failed to open device {device_uri}")
+                    return
+            ut.print_flush("No device is selected. Select a device to open it")
+
+    def run_thread(self) -> None:
+        """
+        Method starts reading of status of devices when their governors allow and redraws
+        rows with fixed period. If status of device is still being read, the device is skipped.
+        """
+
+        next_render = time.monotonic()
+        while not self._stop_event.is_set():
+            self._wake_event.clear()
+            with self._lock:
+                rows = list(self._rows.items())
+            for device_uri, row in rows:
+                future = row.submit_sample(self._executor, self._start)
+                if future is not None:
+                    future.add_done_callback(lambda _, uri=device_uri: self._set_dirty(uri))
+            if time.monotonic() >= next_render:
+                self._render()
+                next_render = max(next_render + self._period, time.monotonic())
+            wake_time = min([row.due for _, row in rows] + [next_render])
+            self._wake_event.wait(max(wake_time - time.monotonic(), 0))
+
+    def search_devices(self) -> None:
+        """
+        Method searches for devices and updates combo box widget.
+        """
+
+        with self.output:
+            clear_output(wait=True)
+            self._devices_type_and_uri = ut.search_devices()
+        self.drop_down_devices.options = [f"{device_uri} ({device_type})" for device_type, device_uri in
+                                          self._devices_type_and_uri]
+
+    def set_user_unit(self, user_unit: str) -> None:
+        """
+        :param user_unit: user unit (for example, mm, deg).
+        """
+
+        self._user_unit = user_unit
+
+    def stop_motion(self) -> None:
+        """
+        Method stops motion of all devices. Stop commands are sent at once, not through
+        executor, so they are not queued behind status requests.
+        """
+
+        for device in self.devices:
+            device.emergency_stop()
+
+    def stop_thread(self) -> None:
+        """
+        Method stops sampler thread and executor. Devices are not closed.
+        """
+
+        self._stop_event.set()
+        self._wake_event.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def submit(self, function, *args, **kwargs) -> concurrent.futures.Future:
+        """
+        Method runs function (for example, command of device) in executor, so that
+        widgets are not blocked while command is executed. Exception of function is
+        printed to output of panel.
+        :param function: function;
+        :param args: non-keyword arguments for function;
+        :param kwargs: keyword arguments for function.
+        :return: future of function.
+        """
+
+        future = self._executor.submit(function, *args, **kwargs)
+        future.add_done_callback(lambda done: self._report_error(function, done))
+        return future
@@ -0,0 +1,226 @@
+import math
+import time
+from typing import Callable, Iterator, List, NamedTuple, Optional
+from ximc_device.capture import wait_until
+from ximc_device.motion import MVCMD_RUNNING
+
+
+class FlyScanBin(NamedTuple):
+    """
+    Samples of fly scan collected while device passed one bin of positions.
+    Time is the mean time of samples in seconds from the start of scan motion
+    (including run-up), position is the mean position of samples in user unit, value is the mean
+    of values returned by read_value function. If no sample got to bin, count is 0
+    and mean values are NaN (None for value).
+    """
+
+    index: int
+    start: float
+    end: float
+    count: int
+    time: float
+    position: float
+    value: Optional[float]
+
+
+class _BinAccumulator:
+    """
+    Sums of samples in one bin.
+    """
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.position: float = 0
+        self.time: float = 0
+        self.value: float = 0
+        self.values: int = 0
+
+    def add(self, sample_time: float, position: float, value: Optional[float]) -> None:
+        """
+        :param sample_time: time of sample;
+        :param position: position of device;
+        :param value: measured value or None.
+        """
+
+        self.count += 1
+        self.time += sample_time
+        self.position += position
+        if value is not None:
+            self.value += value
+            self.values += 1
+
+
+class _PerfCounterClock:
+    """
+    Real time clock with precise sleep for devices that do not have their own clock.
+    """
+
+    @staticmethod
+    def now() -> float:
+        """
+        :return: time.perf_counter in seconds.
+        """
+
+        return time.perf_counter()
+
+    @staticmethod
+    def sleep(seconds: float) -> None:
+        """
+        :param seconds: time to sleep.
+        """
+
+        wait_until(time.perf_counter() + seconds)
+
+
+class FlyScan:
+    """
+    Class runs scan on the fly: device moves through the whole range with constant
+    speed in one motion command, and status of device is read with fixed rate.
+    Samples are grouped into bins of position, and each bin is given out as soon
+    as device leaves it. Device starts before the range and stops after it so that
+    speed is constant inside the range. All positions are in user unit. Reads are
+    scheduled by clock of device if it has one (SimulatedDevice), so scan with
+    virtual clock runs instantly, times and timeouts are then in simulated seconds.
+    """
+
+    RATE: float = 1000
+
+    def __init__(self, device, start: float, end: float, bins: int, speed: float, rate: Optional[float] = None,
+                 read_value: Optional[Callable[[], Optional[float]]] = None) -> None:
+        """
+        :param device: XimcDevice or SimulatedDevice;
+        :param start: start of range;
+        :param end: end of range;
+        :param bins: number of bins;
+        :param speed: speed of scan in user unit per second;
+        :param rate: number of status reads per second;
+        :param read_value: function to call with each status read (for example, to read detector),
+        its result is averaged in bins.
+        """
+
+        if bins < 1 or start == end:
+            raise ValueError("Scan must have non-empty range and at least one bin")
+        if speed <= 0:
+            raise ValueError("Speed must be positive")
+        self._bins: int = bins
+        self._device = device
+        self._direction: int = 1 if end > start else -1
+        self._end: float = end
+        self._rate: float = rate or self.RATE
+        self._read_value: Optional[Callable[[], Optional[float]]] = read_value
+        self._speed: float = speed
+        self._start: float = start
+        self._width: float = abs(end - start) / bins
+
+    def _get_bin(self, index: int, accumulator: _BinAccumulator) -> FlyScanBin:
+        """
+        :param index: index of bin;
+        :param accumulator: sums of samples in bin.
+        :return: bin with mean values.
+        """
+
+        start = self._start + self._direction * index * self._width
+        end = self._start + self._direction * (index + 1) * self._width
+        if not accumulator.count:
+            return FlyScanBin(index, start, end, 0, math.nan, math.nan, None)
+        value = accumulator.value / accumulator.values if accumulator.values else None
+        return FlyScanBin(index, start, end, accumulator.count, accumulator.time / accumulator.count,
+                          accumulator.position / accumulator.count, value)
+
+    def _get_run_distances(self, speed_in_steps: float) -> List[float]:
+        """
+        :param speed_in_steps: speed of scan in steps per second.
+        :return: distances in user unit needed to reach speed of scan and to stop.
+        """
+
+        settings = self._device.get_move_settings()
+        if settings is None:
+            raise RuntimeError("Failed to read motion settings of device")
+        distances = []
+        for accel in (settings.accel, settings.decel):
+            steps = speed_in_steps ** 2 / (2 * accel) if accel > 0 else 0
+            # One extra bin of margin for status delays
+            distances.append(steps / self._device.user_multiplier + self._width)
+        return distances
+
+    def edges(self) -> List[float]:
+        """
+        :return: edges of bins in order of scan.
+        """
+
+        return [self._start + self._direction * index * self._width for index in range(self._bins + 1)]
+
+    def run(self, callback: Optional[Callable[[FlyScanBin], None]] = None, timeout: Optional[float] = None
+            ) -> List[FlyScanBin]:
+        """
+        Method runs scan and calls callback with each bin as soon as it is completed.
+        :param callback: function to call with completed bin;
+        :param timeout: maximum time of each motion in seconds.
+        :return: all bins.
+        """
+
+        result = []
+        for scan_bin in self.scan(timeout):
+            if callback:
+                callback(scan_bin)
+            result.append(scan_bin)
+        return result
+
+    def scan(self, timeout: Optional[float] = None) -> Iterator[FlyScanBin]:
+        """
+        Generator runs scan and yields bins in order of scan as soon as device leaves
+        them. If consumer of generator is slow, status reads are delayed and scheduled
+        reads are skipped, so heavy processing should be done in another thread.
+        :param timeout: maximum time of each motion in seconds.
+        :return: bins.
+        """
+
+        speed_in_steps = self._speed * self._device.user_multiplier
+        run_up, run_out = self._get_run_distances(speed_in_steps)
+        self._device.move_to_position_in_user_unit(self._start - self._direction * run_up)
+        if not self._device.wait_for_stop(timeout):
+            self._device.stop_motion()
+            raise TimeoutError(f"Device did not reach start of scan in {timeout} sec")
+
+        settings = self._device.get_move_settings()
+        if settings is None:
+            raise RuntimeError("Failed to read motion settings of device")
+        if not self._device.set_move_settings(settings._replace(speed=speed_in_steps)):
+            raise RuntimeError("Failed to set speed of scan")
+        clock = getattr(self._device, "clock", None) or _PerfCounterClock()
+        period = 1 / self._rate
+        index = 0
+        accumulator = _BinAccumulator()
+        try:
+            self._device.move_to_position_in_user_unit(self._end + self._direction * run_out)
+            start = clock.now()
+            deadline = None if timeout is None else start + timeout
+            slot = 0
+            while index < self._bins:
+                clock.sleep(start + slot * period - clock.now())
+                sample_time = clock.now()
+                params = self._device.get_params_in_user_unit()
+                value = self._read_value() if self._read_value else None
+                if params:
+                    sample_bin = int(math.floor((params["position"] - self._start) * self._direction / self._width))
+                    while index < min(sample_bin, self._bins):
+                        yield self._get_bin(index, accumulator)
+                        index += 1
+                        accumulator = _BinAccumulator()
+                    if sample_bin == index:
+                        accumulator.add(sample_time - start, params["position"], value)
+                    if not params["moving_status"] & MVCMD_RUNNING:
+                        break
+                if deadline is not None and sample_time > deadline:
+                    raise TimeoutError(f"Scan did not finish in {timeout} sec")
+                slot = max(slot + 1, int((clock.now() - start) / period))
+            # Bins that device has not reached
+            while index < self._bins:
+                yield self._get_bin(index, accumulator)
+                index += 1
+                accumulator = _BinAccumulator()
+        finally:
+            if index < self._bins:
+                self._device.stop_motion()
+            self._device.wait_for_stop(timeout)
+            self._device.set_move_settings(settings)
@@ -0,0 +1,166 @@
+import time
+from typing import Any, Iterator, List, Optional, Sequence
+from ximc_device import capture
+from ximc_device.guard import GroupGuard, LimitError
+from ximc_device.motion import MoveSettings
+from ximc_device.telemetry import Telemetry
+
+
+class DeviceGroup:
+    """
+    Class to control several controllers (axes) as one multi-axis device. Axes
+    can be XimcDevice or SimulatedDevice objects.
+    """
+
+    def __init__(self, devices: Sequence[Any]) -> None:
+        """
+        :param devices: devices, one for each axis.
+        """
+
+        self._devices: List[Any] = list(devices)
+        self._guard: Optional[GroupGuard] = None
+
+    def __getitem__(self, index: int) -> Any:
+        return self._devices[index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._devices)
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    @property
+    def devices(self) -> List[Any]:
+        """
+        :return: devices of group.
+        """
+
+        return list(self._devices)
+
+    @property
+    def guard(self) -> Optional[GroupGuard]:
+        """
+        :return: keep-out zones of group in user unit.
+        """
+
+        return self._guard
+
+    @property
+    def user_multipliers(self) -> List[float]:
+        """
+        :return: coefficients for converting motor steps to user unit for all axes.
+        """
+
+        return [device.user_multiplier for device in self._devices]
+
+    def capture(self, duration: float, rate: float, in_user_unit: bool = False) -> List[Telemetry]:
+        """
+        Method reads status of all axes with fixed rate and one time base.
+        :param duration: duration of capture in seconds;
+        :param rate: number of samples per second;
+        :param in_user_unit: if True then position and speed are read in user unit.
+        :return: telemetry with samples for each axis.
+        """
+
+        return capture.capture_many(self._devices, duration, rate, in_user_unit)
+
+    def check_move_in_user_unit(self, position: Sequence[float]) -> None:
+        """
+        Method checks motion of all axes to given point with soft limits of axes and
+        keep-out zones of group. LimitError is raised if motion is forbidden.
+        :param position: positions of axes in user unit.
+        """
+
+        if len(position) != len(self._devices):
+            raise ValueError(f"Point has {len(position)} coordinates, but group has {len(self._devices)} axes")
+        current = self.get_position_in_user_unit()
+        if None in current:
+            raise LimitError("Failed to read positions to check soft limits")
+        for device, start, end in zip(self._devices, current, position):
+            guard = getattr(device, "guard", None)
+            if guard is not None:
+                guard.check_move(start * device.user_multiplier, end * device.user_multiplier)
+        if self._guard is not None:
+            self._guard.check_move(current, position)
+
+    def check_moving(self) -> bool:
+        """
+        :return: True if at least one axis is moving.
+        """
+
+        return any(device.check_moving() for device in self._devices)
+
+    def close_device(self) -> None:
+        """
+        Method closes all devices.
+        """
+
+        for device in self._devices:
+            device.close_device()
+
+    def emergency_stop(self, immediate: bool = False) -> bool:
+        """
+        Method stops all axes without waiting for command locks (see XimcDevice.emergency_stop).
+        :param immediate: if True then motion is stopped immediately, otherwise smoothly.
+        :return: True if stop command was sent to all axes.
+        """
+
+        results = [device.emergency_stop(immediate) for device in self._devices]
+        return all(results)
+
+    def get_move_settings(self) -> List[Optional[MoveSettings]]:
+        """
+        :return: motion settings of all axes.
+        """
+
+        return [device.get_move_settings() for device in self._devices]
+
+    def get_position_in_user_unit(self) -> List[Optional[float]]:
+        """
+        :return: positions of all axes in user unit.
+        """
+
+        return [device.get_position_in_user_unit() for device in self._devices]
+
+    def move_to_position_in_user_unit(self, position: Sequence[float]) -> None:
+        """
+        Method runs all axes to given point at the same time. Motion is checked with
+        soft limits before any axis is started, LimitError is raised if it is forbidden.
+        :param position: positions of axes in user unit.
+        """
+
+        if len(position) != len(self._devices):
+            raise ValueError(f"Point has {len(position)} coordinates, but group has {len(self._devices)} axes")
+        if self._guard is not None or any(getattr(device, "guard", None) for device in self._devices):
+            self.check_move_in_user_unit(position)
+        for device, axis_position in zip(self._devices, position):
+            device.move_to_position_in_user_unit(axis_position)
+
+    def set_guard(self, guard: Optional[GroupGuard]) -> None:
+        """
+        :param guard: keep-out zones of group in user unit or None to remove zones.
+        """
+
+        self._guard = guard
+
+    def stop_motion(self) -> None:
+        """
+        Method stops movement of all axes.
+        """
+
+        for device in self._devices:
+            device.stop_motion()
+
+    def wait_for_stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Method waits until all axes stop.
+        :param timeout: maximum time to wait in seconds.
+        :return: True if all axes stopped.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for device in self._devices:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not device.wait_for_stop(remaining):
+                return False
+        return True
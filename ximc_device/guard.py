@@ -0,0 +1,403 @@
+import bisect
+import configparser
+import math
+from typing import List, Optional, Sequence, Tuple, Union
+import numpy as np
+from ximc_device.motion import microsteps_per_step
+
+
+Zone = Tuple[float, float]
+Box = Tuple[Tuple[float, ...], Tuple[float, ...]]
+
+
+class LimitError(ValueError):
+    """
+    Exception raised when target or path of motion is out of soft limits.
+    """
+
+    pass
+
+
+def _merge_zones(zones: Sequence[Zone]) -> List[Zone]:
+    """
+    :param zones: keep-out zones, boundaries of zone can be given in any order.
+    :return: sorted disjoint zones, overlapping zones are merged.
+    """
+
+    merged = []
+    for start, end in sorted((min(zone), max(zone)) for zone in zones):
+        if start == end:
+            continue
+        if merged and start < merged[-1][1]:
+            merged[-1] = merged[-1][0], max(merged[-1][1], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class AxisGuard:
+    """
+    Soft limits of one axis: borders of allowed range and keep-out zones. Borders
+    are allowed positions, zones are open intervals, so device can stand on zone
+    boundary. Zones are merged and sorted when guard is created, and every check
+    is binary search over zone boundaries. If device is already in forbidden
+    region, motion that leaves it is allowed.
+    """
+
+    def __init__(self, left: Optional[float] = None, right: Optional[float] = None,
+                 zones: Sequence[Zone] = ()) -> None:
+        """
+        :param left: left border, None if there is no border;
+        :param right: right border, None if there is no border;
+        :param zones: keep-out zones (start, end).
+        """
+
+        if left is not None and right is not None and left > right:
+            raise ValueError(f"Left border {left} is greater than right border {right}")
+        self._left: float = -math.inf if left is None else left
+        self._right: float = math.inf if right is None else right
+        self._zones: List[Zone] = _merge_zones(zones)
+        self._starts: List[float] = [start for start, _ in self._zones]
+        self._ends: List[float] = [end for _, end in self._zones]
+        self._starts_array: np.ndarray = np.array(self._starts, dtype=np.float64)
+        self._ends_array: np.ndarray = np.array(self._ends, dtype=np.float64)
+
+    @property
+    def left(self) -> float:
+        """
+        :return: left border (-inf if there is no border).
+        """
+
+        return self._left
+
+    @property
+    def right(self) -> float:
+        """
+        :return: right border (inf if there is no border).
+        """
+
+        return self._right
+
+    @property
+    def zones(self) -> List[Zone]:
+        """
+        :return: sorted disjoint keep-out zones.
+        """
+
+        return list(self._zones)
+
+    def _find_zone(self, position: float) -> int:
+        """
+        :param position: position.
+        :return: index of zone that contains position or -1.
+        """
+
+        index = bisect.bisect_left(self._starts, position) - 1
+        if index >= 0 and position < self._ends[index]:
+            return index
+        return -1
+
+    @classmethod
+    def from_config(cls, config: Union[str, configparser.ConfigParser], zones: Sequence[Zone] = ()) -> "AxisGuard":
+        """
+        Method creates guard with borders from [Borders] section of controller profile
+        (Left_border, Right_border and microsteps). Borders are in steps.
+        :param config: path to profile or parsed profile;
+        :param zones: keep-out zones in steps.
+        :return: guard.
+        """
+
+        if isinstance(config, str):
+            path = config
+            config = configparser.ConfigParser()
+            if not config.read(path, encoding="utf-8"):
+                raise ValueError(f"Failed to read profile {path}")
+        borders = config["Borders"]
+        microstep_mode = config.getint("Engine", "Microstep_mode", fallback=9)
+        microsteps = microsteps_per_step(microstep_mode)
+        left = borders.getint("Left_border") + borders.getint("Left_border_usteps", fallback=0) / microsteps
+        right = borders.getint("Right_border") + borders.getint("Right_border_usteps", fallback=0) / microsteps
+        return cls(left, right, zones)
+
+    def check_move(self, start: float, end: float) -> None:
+        """
+        Method checks that motion from start to end does not end out of borders and
+        does not cross keep-out zones.
+        :param start: current position;
+        :param end: target position.
+        """
+
+        self.check_position(end)
+        low, high = min(start, end), max(start, end)
+        start_zone = self._find_zone(start)
+        index = bisect.bisect_right(self._ends, low)
+        while index < len(self._zones) and self._starts[index] < high:
+            if index != start_zone:
+                raise LimitError(f"Motion from {start} to {end} crosses keep-out zone {self._zones[index]}")
+            index += 1
+
+    def check_position(self, position: float) -> None:
+        """
+        :param position: position to check.
+        """
+
+        if not self._left <= position <= self._right:
+            raise LimitError(f"Position {position} is out of borders [{self._left}, {self._right}]")
+        index = self._find_zone(position)
+        if index >= 0:
+            raise LimitError(f"Position {position} is in keep-out zone {self._zones[index]}")
+
+    def is_allowed(self, position: float) -> bool:
+        """
+        :param position: position.
+        :return: True if position is in allowed range and out of keep-out zones.
+        """
+
+        return self._left <= position <= self._right and self._find_zone(position) < 0
+
+    def scaled(self, multiplier: float) -> "AxisGuard":
+        """
+        Method converts guard to other units, for example, from user unit to steps.
+        :param multiplier: coefficient for converting positions.
+        :return: new guard.
+        """
+
+        bounds = sorted((self._left * multiplier, self._right * multiplier))
+        return AxisGuard(bounds[0], bounds[1], [(start * multiplier, end * multiplier) for start, end in self._zones])
+
+    def travel_limit(self, position: float, direction: int) -> float:
+        """
+        :param position: current position;
+        :param direction: direction of motion (1 or -1).
+        :return: the farthest position that can be reached from current position in given
+        direction (inf or -inf if there are no limits).
+        """
+
+        index = self._find_zone(position)
+        if direction > 0:
+            if position >= self._right:
+                return position
+            next_zone = index + 1 if index >= 0 else bisect.bisect_left(self._starts, position)
+            return min(self._right, self._starts[next_zone]) if next_zone < len(self._zones) else self._right
+        if position <= self._left:
+            return position
+        previous_zone = index - 1 if index >= 0 else bisect.bisect_right(self._ends, position) - 1
+        return max(self._left, self._ends[previous_zone]) if previous_zone >= 0 else self._left
+
+    def validate(self, positions: Sequence[float]) -> np.ndarray:
+        """
+        Method checks many positions at once.
+        :param positions: positions.
+        :return: boolean array, True for allowed positions.
+        """
+
+        positions = np.asarray(positions, dtype=np.float64)
+        allowed = (positions >= self._left) & (positions <= self._right)
+        if self._zones:
+            index = np.searchsorted(self._starts_array, positions, side="left") - 1
+            in_zone = (index >= 0) & (positions < self._ends_array[np.maximum(index, 0)])
+            allowed &= ~in_zone
+        return allowed
+
+    def validate_path(self, positions: Sequence[float]) -> np.ndarray:
+        """
+        Method checks trajectory that goes through positions one after another.
+        :param positions: positions of trajectory.
+        :return: boolean array with length less by one than number of positions, True
+        for allowed moves between neighbouring positions.
+        """
+
+        positions = np.asarray(positions, dtype=np.float64)
+        if len(positions) < 2:
+            return np.ones(0, dtype=bool)
+        allowed = self.validate(positions[1:])
+        if self._zones:
+            low = np.minimum(positions[:-1], positions[1:])
+            high = np.maximum(positions[:-1], positions[1:])
+            # The first zone that ends after the lower end of move is the only candidate
+            # for crossing (zones are disjoint); moves that start inside zone may leave it
+            index = np.searchsorted(self._ends_array, low, side="right")
+            valid = index < len(self._zones)
+            index = np.minimum(index, len(self._zones) - 1)
+            crossing = valid & (self._starts_array[index] < high)
+            start_index = np.searchsorted(self._starts_array, positions[:-1], side="left") - 1
+            starts_in_zone = (start_index == index) & (positions[:-1] < self._ends_array[index])
+            next_index = np.minimum(index + 1, len(self._zones) - 1)
+            crossing_next = starts_in_zone & (index + 1 < len(self._zones)) & (self._starts_array[next_index] < high)
+            allowed &= ~(crossing & ~starts_in_zone) & ~crossing_next
+        return allowed
+
+
+class GroupGuard:
+    """
+    Keep-out zones of multi-axis device (DeviceGroup). Zone is box given by low and
+    high corners, zones are open boxes. Boxes are indexed by slabs along the first
+    axis: every slab between neighbouring box boundaries stores boxes that cover it,
+    so box candidates for point are found with binary search. Positions are in
+    user unit of axes.
+    """
+
+    def __init__(self, zones: Sequence[Box]) -> None:
+        """
+        :param zones: keep-out boxes (low corner, high corner).
+        """
+
+        boxes = []
+        for low, high in zones:
+            if len(low) != len(high):
+                raise ValueError("Corners of box must have the same number of coordinates")
+            boxes.append((tuple(min(pair) for pair in zip(low, high)), tuple(max(pair) for pair in zip(low, high))))
+        if len({len(low) for low, _ in boxes}) > 1:
+            raise ValueError("All boxes must have the same number of coordinates")
+        self._boxes: List[Box] = boxes
+        self._edges: List[float] = sorted({value for low, high in boxes for value in (low[0], high[0])})
+        # Open box with zero size along any axis is empty, it is not put to slabs
+        indexes = [index for index, (low, high) in enumerate(boxes)
+                   if all(low_value < high_value for low_value, high_value in zip(low, high))]
+        self._slabs: List[Tuple[int, ...]] = [
+            tuple(index for index in indexes if boxes[index][0][0] <= left and right <= boxes[index][1][0])
+            for left, right in zip(self._edges, self._edges[1:])]
+        self._edges_array: np.ndarray = np.array(self._edges, dtype=np.float64)
+        self._first_slabs: List[int] = [bisect.bisect_left(self._edges, low[0]) for low, _ in boxes]
+        self._lows: np.ndarray = np.array([low for low, _ in boxes], dtype=np.float64)
+        self._highs: np.ndarray = np.array([high for _, high in boxes], dtype=np.float64)
+
+    @property
+    def zones(self) -> List[Box]:
+        """
+        :return: keep-out boxes.
+        """
+
+        return list(self._boxes)
+
+    def _find_box(self, point: Sequence[float]) -> int:
+        """
+        :param point: point.
+        :return: index of box that contains point or -1.
+        """
+
+        slab = bisect.bisect_right(self._edges, point[0]) - 1
+        if not 0 <= slab < len(self._slabs):
+            return -1
+        for index in self._slabs[slab]:
+            low, high = self._boxes[index]
+            if all(low_value < value < high_value for value, low_value, high_value in zip(point, low, high)):
+                return index
+        return -1
+
+    def _find_crossings(self, low: np.ndarray, high: np.ndarray, starts: Optional[np.ndarray] = None
+                        ) -> np.ndarray:
+        """
+        Method finds moves whose bounding boxes cross keep-out zones. Moves are spread
+        over slabs they overlap, and every pair of move and box is checked once, in
+        the first slab that is common to move and box.
+        :param low: low corners of bounding boxes of moves, array with shape (number of moves, number of axes);
+        :param high: high corners of bounding boxes of moves;
+        :param starts: start points of moves, boxes that contain start point of move can be left.
+        :return: boolean array, True for moves that cross keep-out zone.
+        """
+
+        crossing = np.zeros(len(low), dtype=bool)
+        if not self._slabs or not len(low):
+            return crossing
+        first, last = self._get_slab_ranges(low[:, 0], high[:, 0])
+        counts = np.maximum(last - first + 1, 0)
+        moves = np.repeat(np.arange(len(low)), counts)
+        slabs = first[moves] + np.arange(len(moves)) - np.repeat(np.cumsum(counts) - counts, counts)
+        order = np.argsort(slabs, kind="stable")
+        bounds = np.searchsorted(slabs[order], np.arange(len(self._slabs) + 1))
+        for slab, boxes in enumerate(self._slabs):
+            pairs = moves[order[bounds[slab]:bounds[slab + 1]]]
+            if not len(pairs):
+                continue
+            first_pairs = pairs[first[pairs] == slab]
+            for index in boxes:
+                candidates = pairs if self._first_slabs[index] == slab else first_pairs
+                box_low = self._lows[index]
+                box_high = self._highs[index]
+                hits = np.all((low[candidates] < box_high) & (high[candidates] > box_low), axis=1)
+                if starts is not None:
+                    hits &= ~np.all((starts[candidates] > box_low) & (starts[candidates] < box_high), axis=1)
+                crossing[candidates[hits]] = True
+        return crossing
+
+    def _get_slab_ranges(self, low: np.ndarray, high: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :param low: lower bounds of intervals along the first axis;
+        :param high: upper bounds of intervals along the first axis.
+        :return: indexes of the first and the last slabs that overlap open intervals
+        (interval of zero length overlaps slab that contains it), the last index is
+        less than the first one if there is no such slab.
+        """
+
+        first = np.searchsorted(self._edges_array, low, side="right") - 1
+        last = np.maximum(np.searchsorted(self._edges_array, high, side="left") - 1, first)
+        return np.maximum(first, 0), np.minimum(last, len(self._slabs) - 1)
+
+    def check_move(self, start: Sequence[float], end: Sequence[float]) -> None:
+        """
+        Method checks motion between points. Axes of group move independently, so
+        the path is not known exactly, and motion is forbidden if box that contains
+        start and end points crosses keep-out zone (boxes that contain start point
+        can be left).
+        :param start: current point;
+        :param end: target point.
+        """
+
+        self.check_position(end)
+        if not self._slabs:
+            return
+        low = np.minimum(start, end)
+        high = np.maximum(start, end)
+        first, last = self._get_slab_ranges(low[0], high[0])
+        candidates = sorted({index for boxes in self._slabs[first:last + 1] for index in boxes})
+        for index in candidates:
+            box_low = self._lows[index]
+            box_high = self._highs[index]
+            starts_inside = np.all((np.asarray(start) > box_low) & (np.asarray(start) < box_high))
+            if np.all((low < box_high) & (high > box_low)) and not starts_inside:
+                raise LimitError(f"Motion from {tuple(start)} to {tuple(end)} can cross keep-out zone "
+                                 f"{self._boxes[index]}")
+
+    def check_position(self, point: Sequence[float]) -> None:
+        """
+        :param point: point to check.
+        """
+
+        index = self._find_box(point)
+        if index >= 0:
+            raise LimitError(f"Point {tuple(point)} is in keep-out zone {self._boxes[index]}")
+
+    def is_allowed(self, point: Sequence[float]) -> bool:
+        """
+        :param point: point.
+        :return: True if point is out of keep-out zones.
+        """
+
+        return self._find_box(point) < 0
+
+    def validate(self, points: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        Method checks many points at once.
+        :param points: points, array with shape (number of points, number of axes).
+        :return: boolean array, True for allowed points.
+        """
+
+        points = np.asarray(points, dtype=np.float64)
+        # Point is a move of zero length, it crosses only boxes that contain it
+        return ~self._find_crossings(points, points)
+
+    def validate_path(self, points: Sequence[Sequence[float]]) -> np.ndarray:
+        """
+        Method checks trajectory that goes through points one after another (see check_move).
+        :param points: points of trajectory, array with shape (number of points, number of axes).
+        :return: boolean array with length less by one than number of points, True
+        for allowed moves between neighbouring points.
+        """
+
+        points = np.asarray(points, dtype=np.float64)
+        if len(points) < 2:
+            return np.ones(0, dtype=bool)
+        low = np.minimum(points[:-1], points[1:])
+        high = np.maximum(points[:-1], points[1:])
+        return self.validate(points[1:]) & ~self._find_crossings(low, high, points[:-1])
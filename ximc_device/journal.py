@@ -0,0 +1,674 @@
+import collections
+import struct
+import threading
+import time
+from typing import Any, BinaryIO, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+import numpy as np
+from ximc_device import capture
+from ximc_device.device_logger import DeviceLogger
+from ximc_device.guard import AxisGuard
+from ximc_device.motion import MoveSettings
+from ximc_device.snapshot import DeviceSnapshot
+from ximc_device.status_board import StatusBoardWriter
+from ximc_device.telemetry import STEPS_CHANNELS, STEPS_DTYPE, Telemetry, USER_UNIT_CHANNELS, USER_UNIT_DTYPE
+
+
+MAGIC: bytes = b"XIMCJRN1"
+# Kinds of records
+RECORD_NAME: int = 0
+RECORD_CALL: int = 1
+RECORD_ERROR: int = 2
+RECORD_STATUS: int = 3
+# Record header: kind, ID of device URI, ID of method name, time of call from the start of journal,
+# duration of call, length of payload
+_HEADER = struct.Struct("<BHHdfI")
+_LENGTH = struct.Struct("<I")
+_FLOAT = struct.Struct("<d")
+_INT = struct.Struct("<q")
+# Status is written as fixed structure with channels of telemetry in the same order
+_STATUS_METHODS: Dict[str, Tuple[struct.Struct, List[str]]] = {
+    "get_params": (struct.Struct("<" + "".join(np.dtype(dtype).char for _, dtype in STEPS_CHANNELS)),
+                   [name for name, _ in STEPS_CHANNELS]),
+    "get_params_in_user_unit": (struct.Struct("<" + "".join(np.dtype(dtype).char for _, dtype in USER_UNIT_CHANNELS)),
+                                [name for name, _ in USER_UNIT_CHANNELS])}
+
+
+class JournalRecord(NamedTuple):
+    """
+    Record of journal. For error records result is the text of exception.
+    """
+
+    kind: int
+    device_uri: str
+    name: str
+    time: float
+    duration: float
+    args: List[Any]
+    kwargs: Dict[str, Any]
+    result: Any
+
+
+def _encode(value: Any, buffer: bytearray) -> None:
+    """
+    Function writes value to buffer. Objects with to_json method (for example,
+    DeviceSnapshot) are written as JSON strings, tuples are written as lists.
+    :param value: value;
+    :param buffer: buffer.
+    """
+
+    if value is None:
+        buffer += b"N"
+    elif isinstance(value, bool):
+        buffer += b"T" if value else b"F"
+    elif isinstance(value, (int, np.integer)):
+        buffer += b"i" + _INT.pack(int(value))
+    elif isinstance(value, (float, np.floating)):
+        buffer += b"d" + _FLOAT.pack(float(value))
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        buffer += b"s" + _LENGTH.pack(len(data)) + data
+    elif isinstance(value, (bytes, bytearray)):
+        buffer += b"y" + _LENGTH.pack(len(value)) + bytes(value)
+    elif isinstance(value, (list, tuple)):
+        buffer += b"l" + _LENGTH.pack(len(value))
+        for item in value:
+            _encode(item, buffer)
+    elif isinstance(value, dict):
+        buffer += b"m" + _LENGTH.pack(len(value))
+        for key, item in value.items():
+            _encode(key, buffer)
+            _encode(item, buffer)
+    elif hasattr(value, "to_json"):
+        _encode(value.to_json(), buffer)
+    else:
+        _encode(repr(value), buffer)
+
+
+def _decode(data: bytes, offset: int) -> Tuple[Any, int]:
+    """
+    :param data: data;
+    :param offset: offset of value in data.
+    :return: value and offset of the next value.
+    """
+
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag in (b"T", b"F"):
+        return tag == b"T", offset
+    if tag == b"i":
+        return _INT.unpack_from(data, offset)[0], offset + _INT.size
+    if tag == b"d":
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+    if tag in (b"s", b"y"):
+        length = _LENGTH.unpack_from(data, offset)[0]
+        offset += _LENGTH.size
+        value = bytes(data[offset:offset + length])
+        return (value.decode("utf-8") if tag == b"s" else value), offset + length
+    if tag in (b"l", b"m"):
+        count = _LENGTH.unpack_from(data, offset)[0]
+        offset += _LENGTH.size
+        items = []
+        for _ in range(count * (2 if tag == b"m" else 1)):
+            item, offset = _decode(data, offset)
+            items.append(item)
+        if tag == b"l":
+            return items, offset
+        return dict(zip(items[::2], items[1::2])), offset
+    raise ValueError(f"Unknown tag {tag!r} in journal")
+
+
+class JournalWriter:
+    """
+    Class writes calls of device methods with arguments, results and timestamps to
+    binary file. Status requests are written as fixed structures, so long recordings
+    stay compact. One journal can be shared by several devices. Only the outermost
+    call is written: methods called by other methods of device are not.
+    """
+
+    def __init__(self, file: Union[str, BinaryIO]) -> None:
+        """
+        :param file: path to journal file or binary file object.
+        """
+
+        self._file: BinaryIO = open(file, "wb") if isinstance(file, str) else file
+        self._own_file: bool = isinstance(file, str)
+        self._ids: Dict[str, int] = {}
+        self._local: threading.local = threading.local()
+        self._lock: threading.Lock = threading.Lock()
+        self._start: float = time.monotonic()
+        self._file.write(MAGIC)
+
+    def __enter__(self) -> "JournalWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _get_id(self, text: str) -> int:
+        """
+        Method returns ID of string (device URI or method name). When string is met
+        for the first time, record with the string is written.
+        :param text: string.
+        :return: ID of string.
+        """
+
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = self._ids[text] = len(self._ids)
+            data = text.encode("utf-8")
+            self._file.write(_HEADER.pack(RECORD_NAME, 0, string_id, 0, 0, len(data)) + data)
+        return string_id
+
+    def call(self, device, func, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        """
+        Method calls method of device and writes the call to journal.
+        :param device: device;
+        :param func: method of device class;
+        :param args: non-keyword arguments for method;
+        :param kwargs: keyword arguments for method.
+        :return: result of method.
+        """
+
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            return func(device, *args, **kwargs)
+        self._local.depth = 1
+        start = time.monotonic()
+        try:
+            result = func(device, *args, **kwargs)
+        except Exception as exc:
+            self.write(RECORD_ERROR, device.device_uri, func.__name__, start, args, kwargs,
+                       f"{type(exc).__name__}: {exc}")
+            raise
+        finally:
+            self._local.depth = 0
+        kind = RECORD_STATUS if func.__name__ in _STATUS_METHODS else RECORD_CALL
+        self.write(kind, device.device_uri, func.__name__, start, args, kwargs, result)
+        return result
+
+    def close(self) -> None:
+        """
+        Method flushes journal and closes file if it was opened by journal.
+        """
+
+        with self._lock:
+            self._file.flush()
+            if self._own_file:
+                self._file.close()
+
+    def write(self, kind: int, device_uri: str, name: str, start: float, args: Tuple[Any, ...],
+              kwargs: Dict[str, Any], result: Any) -> None:
+        """
+        Method writes record to journal.
+        :param kind: kind of record;
+        :param device_uri: URI of device;
+        :param name: name of method;
+        :param start: moment of time.monotonic when method was called;
+        :param args: non-keyword arguments of method;
+        :param kwargs: keyword arguments of method;
+        :param result: result of method (text of exception for error record).
+        """
+
+        duration = time.monotonic() - start
+        if kind == RECORD_STATUS:
+            status_struct, channels = _STATUS_METHODS[name]
+            payload = status_struct.pack(*(result[channel] for channel in channels)) if result else b""
+        else:
+            payload = bytearray()
+            _encode(list(args), payload)
+            _encode(kwargs, payload)
+            _encode(result, payload)
+        with self._lock:
+            device_id = self._get_id(device_uri)
+            name_id = self._get_id(name)
+            self._file.write(_HEADER.pack(kind, device_id, name_id, start - self._start, duration, len(payload)))
+            self._file.write(payload)
+
+
+def read_journal(file: Union[str, BinaryIO]) -> Iterator[JournalRecord]:
+    """
+    Function reads records of calls from journal.
+    :param file: path to journal file or binary file object.
+    :return: records of calls in the order they were written.
+    """
+
+    if isinstance(file, str):
+        with open(file, "rb") as journal_file:
+            yield from read_journal(journal_file)
+        return
+
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("File is not journal of XIMC device")
+    strings = {}
+    while True:
+        header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        kind, device_id, name_id, start, duration, length = _HEADER.unpack(header)
+        payload = file.read(length)
+        if len(payload) < length:
+            # Journal was not closed properly, the last record is incomplete
+            return
+        if kind == RECORD_NAME:
+            strings[name_id] = payload.decode("utf-8")
+            continue
+        name = strings[name_id]
+        if kind == RECORD_STATUS:
+            status_struct, channels = _STATUS_METHODS[name]
+            result = dict(zip(channels, status_struct.unpack(payload))) if payload else {}
+            yield JournalRecord(kind, strings[device_id], name, start, duration, [], {}, result)
+        else:
+            args, offset = _decode(payload, 0)
+            kwargs, offset = _decode(payload, offset)
+            result, _ = _decode(payload, offset)
+            yield JournalRecord(kind, strings[device_id], name, start, duration, args, kwargs, result)
+
+
+def read_status(file: Union[str, BinaryIO], device_uri: Optional[str] = None, in_user_unit: bool = False
+                ) -> Telemetry:
+    """
+    Function reads status requests of device from journal.
+    :param file: path to journal file or binary file object;
+    :param device_uri: URI of device, by default the first device in journal;
+    :param in_user_unit: if True then status requests in user unit are read.
+    :return: telemetry with time of requests from the start of journal.
+    """
+
+    name = "get_params_in_user_unit" if in_user_unit else "get_params"
+    records = []
+    for record in read_journal(file):
+        if device_uri is None:
+            device_uri = record.device_uri
+        if record.kind == RECORD_STATUS and record.name == name and record.device_uri == device_uri and \
+                record.result:
+            records.append(record)
+    data = Telemetry.empty(USER_UNIT_DTYPE if in_user_unit else STEPS_DTYPE, len(records))
+    for index, record in enumerate(records):
+        data["time"][index] = record.time
+        for channel, value in record.result.items():
+            data[channel][index] = value
+    return data
+
+
+class ReplayDevice:
+    """
+    Device that replays journal with the same interface as XimcDevice. Each call
+    of method returns the next recorded result of this method, so code that works
+    with device (panels, capture, analytics) can be run without hardware. Calls
+    are delayed to recorded time and duration divided by speed. When recorded
+    results of method run out, the last result is repeated. Replayed calls can be
+    written to other journal and replayed statuses can be published to status board.
+    """
+
+    def __init__(self, file: Union[str, BinaryIO], device_uri: Optional[str] = None, speed: Optional[float] = 1,
+                 user_multiplier: Optional[float] = None) -> None:
+        """
+        :param file: path to journal file or binary file object;
+        :param device_uri: URI of device to replay, by default the first device in journal;
+        :param speed: speed of replay, for example 10 is ten times faster than recorded,
+        None means replay without delays;
+        :param user_multiplier: coefficient for converting motor steps to user unit.
+        """
+
+        self._calls: Dict[str, Deque[JournalRecord]] = collections.defaultdict(collections.deque)
+        self._device_id: int = 1
+        self._device_uri: Optional[str] = device_uri
+        self._guard: Optional[AxisGuard] = None
+        self._journal: Optional[JournalWriter] = None
+        self._last_results: Dict[str, JournalRecord] = {}
+        self._lock: threading.RLock = threading.RLock()
+        self._speed: Optional[float] = speed
+        self._start: Optional[float] = None
+        self._status_board: Optional[StatusBoardWriter] = None
+        self._user_multiplier: float = user_multiplier or 1
+        for record in read_journal(file):
+            if self._device_uri is None:
+                self._device_uri = record.device_uri
+            if record.device_uri == self._device_uri:
+                self._calls[record.name].append(record)
+        self._logger: DeviceLogger = DeviceLogger(self._device_uri or "replay")
+
+    @property
+    def device_id(self) -> int:
+        """
+        :return: controller ID.
+        """
+
+        return self._device_id
+
+    @property
+    def device_info(self) -> None:
+        """
+        :return: information about controller is not replayed.
+        """
+
+        return None
+
+    @property
+    def device_uri(self) -> str:
+        """
+        :return: URI of replayed device.
+        """
+
+        return self._device_uri
+
+    @property
+    def guard(self) -> Optional[AxisGuard]:
+        """
+        :return: soft limits of device in steps.
+        """
+
+        return self._guard
+
+    @property
+    def journal(self) -> Optional[JournalWriter]:
+        """
+        :return: journal to which replayed calls are written.
+        """
+
+        return self._journal
+
+    @property
+    def logger(self) -> DeviceLogger:
+        """
+        :return: logger of device, replayed errors are not written to it.
+        """
+
+        return self._logger
+
+    @property
+    def remaining(self) -> int:
+        """
+        :return: number of recorded calls that have not been replayed yet.
+        """
+
+        with self._lock:
+            return sum(len(records) for records in self._calls.values())
+
+    @property
+    def user_multiplier(self) -> float:
+        """
+        :return: coefficient for converting motor steps to user unit (number of steps in user unit).
+        """
+
+        return self._user_multiplier
+
+    @property
+    def status_board(self) -> Optional[StatusBoardWriter]:
+        """
+        :return: shared memory board to which replayed statuses are published.
+        """
+
+        return self._status_board
+
+    def _publish(self, params: Dict[str, Any], in_user_unit: bool) -> None:
+        """
+        Method publishes replayed status to status board. Slot is written under lock of
+        device, so there is one writer per slot as seqlock of board requires.
+        :param params: replayed parameters of controller;
+        :param in_user_unit: if True then params are in user unit.
+        """
+
+        if params:
+            with self._lock:
+                if self._status_board is not None:
+                    self._status_board.publish(self._device_uri, params, in_user_unit)
+
+    def _replay(self, name: str) -> Any:
+        """
+        Method returns the next recorded result of method.
+        :param name: name of method.
+        :return: recorded result.
+        """
+
+        with self._lock:
+            if self._start is None:
+                self._start = time.monotonic()
+            records = self._calls.get(name)
+            record = records.popleft() if records else self._last_results.get(name)
+            if record is None:
+                return None
+            self._last_results[name] = record
+            if self._speed and records is not None:
+                delay = self._start + record.time / self._speed - time.monotonic()
+            else:
+                delay = 0
+        if delay > 0:
+            time.sleep(delay)
+        if self._speed:
+            with self._lock:
+                time.sleep(record.duration / self._speed)
+        if self._journal is not None:
+            self._journal.write(record.kind, self._device_uri, name, time.monotonic() - record.duration, record.args,
+                                record.kwargs, record.result)
+        if record.kind == RECORD_ERROR:
+            raise RuntimeError(f"Replayed error of {name}: {record.result}")
+        return record.result
+
+    def capture(self, duration: float, rate: float, in_user_unit: bool = False) -> Telemetry:
+        """
+        :param duration: duration of capture in seconds;
+        :param rate: number of samples per second;
+        :param in_user_unit: if True then position and speed are read in user unit.
+        :return: telemetry with samples (see capture.STEPS_DTYPE and capture.USER_UNIT_DTYPE).
+        """
+
+        return capture.capture(self, duration, rate, in_user_unit)
+
+    def check_moving(self) -> bool:
+        """
+        :return: recorded moving state.
+        """
+
+        return bool(self._replay("check_moving"))
+
+    def close_device(self) -> None:
+        """
+        Method finishes replay of device.
+        """
+
+        self._replay("close_device")
+        self._device_id = -1
+
+    def emergency_stop(self, immediate: bool = False) -> bool:
+        """
+        Emergency stops are not written to journal, so replayed device only reports
+        whether it is open.
+        :param immediate: is kept for compatibility with XimcDevice.
+        :return: True if device is open.
+        """
+
+        return self._device_id > 0
+
+    def get_device_full_info(self) -> List[Tuple[str, str]]:
+        """
+        :return: recorded full device information.
+        """
+
+        return [tuple(item) for item in self._replay("get_device_full_info") or []]
+
+    def get_latest_params(self, in_user_unit: bool = False, max_age: Optional[float] = None,
+                          timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        :param in_user_unit: if True then status in user unit is returned;
+        :param max_age: is kept for compatibility with XimcDevice, every call returns the next recorded status;
+        :param timeout: is kept for compatibility with XimcDevice.
+        :return: dictionary with parameters of controller.
+        """
+
+        params = self.get_params_in_user_unit() if in_user_unit else self.get_params()
+        return params or {}
+
+    def get_move_settings(self) -> Optional[MoveSettings]:
+        """
+        :return: recorded motion settings in steps.
+        """
+
+        settings = self._replay("get_move_settings")
+        return MoveSettings(*settings) if settings else None
+
+    def get_params(self) -> Dict[str, Any]:
+        """
+        :return: recorded parameters of controller in steps.
+        """
+
+        params = dict(self._replay("get_params") or {})
+        self._publish(params, False)
+        return params
+
+    def get_params_in_user_unit(self) -> Dict[str, Any]:
+        """
+        :return: recorded parameters of controller in user unit.
+        """
+
+        params = dict(self._replay("get_params_in_user_unit") or {})
+        self._publish(params, True)
+        return params
+
+    def get_position(self) -> Optional[int]:
+        """
+        :return: recorded position in steps.
+        """
+
+        return self._replay("get_position")
+
+    def get_position_in_user_unit(self) -> Optional[float]:
+        """
+        :return: recorded position in user unit.
+        """
+
+        return self._replay("get_position_in_user_unit")
+
+    def move_left(self) -> None:
+        """
+        Method replays motion to left.
+        """
+
+        self._replay("move_left")
+
+    def move_right(self) -> None:
+        """
+        Method replays motion to right.
+        """
+
+        self._replay("move_right")
+
+    def move_to_position(self, position: int) -> None:
+        """
+        :param position: position in steps, it is ignored, recorded call is replayed.
+        """
+
+        self._replay("move_to_position")
+
+    def move_to_position_in_user_unit(self, position: float) -> None:
+        """
+        :param position: position in user unit, it is ignored, recorded call is replayed.
+        """
+
+        self._replay("move_to_position_in_user_unit")
+
+    def open_device(self) -> None:
+        """
+        Method marks device as open, replayed device is always available.
+        """
+
+        self._device_id = 1
+
+    def restore(self, snapshot: DeviceSnapshot, current: Optional[DeviceSnapshot] = None) -> List[str]:
+        """
+        :param snapshot: snapshot, it is ignored;
+        :param current: current snapshot, it is ignored.
+        :return: recorded names of restored sections.
+        """
+
+        return self._replay("restore") or []
+
+    def set_guard(self, guard: Optional[AxisGuard]) -> None:
+        """
+        Method sets soft limits. Targets of replayed commands were checked when journal
+        was recorded, so limits are only kept for code that reads them.
+        :param guard: soft limits in steps or None to remove limits.
+        """
+
+        self._guard = guard
+
+    def set_journal(self, journal: Optional[JournalWriter]) -> None:
+        """
+        Method starts or stops writing replayed calls to journal.
+        :param journal: journal or None to stop writing.
+        """
+
+        with self._lock:
+            self._journal = journal
+
+    def set_move_settings(self, move_settings: MoveSettings) -> bool:
+        """
+        :param move_settings: motion settings, they are ignored.
+        :return: recorded result.
+        """
+
+        return bool(self._replay("set_move_settings"))
+
+    def set_status_board(self, status_board: Optional[StatusBoardWriter]) -> None:
+        """
+        Method starts or stops publishing replayed statuses to shared memory board.
+        Slot of device is reserved at once, so board that cannot hold device is rejected
+        here, not in polling loop.
+        :param status_board: board or None to stop publishing.
+        """
+
+        if status_board is not None and status_board.register(self._device_uri) < 0:
+            raise ValueError(f"Status board {status_board.name} has no free slot for {self._device_uri}")
+        with self._lock:
+            self._status_board = status_board
+
+    def set_user_multiplier(self, multiplier: float) -> None:
+        """
+        :param multiplier: coefficient for converting motor steps to user unit.
+        """
+
+        self._replay("set_user_multiplier")
+        self._user_multiplier = multiplier
+
+    def snapshot(self, sections: Optional[List[str]] = None) -> Optional[DeviceSnapshot]:
+        """
+        :param sections: names of sections, they are ignored.
+        :return: recorded snapshot.
+        """
+
+        snapshot = self._replay("snapshot")
+        return DeviceSnapshot.from_json(snapshot) if snapshot else None
+
+    def stop_motion(self) -> None:
+        """
+        Method replays stop of motion.
+        """
+
+        self._replay("stop_motion")
+
+    def stop_motion_immediately(self) -> None:
+        """
+        Method replays immediate stop of motion.
+        """
+
+        self._replay("stop_motion_immediately")
+
+    def wait_for_stop(self, timeout: Optional[float] = None, interval: float = 0.1) -> bool:
+        """
+        Method waits until replayed motion ends.
+        :param timeout: maximum time to wait in seconds;
+        :param interval: interval between status requests in seconds, it is divided by speed of replay.
+        :return: True if device stopped.
+        """
+
+        if self._calls.get("wait_for_stop"):
+            # Simulated device writes waiting itself instead of status requests
+            return bool(self._replay("wait_for_stop"))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.check_moving():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(interval / self._speed if self._speed else 0)
+        return True
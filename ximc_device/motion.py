@@ -0,0 +1,335 @@
+import math
+from typing import List, NamedTuple, Optional, Tuple
+
+
+# Values of MvCmdSts field of status_t structure. They are duplicated from libximc.MvcmdStatus so that motion
+# models can be used without libximc
+MVCMD_UKNWN: int = 0x00
+MVCMD_MOVE: int = 0x01
+MVCMD_MOVR: int = 0x02
+MVCMD_LEFT: int = 0x03
+MVCMD_RIGHT: int = 0x04
+MVCMD_STOP: int = 0x05
+MVCMD_HOME: int = 0x06
+MVCMD_LOFT: int = 0x07
+MVCMD_SSTP: int = 0x08
+MVCMD_ERROR: int = 0x40
+MVCMD_RUNNING: int = 0x80
+
+
+class MoveSettings(NamedTuple):
+    """
+    Motion settings of controller. All values are in steps (speed in steps/sec,
+    accelerations in steps/sec^2). Zero acceleration or deceleration means that
+    speed changes instantly.
+    """
+
+    speed: float
+    accel: float
+    decel: float
+    antiplay_speed: float = 0
+    antiplay: float = 0
+
+
+class Segment(NamedTuple):
+    """
+    Part of motion with constant acceleration.
+    """
+
+    start_time: float
+    start_position: float
+    start_speed: float
+    accel: float
+    duration: float
+
+
+def _inverse_double(value: float) -> float:
+    """
+    :param value: acceleration or deceleration.
+    :return: 1 / (2 * value) or 0 if speed changes instantly.
+    """
+
+    return 1 / (2 * value) if value > 0 else 0
+
+
+def _sign(value: float) -> int:
+    if value > 0:
+        return 1
+    if value < 0:
+        return -1
+    return 0
+
+
+def _speed_change_time(start_speed: float, end_speed: float, accel: float) -> float:
+    """
+    :param start_speed: absolute speed at start;
+    :param end_speed: absolute speed at end;
+    :param accel: absolute acceleration.
+    :return: time to change speed.
+    """
+
+    return abs(end_speed - start_speed) / accel if accel > 0 else 0
+
+
+def stop_distance(speed: float, decel: float) -> float:
+    """
+    :param speed: absolute speed;
+    :param decel: deceleration.
+    :return: distance needed to stop from given speed.
+    """
+
+    return speed * speed * _inverse_double(decel)
+
+
+class MotionProfile:
+    """
+    Class describes trapezoidal motion as a list of segments with constant
+    acceleration. Times are counted from the beginning of the profile.
+    """
+
+    def __init__(self, segments: List[Segment], start_position: float, final_position: Optional[float]) -> None:
+        """
+        :param segments: segments of motion;
+        :param start_position: position at the beginning of the profile;
+        :param final_position: position at the end of the profile (None for continuous motion).
+        """
+
+        self._segments: List[Segment] = [segment for segment in segments if segment.duration > 0]
+        self._start_position: float = start_position
+        self._final_position: Optional[float] = final_position
+        if self._segments:
+            last = self._segments[-1]
+            self._duration: float = last.start_time + last.duration
+        else:
+            self._duration = 0
+
+    @property
+    def duration(self) -> float:
+        """
+        :return: duration of motion in seconds (infinity for continuous motion).
+        """
+
+        return self._duration
+
+    @property
+    def final_position(self) -> Optional[float]:
+        """
+        :return: position at the end of motion or None for continuous motion.
+        """
+
+        return self._final_position
+
+    @property
+    def segments(self) -> List[Segment]:
+        """
+        :return: segments of motion.
+        """
+
+        return list(self._segments)
+
+    @classmethod
+    def continuous(cls, position: float, speed: float, direction: int, settings: MoveSettings) -> "MotionProfile":
+        """
+        Method creates profile of continuous motion in given direction (as after
+        command_left or command_right).
+        :param position: current position;
+        :param speed: current speed (with sign);
+        :param direction: 1 for motion to right, -1 for motion to left;
+        :param settings: motion settings.
+        :return: motion profile.
+        """
+
+        builder = _ProfileBuilder(position, speed)
+        if _sign(speed) == -direction:
+            builder.change_speed(0, settings.decel)
+        builder.change_speed(direction * settings.speed, settings.accel if builder.speed_abs < settings.speed else
+                             settings.decel)
+        builder.add(0, math.inf)
+        return cls(builder.segments, position, None)
+
+    @classmethod
+    def soft_stop(cls, position: float, speed: float, settings: MoveSettings) -> "MotionProfile":
+        """
+        Method creates profile of smooth stop (as after command_sstp).
+        :param position: current position;
+        :param speed: current speed (with sign);
+        :param settings: motion settings.
+        :return: motion profile.
+        """
+
+        builder = _ProfileBuilder(position, speed)
+        builder.change_speed(0, settings.decel)
+        return cls(builder.segments, position, builder.position)
+
+    @classmethod
+    def to_position(cls, position: float, speed: float, target: float, settings: MoveSettings,
+                    use_antiplay: bool = True) -> "MotionProfile":
+        """
+        Method creates profile of motion to target position (as after command_move).
+        If settings have non-zero antiplay, the target is always approached from the
+        same side: from the left for positive antiplay and from the right for negative.
+        :param position: current position;
+        :param speed: current speed (with sign);
+        :param target: target position;
+        :param settings: motion settings;
+        :param use_antiplay: if False then backlash compensation is not performed.
+        :return: motion profile.
+        """
+
+        builder = _ProfileBuilder(position, speed)
+        if use_antiplay and settings.antiplay:
+            approach_from = target - settings.antiplay
+            if _sign(target - position) != _sign(settings.antiplay) and position != target:
+                builder.move_to(approach_from, settings.speed, settings.accel, settings.decel)
+                builder.move_to(target, settings.antiplay_speed or settings.speed, settings.accel, settings.decel)
+                return cls(builder.segments, position, builder.position)
+        builder.move_to(target, settings.speed, settings.accel, settings.decel)
+        return cls(builder.segments, position, builder.position)
+
+    def state_at(self, time: float) -> Tuple[float, float]:
+        """
+        :param time: time from the beginning of the profile.
+        :return: position and speed at given time.
+        """
+
+        if time <= 0:
+            return self._start_position, self._segments[0].start_speed if self._segments else 0
+        if time >= self._duration:
+            return self._final_position, 0
+        for segment in self._segments:
+            if time < segment.start_time + segment.duration:
+                delta = time - segment.start_time
+                return (segment.start_position + segment.start_speed * delta + segment.accel * delta ** 2 / 2,
+                        segment.start_speed + segment.accel * delta)
+        return self._final_position, 0
+
+
+class _ProfileBuilder:
+    """
+    Helper class that appends segments to motion profile.
+    """
+
+    def __init__(self, position: float, speed: float) -> None:
+        self.position: float = position
+        self.speed: float = speed
+        self.time: float = 0
+        self.segments: List[Segment] = []
+
+    @property
+    def speed_abs(self) -> float:
+        return abs(self.speed)
+
+    def add(self, accel: float, duration: float) -> None:
+        """
+        Method appends segment with constant acceleration.
+        :param accel: acceleration (with sign);
+        :param duration: duration of segment.
+        """
+
+        self.segments.append(Segment(self.time, self.position, self.speed, accel, duration))
+        if not math.isinf(duration):
+            self.position += self.speed * duration + accel * duration ** 2 / 2
+            self.speed += accel * duration
+            self.time += duration
+
+    def change_speed(self, speed: float, accel: float) -> None:
+        """
+        Method appends segment in which speed changes to given value.
+        :param speed: new speed (with sign);
+        :param accel: absolute acceleration (0 for instant change).
+        """
+
+        duration = _speed_change_time(self.speed, speed, accel)
+        if duration > 0:
+            self.add(_sign(speed - self.speed) * accel, duration)
+        self.speed = speed
+
+    def move_to(self, target: float, max_speed: float, accel: float, decel: float) -> None:
+        """
+        Method appends segments of trapezoidal motion to target position.
+        :param target: target position;
+        :param max_speed: maximum speed;
+        :param accel: acceleration;
+        :param decel: deceleration.
+        """
+
+        distance = target - self.position
+        overshoots = stop_distance(self.speed_abs, decel) > abs(distance)
+        if self.speed and (_sign(self.speed) != _sign(distance) or overshoots):
+            self.change_speed(0, decel)
+            distance = target - self.position
+        if not distance:
+            self.speed = 0
+            return
+
+        direction = _sign(distance)
+        distance = abs(distance)
+        speed = self.speed_abs
+        accel_k = _inverse_double(accel)
+        decel_k = _inverse_double(decel)
+        if speed > max_speed or accel_k + decel_k == 0:
+            peak_speed = max_speed
+        elif (max_speed ** 2 - speed ** 2) * accel_k + max_speed ** 2 * decel_k <= distance:
+            peak_speed = max_speed
+        else:
+            peak_speed = math.sqrt((distance + speed ** 2 * accel_k) / (accel_k + decel_k))
+
+        if peak_speed >= speed:
+            ramp_distance = (peak_speed ** 2 - speed ** 2) * accel_k
+            self.change_speed(direction * peak_speed, accel)
+        else:
+            ramp_distance = (speed ** 2 - peak_speed ** 2) * decel_k
+            self.change_speed(direction * peak_speed, decel)
+        cruise_distance = max(distance - ramp_distance - peak_speed ** 2 * decel_k, 0)
+        if cruise_distance and peak_speed:
+            self.add(0, cruise_distance / peak_speed)
+        self.change_speed(0, decel)
+        self.position = target
+
+
+def _rest_to_rest_time(distance: float, speed: float, accel: float, decel: float) -> float:
+    """
+    :param distance: absolute distance;
+    :param speed: maximum speed;
+    :param accel: acceleration;
+    :param decel: deceleration.
+    :return: duration of trapezoidal (or triangular) motion from rest to rest.
+    """
+
+    if not distance:
+        return 0
+    ramp_k = _inverse_double(accel) + _inverse_double(decel)
+    ramp_distance = speed * speed * ramp_k
+    if distance >= ramp_distance:
+        return _speed_change_time(0, speed, accel) + _speed_change_time(speed, 0, decel) + \
+            (distance - ramp_distance) / speed
+    peak_speed = math.sqrt(distance / ramp_k)
+    return _speed_change_time(0, peak_speed, accel) + _speed_change_time(peak_speed, 0, decel)
+
+
+def estimate_move_time(distance: float, settings: MoveSettings, use_antiplay: bool = True) -> float:
+    """
+    Function calculates duration of motion from rest to rest on given distance.
+    The result is the same as MotionProfile.to_position gives but no profile is built.
+    :param distance: distance (with sign) in steps;
+    :param settings: motion settings;
+    :param use_antiplay: if True then backlash compensation is taken into account.
+    :return: duration of motion in seconds.
+    """
+
+    if use_antiplay and settings.antiplay and distance and _sign(distance) != _sign(settings.antiplay):
+        return _rest_to_rest_time(abs(distance - settings.antiplay), settings.speed, settings.accel,
+                                  settings.decel) + \
+            _rest_to_rest_time(abs(settings.antiplay), settings.antiplay_speed or settings.speed, settings.accel,
+                               settings.decel)
+    return _rest_to_rest_time(abs(distance), settings.speed, settings.accel, settings.decel)
+
+
+def microsteps_per_step(microstep_mode: int) -> int:
+    """
+    :param microstep_mode: value of MicrostepMode field of engine_settings_t (1 for
+    full step, 2 for half step, ..., 9 for 1/256 step).
+    :return: number of microsteps in one step.
+    """
+
+    return 2 ** (microstep_mode - 1) if microstep_mode > 0 else 1
@@ -1,9 +1,11 @@
 import configparser
+import math
 from typing import Any, Dict, List, Optional, Tuple
 from IPython.display import clear_output, display
 from ipywidgets import widgets
 from ximc_device import utils as ut
 from ximc_device.device import XimcDevice
+from ximc_device.guard import AxisGuard
 
 
 class OpenPanel:
@@ -16,6 +18,7 @@ class OpenPanel:
     def __init__(self) -> None:
         self._control_panel = None
         self._device: Optional[XimcDevice] = None
+        self._guard: Optional[AxisGuard] = None
         self._devices_type_and_uri: List[Tuple[str, str]] = []
         self._user_unit: str = "user_unit"
         self._create_widgets()
@@ -58,6 +61,17 @@ class OpenPanel:
         v_box = widgets.VBox([h_box_1, h_box_2, self.output])
         display(v_box)
 
+    def _update_limits(self) -> None:
+        """
+        Method passes soft limits in user unit to control panel.
+        """
+
+        if self._guard is None:
+            self._control_panel.set_limits(-math.inf, math.inf)
+        else:
+            multiplier = self.float_text_user_unit.value
+            self._control_panel.set_limits(self._guard.left / multiplier, self._guard.right / multiplier)
+
     def close_device(self) -> None:
         """
         Method closes device.
@@ -101,6 +115,7 @@ class OpenPanel:
                 unit_multiplier = float(parser["User_units"]["Unit_multiplier"])
                 step_multiplier = float(parser["User_units"]["Step_multiplier"])
                 user_unit = parser["User_units"].get("Unit", "user_unit").lower()
+                guard = AxisGuard.from_config(parser) if parser.has_section("Borders") else None
             except Exception as exc:
                 ut.print_flush(f"Failed to read user units from file {file_name} ({exc})")
             else:
@@ -109,11 +124,16 @@ class OpenPanel:
                 ut.print_flush(f"\tUnit_multiplier = {unit_multiplier}")
                 ut.print_flush(f"\tStep_multiplier = {step_multiplier}")
                 ut.print_flush(f"\tUnit = {user_unit}")
+                if guard is not None:
+                    ut.print_flush(f"\tLeft_border = {guard.left}, Right_border = {guard.right} (steps)")
+                self._guard = guard
                 if self._device:
                     self._device.set_user_multiplier(self.float_text_user_unit.value)
+                    self._device.set_guard(self._guard)
                 self._user_unit = user_unit
                 if self._control_panel:
                     self._control_panel.set_user_unit(self._user_unit)
+                    self._update_limits()
 
     def handle_user_unit_change(self, change: Dict[str, Any]) -> None:
         """
@@ -135,6 +155,7 @@ class OpenPanel:
         self._user_unit = "user_unit"
         if self._control_panel:
             self._control_panel.set_user_unit(self._user_unit)
+            self._update_limits()
 
     def open_device(self) -> None:
         """
@@ -150,6 +171,7 @@ class OpenPanel:
                 if f"{device_uri} ({device_type})" == self.drop_down_devices.value:
                     is_virtual = device_type.lower() == "virtual"
                     self._device = XimcDevice(device_uri, is_virtual, self.float_text_user_unit.value)
+                    self._device.set_guard(self._guard)
                     if self._device.device_id > 0:
                         ut.print_flush(f"Device {self._device.device_uri} was opened")
                         ut.print_device_info_in_widgets(self._device)
@@ -178,3 +200,4 @@ class OpenPanel:
 
         self._control_panel = control_panel
         self._control_panel.set_user_unit(self._user_unit)
+        self._update_limits()
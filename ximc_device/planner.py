@@ -0,0 +1,255 @@
+import itertools
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+from ximc_device.group import DeviceGroup
+from ximc_device.motion import estimate_move_time, MoveSettings
+
+
+Point = Tuple[float, ...]
+
+
+class ScanPlan(NamedTuple):
+    """
+    Result of scan planning.
+    """
+
+    points: List[Any]
+    order: List[int]
+    time_before: float
+    time_after: float
+
+    @property
+    def time_saved(self) -> float:
+        """
+        :return: difference between predicted scan time before and after optimization in seconds.
+        """
+
+        return self.time_before - self.time_after
+
+
+def _to_point(position: Any) -> Point:
+    """
+    :param position: number for one axis or sequence of numbers for several axes.
+    :return: tuple with coordinates.
+    """
+
+    if isinstance(position, (int, float)):
+        return (float(position),)
+    return tuple(float(value) for value in position)
+
+
+class ScanPlanner:
+    """
+    Class estimates duration of scans through list of points and reorders points
+    to make scans faster. Axes move simultaneously, so time of move between two
+    points is time of the slowest axis. Positions of points are in user units.
+    """
+
+    def __init__(self, move_settings: Sequence[MoveSettings], user_multipliers: Sequence[float],
+                 settle_time: float = 0) -> None:
+        """
+        :param move_settings: motion settings of axes in steps;
+        :param user_multipliers: coefficients for converting motor steps to user unit (number of steps
+        in user unit) for axes;
+        :param settle_time: time in seconds spent in each point after motion.
+        """
+
+        if len(move_settings) != len(user_multipliers):
+            raise ValueError("Number of motion settings and user multipliers must be the same")
+        self._move_settings: List[MoveSettings] = list(move_settings)
+        self._settle_time: float = settle_time
+        self._user_multipliers: List[float] = list(user_multipliers)
+
+    @classmethod
+    def from_device(cls, device, settle_time: float = 0) -> "ScanPlanner":
+        """
+        Method creates planner with motion settings read from device or group of devices.
+        :param device: XimcDevice, SimulatedDevice or DeviceGroup;
+        :param settle_time: time in seconds spent in each point after motion.
+        :return: planner.
+        """
+
+        if isinstance(device, DeviceGroup):
+            move_settings = device.get_move_settings()
+            user_multipliers = device.user_multipliers
+        else:
+            move_settings = [device.get_move_settings()]
+            user_multipliers = [device.user_multiplier]
+        if any(settings is None for settings in move_settings):
+            raise RuntimeError("Failed to read motion settings of device")
+        return cls(move_settings, user_multipliers, settle_time)
+
+    def _get_costs(self, points: List[Point], start: Optional[Point]) -> Tuple[List[List[float]], List[float]]:
+        """
+        :param points: points of scan;
+        :param start: start point.
+        :return: matrix of move times between points and list of move times from start point.
+        """
+
+        costs = [[self.move_time(point_from, point_to) for point_to in points] for point_from in points]
+        start_costs = [self.move_time(start, point) if start else 0 for point in points]
+        return costs, start_costs
+
+    def _check_dimension(self, points: List[Point]) -> None:
+        for point in points:
+            if len(point) != len(self._move_settings):
+                raise ValueError(f"Point {point} has {len(point)} coordinates, but planner has "
+                                 f"{len(self._move_settings)} axes")
+
+    @staticmethod
+    def _get_route_time(order: List[int], costs: List[List[float]], start_costs: List[float]) -> float:
+        if not order:
+            return 0
+        return start_costs[order[0]] + sum(costs[order[i]][order[i + 1]] for i in range(len(order) - 1))
+
+    @staticmethod
+    def _improve_with_two_opt(order: List[int], costs: List[List[float]], start_costs: List[float],
+                              max_passes: int) -> List[int]:
+        """
+        Method improves open route by reversing its parts (2-opt). Move times can
+        differ for forward and backward directions (because of backlash compensation),
+        so the mean of both directions is used to evaluate reversals.
+        :param order: initial route;
+        :param costs: matrix of move times between points;
+        :param start_costs: move times from start point;
+        :param max_passes: maximum number of passes over the route.
+        :return: improved route.
+        """
+
+        def cost(index_1: Optional[int], index_2: Optional[int]) -> float:
+            if index_1 is None:
+                return start_costs[index_2]
+            if index_2 is None:
+                return 0
+            return (costs[index_1][index_2] + costs[index_2][index_1]) / 2
+
+        order = list(order)
+        length = len(order)
+        for _ in range(max_passes):
+            improved = False
+            for i in range(length - 1):
+                previous = order[i - 1] if i > 0 else None
+                for j in range(i + 1, length):
+                    following = order[j + 1] if j + 1 < length else None
+                    delta = cost(previous, order[j]) + cost(order[i], following) - \
+                        cost(previous, order[i]) - cost(order[j], following)
+                    if delta < -1e-12:
+                        order[i:j + 1] = reversed(order[i:j + 1])
+                        improved = True
+            if not improved:
+                break
+        return order
+
+    @staticmethod
+    def _order_with_nearest_neighbour(costs: List[List[float]], start_costs: List[float]) -> List[int]:
+        """
+        :param costs: matrix of move times between points;
+        :param start_costs: move times from start point.
+        :return: route in which the nearest (by move time) point is always visited next.
+        """
+
+        not_visited = set(range(len(costs)))
+        current = min(not_visited, key=lambda index: start_costs[index])
+        order = [current]
+        not_visited.remove(current)
+        while not_visited:
+            current = min(not_visited, key=lambda index: costs[order[-1]][index])
+            order.append(current)
+            not_visited.remove(current)
+        return order
+
+    def estimate(self, points: Sequence[Any], start: Optional[Any] = None) -> float:
+        """
+        Method predicts time of scan through points in given order.
+        :param points: points of scan (numbers for one axis or sequences of numbers for several axes);
+        :param start: point from which scan starts.
+        :return: predicted scan time in seconds.
+        """
+
+        route = [_to_point(point) for point in points]
+        self._check_dimension(route)
+        if start is not None:
+            route.insert(0, _to_point(start))
+        total_time = sum(self.move_time(route[i], route[i + 1]) for i in range(len(route) - 1))
+        return total_time + self._settle_time * len(points)
+
+    def move_time(self, point_from: Any, point_to: Any) -> float:
+        """
+        :param point_from: start point;
+        :param point_to: end point.
+        :return: predicted time of move between points in seconds (without settle time).
+        """
+
+        point_from = _to_point(point_from)
+        point_to = _to_point(point_to)
+        return max(estimate_move_time((end - begin) * multiplier, settings)
+                   for begin, end, multiplier, settings in zip(point_from, point_to, self._user_multipliers,
+                                                               self._move_settings))
+
+    def optimize(self, points: Sequence[Any], start: Optional[Any] = None, use_two_opt: bool = True,
+                 max_passes: int = 20) -> ScanPlan:
+        """
+        Method reorders unordered set of points to minimize scan time. Nearest
+        neighbour route is built first and then it is improved with 2-opt.
+        :param points: points of scan (numbers for one axis or sequences of numbers for several axes);
+        :param start: point from which scan starts, usually the current position;
+        :param use_two_opt: if True then route is improved with 2-opt;
+        :param max_passes: maximum number of 2-opt passes.
+        :return: plan with reordered points and predicted times.
+        """
+
+        route = [_to_point(point) for point in points]
+        self._check_dimension(route)
+        settle_time = self._settle_time * len(route)
+        if not route:
+            return ScanPlan([], [], 0, 0)
+
+        costs, start_costs = self._get_costs(route, _to_point(start) if start is not None else None)
+        initial_order = list(range(len(route)))
+        time_before = self._get_route_time(initial_order, costs, start_costs)
+        best_order, best_time = initial_order, time_before
+        order = self._order_with_nearest_neighbour(costs, start_costs)
+        candidates = [order]
+        if use_two_opt:
+            candidates.append(self._improve_with_two_opt(order, costs, start_costs, max_passes))
+        for candidate in candidates:
+            candidate_time = self._get_route_time(candidate, costs, start_costs)
+            if candidate_time < best_time:
+                best_order, best_time = candidate, candidate_time
+        return ScanPlan([points[index] for index in best_order], best_order, time_before + settle_time,
+                        best_time + settle_time)
+
+    def serpentine(self, axes_positions: Sequence[Sequence[float]], start: Optional[Any] = None) -> ScanPlan:
+        """
+        Method builds grid scan in serpentine order: the last axis is the fastest one
+        and it changes direction on every line instead of returning to the beginning.
+        Raster order (every line in the same direction) is used as the order before
+        optimization.
+        :param axes_positions: positions of grid along each axis;
+        :param start: point from which scan starts.
+        :return: plan with grid points in serpentine order and predicted times.
+        """
+
+        if len(axes_positions) != len(self._move_settings):
+            raise ValueError(f"Grid has {len(axes_positions)} axes, but planner has {len(self._move_settings)} axes")
+        raster = [tuple(point) for point in itertools.product(*axes_positions)]
+        points = [tuple(point) for point in _serpentine(list(axes_positions))]
+        index = {point: i for i, point in enumerate(raster)}
+        return ScanPlan(points, [index[point] for point in points], self.estimate(raster, start),
+                        self.estimate(points, start))
+
+
+def _serpentine(axes_positions: List[Sequence[float]]) -> List[List[float]]:
+    """
+    :param axes_positions: positions of grid along each axis.
+    :return: grid points in which every axis except the first reverses direction
+    each time a slower axis makes a step.
+    """
+
+    if not axes_positions:
+        return [[]]
+    points = []
+    inner_points = _serpentine(axes_positions[1:])
+    for i, position in enumerate(axes_positions[0]):
+        line = inner_points if i % 2 == 0 else inner_points[::-1]
+        points.extend([position] + inner_point for inner_point in line)
+    return points
@@ -0,0 +1,231 @@
+import time
+import urllib.parse
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from ximc_device.motion import (microsteps_per_step, MVCMD_ERROR, MVCMD_HOME, MVCMD_LOFT, MVCMD_RUNNING, MVCMD_SSTP,
+                                MVCMD_STOP, stop_distance)
+
+
+class PollProfile(NamedTuple):
+    """
+    Periods of status polling in seconds for phases of motion and maximum number of
+    status requests per second that all devices on one link may send.
+    """
+
+    transient_period: float
+    cruise_period: float
+    idle_period: float
+    max_rate: float
+
+
+def get_link(device_uri: str) -> str:
+    """
+    :param device_uri: URI of device.
+    :return: link of device: scheme and host of URI, so axes of one network server
+    (or all local USB controllers) share the same link.
+    """
+
+    parts = urllib.parse.urlsplit(device_uri)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class PollGovernor:
+    """
+    Class chooses period of status polling from motion state. Status is polled fast
+    when motion starts, speed changes (acceleration, deceleration near target) or
+    motion is being stopped, slowly at constant speed, and with slow heartbeat when
+    device is idle. If target of motion is given (see set_target), fast polling
+    starts before deceleration: when remaining distance minus stop distance will be
+    passed before the next status at cruise period. Periods depend on transport of
+    device, and period is increased so that all devices sharing one link do not
+    exceed request rate of the link.
+    """
+
+    CRUISE: str = "cruise"
+    DEFAULT_PROFILE: PollProfile = PollProfile(0.05, 0.5, 1, 100)
+    IDLE: str = "idle"
+    MICROSTEP_MODE: int = 9
+    PROFILES: Dict[str, PollProfile] = {"xi-com": PollProfile(0.02, 0.2, 1, 500),
+                                        "xi-emu": PollProfile(0.02, 0.2, 1, 1000),
+                                        "xi-net": PollProfile(0.05, 0.5, 2, 50),
+                                        "xi-sim": PollProfile(0.02, 0.2, 1, 1000),
+                                        "xi-tcp": PollProfile(0.05, 0.5, 2, 50),
+                                        "xi-udp": PollProfile(0.05, 0.5, 2, 50)}
+    SPEED_CHANGE_RATE: float = 0.2
+    TRANSIENT: str = "transient"
+    TRANSIENT_COMMANDS: Tuple[int, ...] = MVCMD_HOME, MVCMD_LOFT, MVCMD_SSTP, MVCMD_STOP
+
+    def __init__(self, device_uri: str = "", profile: Optional[PollProfile] = None, share: int = 1,
+                 microstep_mode: Optional[int] = None) -> None:
+        """
+        :param device_uri: URI of device, its scheme selects profile;
+        :param profile: polling profile, by default profile of transport is used;
+        :param share: number of devices that are polled through the same link;
+        :param microstep_mode: microstep mode of controller to add fractions of step
+        (u_position, u_speed) to status in steps.
+        """
+
+        transport = urllib.parse.urlsplit(device_uri).scheme
+        self._decel: Optional[float] = None
+        self._link: str = get_link(device_uri)
+        self._max_speed_rate: float = 0
+        self._microsteps: int = microsteps_per_step(microstep_mode or self.MICROSTEP_MODE)
+        self._phase: str = self.IDLE
+        self._profile: PollProfile = profile or self.PROFILES.get(transport, self.DEFAULT_PROFILE)
+        self._running: bool = False
+        self._share: int = share
+        self._speed: Optional[float] = None
+        self._speed_time: float = 0
+        self._target: Optional[float] = None
+        self._period: float = self._get_period()
+
+    @property
+    def link(self) -> str:
+        """
+        :return: link of device (see get_link).
+        """
+
+        return self._link
+
+    @property
+    def period(self) -> float:
+        """
+        :return: current period of polling in seconds.
+        """
+
+        return self._period
+
+    @property
+    def phase(self) -> str:
+        """
+        :return: current phase of motion (IDLE, TRANSIENT or CRUISE).
+        """
+
+        return self._phase
+
+    @property
+    def profile(self) -> PollProfile:
+        """
+        :return: polling profile.
+        """
+
+        return self._profile
+
+    @property
+    def rate(self) -> float:
+        """
+        :return: effective rate of polling (status requests per second).
+        """
+
+        return 1 / self._period
+
+    def _get_motion(self, params: Dict[str, Any]) -> Tuple[float, float]:
+        """
+        :param params: parameters of controller.
+        :return: position and absolute speed, fractions of step are added for status in steps.
+        """
+
+        position = params["position"] + params.get("u_position", 0) / self._microsteps
+        speed = abs(params["speed"]) + abs(params.get("u_speed", 0)) / self._microsteps
+        return position, speed
+
+    def _get_period(self, phase: Optional[str] = None) -> float:
+        """
+        :param phase: phase of motion, by default current phase.
+        :return: period for phase limited by request rate of link.
+        """
+
+        periods = {self.CRUISE: self._profile.cruise_period,
+                   self.IDLE: self._profile.idle_period,
+                   self.TRANSIENT: self._profile.transient_period}
+        return max(periods[phase or self._phase], self._share / self._profile.max_rate)
+
+    def _get_phase(self, position: float, speed: float, moving_status: int, now: float) -> str:
+        """
+        :param position: position of device;
+        :param speed: absolute speed of device;
+        :param moving_status: moving status of controller;
+        :param now: moment of time.monotonic when status was received.
+        :return: phase of motion. Speed is constant if its relative change per second is
+        less than SPEED_CHANGE_RATE, so the phase does not depend on period of polling.
+        """
+
+        if not moving_status & MVCMD_RUNNING:
+            return self.IDLE
+        if not self._running or self._speed is None or not speed:
+            return self.TRANSIENT
+        if moving_status & ~(MVCMD_ERROR | MVCMD_RUNNING) in self.TRANSIENT_COMMANDS:
+            return self.TRANSIENT
+        if self._is_near_target(position, speed):
+            return self.TRANSIENT
+        elapsed = max(now - self._speed_time, 1e-3)
+        if abs(speed - self._speed) > self.SPEED_CHANGE_RATE * max(speed, self._speed) * elapsed:
+            return self.TRANSIENT
+        return self.CRUISE
+
+    def _is_near_target(self, position: float, speed: float) -> bool:
+        """
+        :param position: position of device;
+        :param speed: absolute speed of device.
+        :return: True if deceleration before target starts earlier than the next status is
+        received at cruise period. Deceleration given with target is used, otherwise the
+        largest rate of speed change in this motion (acceleration is usually close to it).
+        """
+
+        decel = self._decel or self._max_speed_rate
+        if self._target is None or not decel:
+            return False
+        distance_to_decel = abs(self._target - position) - stop_distance(speed, decel)
+        return distance_to_decel <= speed * self._get_period(self.CRUISE)
+
+    def reset(self) -> None:
+        """
+        Method forgets previous status, so the next motion is polled as started.
+        """
+
+        self._max_speed_rate = 0
+        self._running = False
+        self._speed = None
+        self._target = None
+
+    def set_target(self, target: Optional[float], decel: Optional[float] = None) -> None:
+        """
+        Method sets target of the next (or current) motion. Target is forgotten when motion ends.
+        :param target: target position in the same unit as status (steps or user unit), None if unknown;
+        :param decel: deceleration in the same unit per second squared, None to estimate it from status.
+        """
+
+        self._target = target
+        self._decel = decel
+
+    def set_share(self, share: int) -> None:
+        """
+        :param share: number of devices that are polled through the same link.
+        """
+
+        self._share = max(share, 1)
+        self._period = self._get_period()
+
+    def update(self, params: Dict[str, Any]) -> float:
+        """
+        Method updates phase of motion with new status.
+        :param params: parameters of controller returned by get_params or get_params_in_user_unit,
+        empty dictionary if status was not read (period is not changed).
+        :return: period of polling in seconds until the next status.
+        """
+
+        if params:
+            now = time.monotonic()
+            position, speed = self._get_motion(params)
+            self._phase = self._get_phase(position, speed, params["moving_status"], now)
+            if self._phase == self.IDLE:
+                self._max_speed_rate = 0
+                if self._running:
+                    self._target = None
+            elif self._running and self._speed is not None:
+                speed_rate = abs(speed - self._speed) / max(now - self._speed_time, 1e-3)
+                self._max_speed_rate = max(self._max_speed_rate, speed_rate)
+            self._running = self._phase != self.IDLE
+            self._speed = speed
+            self._speed_time = now
+            self._period = self._get_period()
+        return self._period
@@ -0,0 +1,653 @@
+import collections
+import itertools
+import math
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from ximc_device import capture
+from ximc_device.device_info import DeviceInfo
+from ximc_device.guard import AxisGuard
+from ximc_device.journal import JournalWriter
+from ximc_device.motion import (microsteps_per_step, MoveSettings, MotionProfile, MVCMD_LEFT, MVCMD_MOVE, MVCMD_RIGHT,
+                                MVCMD_RUNNING, MVCMD_SSTP, MVCMD_STOP)
+from ximc_device.status_board import StatusBoardWriter
+from ximc_device.telemetry import Telemetry
+
+
+class ScaledClock:
+    """
+    Clock that follows real time multiplied by given scale. With scale 10 one
+    second of simulated motion takes 0.1 second of real time.
+    """
+
+    def __init__(self, time_scale: float = 1) -> None:
+        """
+        :param time_scale: how many times simulated time runs faster than real time.
+        """
+
+        self._start: float = time.monotonic()
+        self._time_scale: float = time_scale
+
+    def now(self) -> float:
+        """
+        :return: simulated time in seconds.
+        """
+
+        return (time.monotonic() - self._start) * self._time_scale
+
+    def sleep(self, seconds: float) -> None:
+        """
+        :param seconds: simulated time to sleep.
+        """
+
+        if seconds > 0:
+            time.sleep(seconds / self._time_scale)
+
+    def wait(self, event: threading.Event, seconds: float) -> bool:
+        """
+        :param event: event that interrupts waiting;
+        :param seconds: maximum simulated time to wait, inf to wait for event only.
+        :return: True if event was set.
+        """
+
+        return event.wait(None if math.isinf(seconds) else max(seconds, 0) / self._time_scale)
+
+
+class VirtualClock:
+    """
+    Clock whose time changes only when sleep or advance is called. Motion of any
+    duration is simulated instantly.
+    """
+
+    def __init__(self, start: float = 0) -> None:
+        """
+        :param start: initial time in seconds.
+        """
+
+        self._now: float = start
+
+    def advance(self, seconds: float) -> None:
+        """
+        :param seconds: time to add to clock.
+        """
+
+        if seconds > 0:
+            self._now += seconds
+
+    def now(self) -> float:
+        """
+        :return: current virtual time in seconds.
+        """
+
+        return self._now
+
+    def sleep(self, seconds: float) -> None:
+        """
+        :param seconds: virtual time to sleep.
+        """
+
+        self.advance(seconds)
+
+    def wait(self, event: threading.Event, seconds: float) -> bool:
+        """
+        Method moves clock forward at once, waiting for event is not possible because
+        virtual time does not run by itself.
+        :param event: event that interrupts waiting;
+        :param seconds: virtual time to wait, clock is not moved if it is inf.
+        :return: True if event was set.
+        """
+
+        if not math.isinf(seconds):
+            self.advance(seconds)
+        return event.is_set()
+
+
+def check_open(func) -> Callable:
+    """
+    Decorator to check if simulated device is on. If device has journal, the call is written to it.
+    :param func: decorated function.
+    """
+
+    def wrapper(self, *args, **kwargs) -> Any:
+        with self._lock:
+            if self.device_id > 0:
+                if self._journal is not None:
+                    return self._journal.call(self, func, args, kwargs)
+                return func(self, *args, **kwargs)
+        return None
+
+    return wrapper
+
+
+def journaled(func) -> Callable:
+    """
+    Decorator for methods that take command lock only for short parts of their work
+    (for example, waiting). If device has journal, the call is written to it.
+    :param func: decorated function.
+    """
+
+    def wrapper(self, *args, **kwargs) -> Any:
+        if self._journal is not None:
+            return self._journal.call(self, func, args, kwargs)
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+class SimulatedDevice:
+    """
+    Pure Python model of XIMC controller with the same interface as XimcDevice.
+    Motion follows trapezoidal profiles built from motion settings, time is
+    taken from real (possibly scaled) or virtual clock.
+    """
+
+    ACCEL_IN_STEPS: int = 1
+    ANTIPLAY_SPEED_IN_STEPS: int = 5
+    CONTROLLER_NAME: str = "SimulatedXimc"
+    DECEL_IN_STEPS: int = 1
+    MICROSTEP_MODE: int = 9
+    POWER_CURRENT: int = 300
+    POWER_VOLTAGE: float = 12
+    SPEED_IN_STEPS: int = 5
+    TEMPERATURE: float = 25
+    USER_MULTIPLIER: float = 1 / 400
+    _ids = itertools.count(1)
+
+    def __init__(self, device_uri: str = "xi-sim:///simulated", is_virtual: bool = True,
+                 user_multiplier: float = None, defer_open: bool = False, clock=None,
+                 move_settings: Optional[MoveSettings] = None, journal: Optional[JournalWriter] = None) -> None:
+        """
+        :param device_uri: URI of simulated device;
+        :param is_virtual: is kept for compatibility with XimcDevice;
+        :param user_multiplier: coefficient for converting motor steps to user unit;
+        :param defer_open: if True then device will not be opened;
+        :param clock: ScaledClock or VirtualClock, by default real time is used;
+        :param move_settings: motion settings in steps;
+        :param journal: journal to write calls of device methods.
+        """
+
+        self._clock = clock or ScaledClock()
+        self._device_id: int = -1
+        self._device_uri: str = device_uri
+        self._guard: Optional[AxisGuard] = None
+        self._is_virtual: bool = is_virtual
+        self._journal: Optional[JournalWriter] = journal
+        self._lock: threading.RLock = threading.RLock()
+        self._move_settings: MoveSettings = move_settings or MoveSettings(
+            self.SPEED_IN_STEPS, self.ACCEL_IN_STEPS, self.DECEL_IN_STEPS, self.ANTIPLAY_SPEED_IN_STEPS)
+        self._moving_command: int = 0
+        self._position: float = 0
+        self._profile: Optional[MotionProfile] = None
+        self._profile_changed: threading.Event = threading.Event()
+        self._profile_start: float = 0
+        self._status_board: Optional[StatusBoardWriter] = None
+        self._stop_requests: Deque[Tuple[float, bool]] = collections.deque()
+        self._user_multiplier: float = 1 / user_multiplier if user_multiplier else self.USER_MULTIPLIER
+        if not defer_open:
+            self.open_device()
+
+    @property
+    def clock(self):
+        """
+        :return: clock of simulated device.
+        """
+
+        return self._clock
+
+    @property
+    def device_id(self) -> int:
+        """
+        :return: controller ID.
+        """
+
+        return self._device_id
+
+    @property
+    def device_info(self) -> Optional[DeviceInfo]:
+        """
+        :return: information about simulated controller.
+        """
+
+        if self._device_id <= 0:
+            return None
+        return DeviceInfo(product_description="Simulated XIMC controller", serial_number=str(self._device_id),
+                          friendly_name=self.CONTROLLER_NAME)
+
+    @property
+    def device_uri(self) -> str:
+        """
+        :return: controller URI.
+        """
+
+        return self._device_uri
+
+    @property
+    def guard(self) -> Optional[AxisGuard]:
+        """
+        :return: soft limits of device in steps.
+        """
+
+        return self._guard
+
+    @property
+    def journal(self) -> Optional[JournalWriter]:
+        """
+        :return: journal to which calls of device methods are written.
+        """
+
+        return self._journal
+
+    @property
+    def status_board(self) -> Optional[StatusBoardWriter]:
+        """
+        :return: shared memory board to which received statuses are published.
+        """
+
+        return self._status_board
+
+    @property
+    def user_multiplier(self) -> float:
+        """
+        :return: coefficient for converting motor steps to user unit (number of steps in user unit).
+        """
+
+        return 1 / self._user_multiplier
+
+    def _check_move(self, position: float) -> None:
+        """
+        Method checks motion from current position to given position with soft limits.
+        :param position: target position in steps.
+        """
+
+        if self._guard is not None:
+            self._guard.check_move(self._update_state()[0], position)
+
+    def _get_travel_limit(self, direction: int) -> Optional[float]:
+        """
+        :param direction: direction of motion (1 or -1).
+        :return: position in steps where continuous motion must stop because of soft
+        limits, None if there is no limit.
+        """
+
+        if self._guard is None:
+            return None
+        limit = self._guard.travel_limit(self._update_state()[0], direction)
+        return None if math.isinf(limit) else limit
+
+    def _start_profile(self, profile: MotionProfile, command: int) -> None:
+        """
+        Method replaces current motion with new profile starting now.
+        :param profile: motion profile;
+        :param command: command that started motion.
+        """
+
+        self._profile = profile
+        self._profile_start = self._clock.now()
+        self._moving_command = command
+        self._profile_changed.set()
+
+    def _apply_stop_requests(self) -> None:
+        """
+        Method applies stops requested with emergency_stop at moments of requests. Stop
+        requested before current motion started is applied at the start of motion.
+        """
+
+        while self._stop_requests:
+            request_time, immediate = self._stop_requests.popleft()
+            if self._profile is None:
+                if immediate:
+                    self._moving_command = MVCMD_STOP
+                continue
+            request_time = max(request_time, self._profile_start)
+            elapsed = request_time - self._profile_start
+            position, speed = self._profile.state_at(elapsed)
+            if elapsed >= self._profile.duration:
+                self._position = position
+                self._profile = None
+            elif immediate:
+                self._position = position
+                self._profile = None
+                self._moving_command = MVCMD_STOP
+            else:
+                self._profile = MotionProfile.soft_stop(position, speed, self._move_settings)
+                self._profile_start = request_time
+                self._moving_command = MVCMD_SSTP
+
+    def _update_state(self) -> Tuple[float, float]:
+        """
+        Method calculates current position and speed and finishes completed motion.
+        :return: position and speed in steps.
+        """
+
+        self._apply_stop_requests()
+        if self._profile is None:
+            return self._position, 0
+        # Tolerance protects from rounding errors when virtual clock is moved exactly to the end of motion
+        elapsed = self._clock.now() - self._profile_start + 1e-9
+        position, speed = self._profile.state_at(elapsed)
+        if elapsed >= self._profile.duration:
+            self._profile = None
+            speed = 0
+        self._position = position
+        return position, speed
+
+    def _get_status(self) -> Tuple[float, float, Dict[str, Any]]:
+        """
+        :return: exact position and speed in steps and dictionary with parameters of
+        controller in the same format as XimcDevice.get_params returns.
+        """
+
+        position, speed = self._update_state()
+        microsteps = microsteps_per_step(self.MICROSTEP_MODE)
+        whole_steps = math.floor(position)
+        moving = self._profile is not None
+        params = {"moving_status": self._moving_command | (MVCMD_RUNNING if moving else 0),
+                  "position": whole_steps,
+                  "u_position": int((position - whole_steps) * microsteps),
+                  "speed": int(speed),
+                  "u_speed": int((abs(speed) - int(abs(speed))) * microsteps),
+                  "power_current": self.POWER_CURRENT if moving else 0,
+                  "power_voltage": self.POWER_VOLTAGE,
+                  "temperature": self.TEMPERATURE}
+        return position, speed, params
+
+    def capture(self, duration: float, rate: float, in_user_unit: bool = False) -> Telemetry:
+        """
+        Method reads status of device with fixed rate using monotonic clock. Sample
+        times are scheduled from the start of capture, so delays do not accumulate.
+        Jitter and missed samples can be calculated with capture.capture_stats.
+        :param duration: duration of capture in seconds;
+        :param rate: number of samples per second;
+        :param in_user_unit: if True then position and speed are read in user unit.
+        :return: telemetry with samples (see capture.STEPS_DTYPE and capture.USER_UNIT_DTYPE).
+        """
+
+        return capture.capture(self, duration, rate, in_user_unit)
+
+    @check_open
+    def check_moving(self) -> bool:
+        """
+        :return: True if device is moving.
+        """
+
+        self._update_state()
+        return self._profile is not None
+
+    @check_open
+    def close_device(self) -> None:
+        """
+        Method closes device.
+        """
+
+        self._device_id = -1
+
+    def emergency_stop(self, immediate: bool = False) -> bool:
+        """
+        Method requests stop without waiting for command lock, so the stop is not
+        queued behind commands of other threads. Stop takes effect at the moment of
+        request, state is updated by the next command. The call is not written to journal.
+        :param immediate: if True then motion is stopped immediately, otherwise smoothly.
+        :return: True if device is open.
+        """
+
+        if self._device_id <= 0:
+            return False
+        # Appending to deque is atomic, so no lock is needed
+        self._stop_requests.append((self._clock.now(), immediate))
+        self._profile_changed.set()
+        return True
+
+    @check_open
+    def get_device_full_info(self) -> List[Tuple[str, str]]:
+        """
+        :return: full device information.
+        """
+
+        return self.device_info.as_list()
+
+    def get_latest_params(self, in_user_unit: bool = False, max_age: Optional[float] = None,
+                          timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        :param in_user_unit: if True then status in user unit is returned;
+        :param max_age: is kept for compatibility with XimcDevice, status of simulated device is always fresh;
+        :param timeout: maximum time in seconds to wait for command lock, if None then time is not limited.
+        :return: dictionary with parameters of controller, empty dictionary if command lock
+        was busy longer than timeout.
+        """
+
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            return {}
+        try:
+            params = self.get_params_in_user_unit() if in_user_unit else self.get_params()
+        finally:
+            self._lock.release()
+        return params or {}
+
+    @check_open
+    def get_move_settings(self) -> MoveSettings:
+        """
+        :return: motion settings in steps.
+        """
+
+        return self._move_settings
+
+    @check_open
+    def get_params(self) -> Dict[str, Any]:
+        """
+        :return: dictionary with parameters of controller (moving status, position and
+        speed in steps of motor, power current and voltage, temperature).
+        """
+
+        params = self._get_status()[2]
+        if self._status_board is not None:
+            self._status_board.publish(self._device_uri, params)
+        return params
+
+    @check_open
+    def get_params_in_user_unit(self) -> Dict[str, Any]:
+        """
+        :return: dictionary with parameters of controller (moving status, position and speed
+        in user unit, power current and voltage, temperature).
+        """
+
+        position, speed, status = self._get_status()
+        params = {"moving_status": status["moving_status"],
+                  "position": position * self._user_multiplier,
+                  "speed": speed * self._user_multiplier,
+                  "power_current": status["power_current"],
+                  "power_voltage": status["power_voltage"],
+                  "temperature": status["temperature"]}
+        if self._status_board is not None:
+            self._status_board.publish(self._device_uri, params, True)
+        return params
+
+    @check_open
+    def get_position(self) -> Optional[int]:
+        """
+        :return: position of device in steps.
+        """
+
+        return math.floor(self._update_state()[0])
+
+    @check_open
+    def get_position_in_user_unit(self) -> Optional[float]:
+        """
+        :return: position in user unit.
+        """
+
+        return self._update_state()[0] * self._user_multiplier
+
+    @check_open
+    def move_left(self) -> None:
+        """
+        Method runs device to left. If device has soft limits, it stops at limit.
+        """
+
+        limit = self._get_travel_limit(-1)
+        if limit is not None:
+            self.move_to_position(limit)
+            return
+        position, speed = self._update_state()
+        self._start_profile(MotionProfile.continuous(position, speed, -1, self._move_settings), MVCMD_LEFT)
+
+    @check_open
+    def move_right(self) -> None:
+        """
+        Method runs device to right. If device has soft limits, it stops at limit.
+        """
+
+        limit = self._get_travel_limit(1)
+        if limit is not None:
+            self.move_to_position(limit)
+            return
+        position, speed = self._update_state()
+        self._start_profile(MotionProfile.continuous(position, speed, 1, self._move_settings), MVCMD_RIGHT)
+
+    @check_open
+    def move_to_position(self, position: int) -> None:
+        """
+        Method runs device to given position in steps. If target or path is out of
+        soft limits, LimitError is raised.
+        :param position: position to move.
+        """
+
+        self._check_move(position)
+        current_position, speed = self._update_state()
+        self._start_profile(MotionProfile.to_position(current_position, speed, position, self._move_settings),
+                            MVCMD_MOVE)
+
+    @check_open
+    def move_to_position_in_user_unit(self, position: float) -> None:
+        """
+        Method runs device to given position in user unit.
+        :param position: position to move.
+        """
+
+        self.move_to_position(position / self._user_multiplier)
+
+    def open_device(self) -> None:
+        """
+        Method opens simulated device.
+        """
+
+        self._device_id = next(self._ids)
+
+    def predict_move_duration(self, position: float) -> float:
+        """
+        Method calculates duration of motion from current state to given position
+        without starting motion.
+        :param position: target position in steps.
+        :return: duration in seconds.
+        """
+
+        current_position, speed = self._update_state()
+        return MotionProfile.to_position(current_position, speed, position, self._move_settings).duration
+
+    def predict_move_duration_in_user_unit(self, position: float) -> float:
+        """
+        :param position: target position in user unit.
+        :return: duration of motion to given position in seconds.
+        """
+
+        return self.predict_move_duration(position / self._user_multiplier)
+
+    def set_guard(self, guard: Optional[AxisGuard]) -> None:
+        """
+        Method sets soft limits. Targets of motion commands are checked before they are
+        sent to controller, continuous motion to left or right stops at limits.
+        :param guard: soft limits in steps or None to remove limits.
+        """
+
+        with self._lock:
+            self._guard = guard
+
+    def set_journal(self, journal: Optional[JournalWriter]) -> None:
+        """
+        Method starts or stops writing calls of device methods to journal.
+        :param journal: journal or None to stop writing.
+        """
+
+        with self._lock:
+            self._journal = journal
+
+    @check_open
+    def set_move_settings(self, move_settings: MoveSettings) -> bool:
+        """
+        :param move_settings: new motion settings in steps, they are applied to next motion commands.
+        :return: True, settings are always written.
+        """
+
+        self._move_settings = move_settings
+        return True
+
+    def set_status_board(self, status_board: Optional[StatusBoardWriter]) -> None:
+        """
+        Method starts or stops publishing statuses received with get_params and
+        get_params_in_user_unit to shared memory board. Slot of device is reserved at
+        once, so board that cannot hold device is rejected here, not in polling loop.
+        :param status_board: board or None to stop publishing.
+        """
+
+        if status_board is not None and status_board.register(self._device_uri) < 0:
+            raise ValueError(f"Status board {status_board.name} has no free slot for {self._device_uri}")
+        with self._lock:
+            self._status_board = status_board
+
+    @check_open
+    def set_user_multiplier(self, multiplier: float) -> None:
+        """
+        Method set coefficient for converting motor steps to user unit.
+        :param multiplier: coefficient for converting motor steps to user unit.
+        """
+
+        self._user_multiplier = 1 / multiplier
+
+    @check_open
+    def stop_motion(self) -> None:
+        """
+        Method stops movement smoothly.
+        """
+
+        position, speed = self._update_state()
+        if self._profile is not None:
+            self._start_profile(MotionProfile.soft_stop(position, speed, self._move_settings), MVCMD_SSTP)
+
+    @check_open
+    def stop_motion_immediately(self) -> None:
+        """
+        Method stops movement immediately.
+        """
+
+        self._update_state()
+        self._profile = None
+        self._moving_command = MVCMD_STOP
+        self._profile_changed.set()
+
+    @journaled
+    def wait_for_stop(self, timeout: Optional[float] = None) -> bool:
+        """
+        Method waits until motion ends. With virtual clock the clock is moved
+        forward at once. Lock is not held while waiting, so motion can be stopped
+        or changed from another thread.
+        :param timeout: maximum simulated time to wait in seconds.
+        :return: True if device stopped.
+        """
+
+        deadline = None if timeout is None else self._clock.now() + timeout
+        while True:
+            with self._lock:
+                if self._device_id <= 0:
+                    return False
+                # Event is cleared before state is updated, so stop requested later wakes waiting
+                self._profile_changed.clear()
+                self._update_state()
+                if self._profile is None:
+                    return True
+                remaining = self._profile_start + self._profile.duration - self._clock.now()
+            if deadline is not None:
+                if self._clock.now() >= deadline:
+                    return False
+                remaining = min(remaining, deadline - self._clock.now())
+            if math.isinf(remaining) and isinstance(self._clock, VirtualClock):
+                return False
+            self._clock.wait(self._profile_changed, remaining)
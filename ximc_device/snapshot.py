@@ -0,0 +1,191 @@
+import ctypes
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+Fields = Tuple[Tuple[str, Any], ...]
+
+
+def _to_json_value(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {"__bytes__": value.hex()}
+    if isinstance(value, tuple):
+        return [_to_json_value(item) for item in value]
+    return value
+
+
+def _from_json_value(value: Any) -> Any:
+    if isinstance(value, dict) and "__bytes__" in value:
+        return bytes.fromhex(value["__bytes__"])
+    if isinstance(value, list):
+        return tuple(_from_json_value(item) for item in value)
+    return value
+
+
+def fields_to_structure(fields: Fields, structure: ctypes.Structure) -> ctypes.Structure:
+    """
+    Function writes values of fields to ctypes structure.
+    :param fields: names and values of fields;
+    :param structure: structure to fill.
+    :return: filled structure.
+    """
+
+    for name, value in fields:
+        if isinstance(value, tuple):
+            array = getattr(structure, name)
+            for index, item in enumerate(value):
+                array[index] = item
+        else:
+            setattr(structure, name, value)
+    return structure
+
+
+def structure_to_fields(structure: ctypes.Structure) -> Fields:
+    """
+    Function converts ctypes structure to hashable tuple of fields.
+    :param structure: structure.
+    :return: names and values of fields (char arrays are converted to bytes, other arrays to tuples).
+    """
+
+    fields = []
+    for name, *_ in structure._fields_:
+        value = getattr(structure, name)
+        if isinstance(value, ctypes.Array):
+            value = tuple(value)
+        fields.append((name, value))
+    return tuple(fields)
+
+
+class DeviceSnapshot:
+    """
+    Immutable set of controller settings divided into sections (for example, move,
+    engine, borders). Each section has its own digest, so snapshots of many
+    controllers are compared section by section without comparing all fields.
+    """
+
+    def __init__(self, sections: Dict[str, Fields]) -> None:
+        """
+        :param sections: dictionary with names and fields of sections.
+        """
+
+        self._sections: Dict[str, Fields] = dict(sections)
+        self._digests: Dict[str, str] = {name: hashlib.sha1(repr(fields).encode()).hexdigest()
+                                         for name, fields in self._sections.items()}
+        self._hash: int = hash(tuple(sorted(self._digests.items())))
+
+    def __contains__(self, section: str) -> bool:
+        return section in self._sections
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, DeviceSnapshot):
+            return NotImplemented
+        return self._hash == other._hash and self._digests == other._digests
+
+    def __getitem__(self, section: str) -> Fields:
+        return self._sections[section]
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        return f"DeviceSnapshot({', '.join(self._sections)})"
+
+    @property
+    def digests(self) -> Dict[str, str]:
+        """
+        :return: dictionary with digests of sections.
+        """
+
+        return dict(self._digests)
+
+    @property
+    def sections(self) -> List[str]:
+        """
+        :return: names of sections.
+        """
+
+        return list(self._sections)
+
+    @classmethod
+    def from_json(cls, text: str) -> "DeviceSnapshot":
+        """
+        :param text: snapshot in JSON format made by to_json.
+        :return: snapshot.
+        """
+
+        data = json.loads(text)
+        return cls({section: tuple((name, _from_json_value(value)) for name, value in fields)
+                    for section, fields in data.items()})
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """
+        :return: dictionary with sections in which fields are dictionaries too.
+        """
+
+        return {section: dict(fields) for section, fields in self._sections.items()}
+
+    def diff(self, other: "DeviceSnapshot") -> List[str]:
+        """
+        :param other: another snapshot.
+        :return: names of sections which are absent in other snapshot or differ from it.
+        """
+
+        return [section for section, digest in self._digests.items() if other._digests.get(section) != digest]
+
+    def diff_fields(self, other: "DeviceSnapshot") -> Dict[str, List[Tuple[str, Any, Any]]]:
+        """
+        :param other: another snapshot.
+        :return: dictionary with differing sections, for each section there is list with
+        names of differing fields and their values in this and other snapshots.
+        """
+
+        result = {}
+        for section in self.diff(other):
+            other_fields = dict(other._sections.get(section, ()))
+            result[section] = [(name, value, other_fields.get(name)) for name, value in self._sections[section]
+                               if other_fields.get(name) != value]
+        return result
+
+    def to_json(self) -> str:
+        """
+        :return: snapshot in JSON format.
+        """
+
+        return json.dumps({section: [[name, _to_json_value(value)] for name, value in fields]
+                           for section, fields in self._sections.items()})
+
+
+def find_drift(snapshots: Dict[str, DeviceSnapshot], reference: Optional[DeviceSnapshot] = None,
+               sections: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+    """
+    Function compares snapshots of many controllers with reference snapshot.
+    :param snapshots: dictionary with controller names (for example, URI) and their snapshots;
+    :param reference: reference snapshot, if None then the most common value of each section
+    is used as reference;
+    :param sections: names of sections to compare, by default all sections.
+    :return: dictionary with controller names and names of sections that differ from reference
+    (controllers without differences are not included).
+    """
+
+    if reference is not None:
+        reference_digests = reference.digests
+    else:
+        counts: Dict[str, Dict[str, int]] = {}
+        for snapshot in snapshots.values():
+            for section, digest in snapshot.digests.items():
+                section_counts = counts.setdefault(section, {})
+                section_counts[digest] = section_counts.get(digest, 0) + 1
+        reference_digests = {section: max(section_counts, key=section_counts.get)
+                             for section, section_counts in counts.items()}
+    if sections is not None:
+        sections = set(sections)
+        reference_digests = {section: digest for section, digest in reference_digests.items() if section in sections}
+
+    drift = {}
+    for name, snapshot in snapshots.items():
+        digests = snapshot.digests
+        differing = [section for section, digest in reference_digests.items() if digests.get(section) != digest]
+        if differing:
+            drift[name] = differing
+    return drift
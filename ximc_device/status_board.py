@@ -0,0 +1,320 @@
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ximc_device.telemetry import STEPS_DTYPE, USER_UNIT_DTYPE
+
+
+MAGIC = b"XIMCSTB1"
+# Header: magic bytes, number of slots, size of slot, number of devices, PID of writer and PID
+# of its resource tracker
+HEADER = struct.Struct("<8sIIIII")
+HEADER_SIZE = 64
+SEQUENCE = struct.Struct("<Q")
+URI_SIZE = 64
+
+
+def _get_struct(dtype: np.dtype) -> struct.Struct:
+    """
+    :param dtype: structured data type with channels of telemetry.
+    :return: packed little-endian structure with the same fields.
+    """
+
+    return struct.Struct("<" + "".join(dtype.fields[name][0].char for name in dtype.names))
+
+
+# Slot of device: sequence counter of seqlock, URI and the latest status in steps and in user unit.
+# Time of status is Unix time (time.time), so it can be compared in different processes
+STATUSES = {False: (STEPS_DTYPE.names, _get_struct(STEPS_DTYPE)),
+            True: (USER_UNIT_DTYPE.names, _get_struct(USER_UNIT_DTYPE))}
+STATUS_OFFSETS = {False: SEQUENCE.size + URI_SIZE, True: SEQUENCE.size + URI_SIZE + STATUSES[False][1].size}
+SLOT_SIZE = 192
+
+
+def _get_tracker_pid() -> int:
+    """
+    :return: PID of resource tracker started by this process, 0 if there is no tracker
+    (it is started only on POSIX) or tracker was inherited from parent process.
+    """
+
+    if os.name != "posix":
+        return 0
+    from multiprocessing import resource_tracker
+    return getattr(resource_tracker._resource_tracker, "_pid", None) or 0
+
+
+def _shares_tracker(writer_pid: int, tracker_pid: int) -> bool:
+    """
+    :param writer_pid: PID of writer process;
+    :param tracker_pid: PID of resource tracker of writer.
+    :return: True if this process uses resource tracker of writer: it is writer process,
+    its forked child (tracker PID is the same) or its spawned child (tracker is inherited
+    from parent).
+    """
+
+    from multiprocessing import resource_tracker
+    own_tracker_pid = _get_tracker_pid()
+    if own_tracker_pid:
+        return own_tracker_pid == tracker_pid
+    inherited = getattr(resource_tracker._resource_tracker, "_fd", None) is not None
+    return inherited and os.getppid() == writer_pid
+
+
+def _import_shared_memory():
+    """
+    :return: module multiprocessing.shared_memory.
+    """
+
+    try:
+        from multiprocessing import shared_memory
+    except ImportError as exc:
+        raise ImportError("Status board requires multiprocessing.shared_memory (Python 3.8+)") from exc
+    return shared_memory
+
+
+class StatusBoardWriter:
+    """
+    Shared memory block with the latest status of devices. The block is written by
+    the process that owns devices: device publishes every status it receives with
+    get_params or get_params_in_user_unit (see XimcDevice.set_status_board), so the
+    board does not add requests to controllers. Every slot is protected by seqlock:
+    writer makes sequence counter odd, writes status and makes counter even, readers
+    retry if counter was odd or has changed. Writer never waits for readers. Slot is
+    written only under command lock of its device, so there is one writer per slot.
+    """
+
+    SLOTS: int = 32
+
+    def __init__(self, name: Optional[str] = None, slots: Optional[int] = None) -> None:
+        """
+        :param name: name of shared memory block, by default random name is chosen;
+        :param slots: maximum number of devices.
+        """
+
+        shared_memory = _import_shared_memory()
+        slots = slots or self.SLOTS
+        self._memory = shared_memory.SharedMemory(name=name, create=True,
+                                                  size=HEADER_SIZE + slots * SLOT_SIZE)
+        self._memory.buf[:] = bytes(self._memory.size)
+        self._indexes: Dict[str, int] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._slots: int = slots
+        self._tracker_pid: int = _get_tracker_pid()
+        self._write_header()
+
+    def __enter__(self) -> "StatusBoardWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+        self.unlink()
+
+    @property
+    def devices(self) -> List[str]:
+        """
+        :return: URIs of devices on board.
+        """
+
+        return list(self._indexes)
+
+    @property
+    def name(self) -> str:
+        """
+        :return: name of shared memory block to open board in other processes.
+        """
+
+        return self._memory.name
+
+    def _write_header(self) -> None:
+        """
+        Method writes header of block: magic bytes, number of slots, size of slot, number of
+        devices, PID of writer and PID of resource tracker that destroys block if writer dies.
+        """
+
+        HEADER.pack_into(self._memory.buf, 0, MAGIC, self._slots, SLOT_SIZE, len(self._indexes), os.getpid(),
+                         self._tracker_pid)
+
+    def close(self) -> None:
+        """
+        Method closes access to block in this process, block remains available to readers.
+        """
+
+        self._memory.close()
+
+    def publish(self, device_uri: str, params: Dict[str, Any], in_user_unit: bool = False,
+                sample_time: Optional[float] = None) -> bool:
+        """
+        :param device_uri: URI of device;
+        :param params: parameters of controller returned by get_params or get_params_in_user_unit;
+        :param in_user_unit: if True then params are in user unit;
+        :param sample_time: Unix time of status, by default current time.
+        :return: False if device cannot be put on board (there is no free slot or URI is
+        too long), method does not raise, so it can be called in polling loop.
+        """
+
+        index = self._indexes.get(device_uri)
+        if index is None:
+            try:
+                index = self.register(device_uri)
+            except ValueError:
+                return False
+        if index < 0:
+            return False
+        names, layout = STATUSES[in_user_unit]
+        sample_time = time.time() if sample_time is None else sample_time
+        values = [sample_time if name == "time" else params.get(name, 0) for name in names]
+        offset = HEADER_SIZE + index * SLOT_SIZE
+        buffer = self._memory.buf
+        sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+        SEQUENCE.pack_into(buffer, offset, sequence + 1)
+        layout.pack_into(buffer, offset + STATUS_OFFSETS[in_user_unit], *values)
+        SEQUENCE.pack_into(buffer, offset, sequence + 2)
+        return True
+
+    def register(self, device_uri: str) -> int:
+        """
+        Method reserves slot for device.
+        :param device_uri: URI of device, it must not be longer than URI_SIZE bytes in UTF-8
+        (ValueError is raised otherwise).
+        :return: index of slot or -1 if there is no free slot.
+        """
+
+        index = self._indexes.get(device_uri)
+        if index is not None:
+            return index
+        uri = device_uri.encode("utf-8")
+        if len(uri) > URI_SIZE:
+            raise ValueError(f"URI {device_uri} is longer than {URI_SIZE} bytes")
+        with self._lock:
+            if device_uri in self._indexes:
+                return self._indexes[device_uri]
+            if len(self._indexes) >= self._slots:
+                return -1
+            index = len(self._indexes)
+            offset = HEADER_SIZE + index * SLOT_SIZE + SEQUENCE.size
+            self._memory.buf[offset:offset + len(uri)] = uri
+            self._indexes[device_uri] = index
+            # Number of devices is increased after slot is filled, so readers see only complete slots
+            self._write_header()
+        return index
+
+    def unlink(self) -> None:
+        """
+        Method destroys block, readers that have opened it keep their mapping.
+        """
+
+        self._memory.unlink()
+
+
+class StatusBoardReader:
+    """
+    Reader of status board created in other process. Reading does not block writer
+    and does not send requests to controllers.
+    """
+
+    RETRIES: int = 10000
+
+    def __init__(self, name: str) -> None:
+        """
+        :param name: name of shared memory block (see StatusBoardWriter.name).
+        """
+
+        shared_memory = _import_shared_memory()
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attached block is registered in resource tracker that
+            # destroys it when reader process exits. Registration is removed only from
+            # tracker of other process: reader in process of writer, in its forked or
+            # spawned child shares tracker with writer and must keep its registration
+            self._memory = shared_memory.SharedMemory(name=name)
+            writer_pid, tracker_pid = HEADER.unpack_from(self._memory.buf)[4:]
+            if os.name == "posix" and not _shares_tracker(writer_pid, tracker_pid):
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self._memory._name, "shared_memory")
+        magic, _, slot_size, _, _, _ = HEADER.unpack_from(self._memory.buf)
+        if magic != MAGIC or slot_size != SLOT_SIZE:
+            self._memory.close()
+            raise ValueError(f"Shared memory block {name} is not status board")
+        self._indexes: Dict[str, int] = {}
+
+    def __enter__(self) -> "StatusBoardReader":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @property
+    def devices(self) -> List[str]:
+        """
+        :return: URIs of devices on board.
+        """
+
+        self._update_indexes()
+        return list(self._indexes)
+
+    def _read_status(self, index: int, in_user_unit: bool) -> Optional[Tuple[Any, ...]]:
+        """
+        :param index: index of slot;
+        :param in_user_unit: if True then status in user unit is read.
+        :return: consistent values of status or None if writer changed slot RETRIES times in a row.
+        """
+
+        _, layout = STATUSES[in_user_unit]
+        offset = HEADER_SIZE + index * SLOT_SIZE
+        status_offset = offset + STATUS_OFFSETS[in_user_unit]
+        buffer = self._memory.buf
+        for _ in range(self.RETRIES):
+            before = SEQUENCE.unpack_from(buffer, offset)[0]
+            if before % 2:
+                continue
+            values = layout.unpack_from(buffer, status_offset)
+            if SEQUENCE.unpack_from(buffer, offset)[0] == before:
+                return values
+        return None
+
+    def _update_indexes(self) -> None:
+        """
+        Method reads URIs of devices added to board since the previous call.
+        """
+
+        count = HEADER.unpack_from(self._memory.buf)[3]
+        for index in range(len(self._indexes), count):
+            offset = HEADER_SIZE + index * SLOT_SIZE + SEQUENCE.size
+            uri = bytes(self._memory.buf[offset:offset + URI_SIZE]).rstrip(b"\0")
+            self._indexes[uri.decode("utf-8")] = index
+
+    def close(self) -> None:
+        """
+        Method closes access to block in this process.
+        """
+
+        self._memory.close()
+
+    def read(self, device_uri: str, in_user_unit: bool = False) -> Dict[str, Any]:
+        """
+        :param device_uri: URI of device;
+        :param in_user_unit: if True then status in user unit is returned.
+        :return: dictionary with the latest parameters of controller and Unix time of
+        status ("time"), empty dictionary if status has not been published.
+        """
+
+        if device_uri not in self._indexes:
+            self._update_indexes()
+        index = self._indexes.get(device_uri)
+        if index is None:
+            return {}
+        values = self._read_status(index, in_user_unit)
+        if values is None or not values[0]:
+            return {}
+        return dict(zip(STATUSES[in_user_unit][0], values))
+
+    def read_all(self, in_user_unit: bool = False) -> Dict[str, Dict[str, Any]]:
+        """
+        :param in_user_unit: if True then statuses in user unit are returned.
+        :return: dictionary with the latest parameters of all devices on board.
+        """
+
+        return {device_uri: self.read(device_uri, in_user_unit) for device_uri in self.devices}
@@ -0,0 +1,200 @@
+from typing import Any, Dict, List, Union
+import numpy as np
+
+
+# Channels of telemetry have the same names as parameters returned by get_params and get_params_in_user_unit
+STEPS_CHANNELS = [("moving_status", np.uint32),
+                  ("position", np.int32),
+                  ("u_position", np.int32),
+                  ("speed", np.int32),
+                  ("u_speed", np.int32),
+                  ("power_current", np.float64),
+                  ("power_voltage", np.float64),
+                  ("temperature", np.float64)]
+USER_UNIT_CHANNELS = [("moving_status", np.uint32),
+                      ("position", np.float64),
+                      ("speed", np.float64),
+                      ("power_current", np.float64),
+                      ("power_voltage", np.float64),
+                      ("temperature", np.float64)]
+STEPS_DTYPE = np.dtype([("time", np.float64)] + STEPS_CHANNELS)
+USER_UNIT_DTYPE = np.dtype([("time", np.float64)] + USER_UNIT_CHANNELS)
+
+
+class Telemetry:
+    """
+    Class for recorded telemetry. Every channel is stored in its own contiguous
+    array, so channels can be given to NumPy, pandas and Arrow without copying.
+    Slicing returns telemetry with views of the same arrays.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]) -> None:
+        """
+        :param columns: arrays of channels, all arrays must have the same length.
+        """
+
+        lengths = {len(column) for column in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("Channels of telemetry must have the same length")
+        self._columns: Dict[str, np.ndarray] = dict(columns)
+        self._length: int = lengths.pop() if lengths else 0
+
+    def __getitem__(self, key: Union[str, slice]) -> Union[np.ndarray, "Telemetry"]:
+        if isinstance(key, str):
+            return self._columns[key]
+        if isinstance(key, slice):
+            return Telemetry({name: column[key] for name, column in self._columns.items()})
+        raise TypeError("Telemetry can be indexed by channel name or slice")
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def channels(self) -> List[str]:
+        """
+        :return: names of channels.
+        """
+
+        return list(self._columns)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """
+        :return: structured data type of one sample.
+        """
+
+        return np.dtype([(name, column.dtype) for name, column in self._columns.items()])
+
+    @classmethod
+    def empty(cls, dtype: np.dtype, size: int) -> "Telemetry":
+        """
+        :param dtype: structured data type with channels;
+        :param size: number of samples.
+        :return: telemetry filled with zeros.
+        """
+
+        return cls({name: np.zeros(size, dtype=dtype.fields[name][0]) for name in dtype.names})
+
+    def copy(self) -> "Telemetry":
+        """
+        :return: telemetry with copied arrays.
+        """
+
+        return Telemetry({name: column.copy() for name, column in self._columns.items()})
+
+    def to_arrow(self):
+        """
+        :return: pyarrow.Table with buffers of channel arrays (numeric arrays are not copied).
+        """
+
+        try:
+            import pyarrow
+        except ImportError as exc:
+            raise ImportError("pyarrow is required to export telemetry to Arrow") from exc
+
+        columns = [np.ascontiguousarray(column) for column in self._columns.values()]
+        return pyarrow.Table.from_arrays([pyarrow.array(column) for column in columns], names=self.channels)
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        """
+        :return: dictionary with arrays of channels (arrays are not copied).
+        """
+
+        return dict(self._columns)
+
+    def to_pandas(self):
+        """
+        :return: pandas.DataFrame with columns that share memory with channel arrays.
+        """
+
+        try:
+            import pandas
+        except ImportError as exc:
+            raise ImportError("pandas is required to export telemetry to pandas") from exc
+
+        return pandas.DataFrame(self._columns, copy=False)
+
+
+class TelemetryBuffer:
+    """
+    Ring buffer for live telemetry. Each sample is written twice, to slot i and
+    slot i + capacity of arrays with double length, so the last samples always
+    occupy contiguous part of arrays and can be exported without copying.
+    Exported arrays are views of buffer: they are valid until the next sample is
+    appended, use Telemetry.copy to keep data.
+    """
+
+    CAPACITY: int = 10000
+
+    def __init__(self, dtype: np.dtype = USER_UNIT_DTYPE, capacity: int = None) -> None:
+        """
+        :param dtype: structured data type with channels (see STEPS_DTYPE and USER_UNIT_DTYPE);
+        :param capacity: maximum number of samples in buffer.
+        """
+
+        self._capacity: int = capacity or self.CAPACITY
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(2 * self._capacity, dtype=dtype.fields[name][0])
+                                                for name in dtype.names}
+        self._count: int = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+    @property
+    def capacity(self) -> int:
+        """
+        :return: maximum number of samples in buffer.
+        """
+
+        return self._capacity
+
+    def append(self, sample_time: float, params: Dict[str, Any]) -> None:
+        """
+        Method adds sample to buffer. If buffer is full, the oldest sample is dropped.
+        :param sample_time: time of sample;
+        :param params: parameters of controller, absent channels are filled with zeros.
+        """
+
+        index = self._count % self._capacity
+        for name, column in self._columns.items():
+            value = sample_time if name == "time" else params.get(name, 0)
+            column[index] = value
+            column[index + self._capacity] = value
+        self._count += 1
+
+    def clear(self) -> None:
+        """
+        Method removes all samples from buffer.
+        """
+
+        self._count = 0
+
+    def to_arrow(self):
+        """
+        :return: pyarrow.Table with samples of buffer (see Telemetry.to_arrow).
+        """
+
+        return self.view().to_arrow()
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        """
+        :return: dictionary with arrays of channels (see Telemetry.to_numpy).
+        """
+
+        return self.view().to_numpy()
+
+    def to_pandas(self):
+        """
+        :return: pandas.DataFrame with samples of buffer (see Telemetry.to_pandas).
+        """
+
+        return self.view().to_pandas()
+
+    def view(self) -> Telemetry:
+        """
+        :return: telemetry with samples in buffer from the oldest to the newest, arrays are views of buffer.
+        """
+
+        start = self._count % self._capacity if self._count > self._capacity else 0
+        end = start + len(self)
+        return Telemetry({name: column[start:end] for name, column in self._columns.items()})
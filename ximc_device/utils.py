@@ -1,4 +1,5 @@
 import ctypes
+import functools
 import os
 import sys
 from typing import Any, List, Tuple
@@ -42,9 +43,50 @@ def analyze_found_devices(devices_type_and_uri: List[Tuple[str, str]]) -> None:
     find_devices_of_given_type("xi-emu:", "Virtual", virtual_devices)
 
 
+def find_devices(enum_hints: str = "addr=", include_virtual: bool = True, verbose: bool = False
+                 ) -> List[Tuple[str, str]]:
+    """
+    Function searches for controllers without output of results.
+    :param enum_hints: hint string for enumeration of network controllers;
+    :param include_virtual: if True then virtual controller is added to list;
+    :param verbose: if True then information about enumeration is printed.
+    :return: list with types (real or virtual) and URI of found controllers.
+    """
+
+    # Set bindy (network) keyfile. Must be called before any call to "enumerate_devices" or "open_device" if you
+    # wish to use network-attached controllers. Accepts both absolute and relative paths, relative paths are resolved
+    # relative to the process working directory. If you do not need network devices then "set_bindy_key" is optional.
+    # In Python make sure to pass byte-array object to this function (b"string literal").
+    result = libximc.lib.set_bindy_key("keyfile.sqlite".encode("utf-8"))
+    if result != libximc.Result.Ok and verbose:
+        print_flush("keyfile not found")
+
+    # This is device search and enumeration with probing. It gives more information about devices
+    probe_flags = libximc.EnumerateFlags.ENUMERATE_PROBE + libximc.EnumerateFlags.ENUMERATE_NETWORK
+    devices = libximc.lib.enumerate_devices(probe_flags, enum_hints.encode())
+
+    device_count = libximc.lib.get_device_count(devices)
+    if verbose:
+        print_flush(f"Real device count: {device_count}")
+
+    controller_name = libximc.controller_name_t()
+    found_devices = []
+    for device_index in range(device_count):
+        device_name = libximc.lib.get_device_name(devices, device_index)
+        result = libximc.lib.get_enumerate_device_controller_name(devices, device_index, ctypes.byref(controller_name))
+        if result == libximc.Result.Ok:
+            found_devices.append(("real", device_name.decode()))
+    libximc.lib.free_enumerate_devices(devices)
+
+    if include_virtual and sys.version_info >= (3, 0):
+        found_devices.append(("virtual", get_virtual_device_uri()))
+    return found_devices
+
+
+@functools.lru_cache(maxsize=None)
 def get_libximc_version() -> str:
     """
-    :return: version of installed libximc module.
+    :return: version of installed libximc module (it is read once per process).
     """
 
     string_buffer = ctypes.create_string_buffer(64)
@@ -52,6 +94,14 @@ def get_libximc_version() -> str:
     return string_buffer.raw.decode().rstrip("\0")
 
 
+def get_virtual_device_uri() -> str:
+    """
+    :return: URI of virtual controller.
+    """
+
+    return f"xi-emu:///{_get_virtual_device_file()}"
+
+
 def print_device_info(device) -> None:
     """
     Output of information about the device.
@@ -90,35 +140,7 @@ def search_devices() -> List[Tuple[str, str]]:
     """
 
     print_flush("Searching for controllers...")
-    # Set bindy (network) keyfile. Must be called before any call to "enumerate_devices" or "open_device" if you
-    # wish to use network-attached controllers. Accepts both absolute and relative paths, relative paths are resolved
-    # relative to the process working directory. If you do not need network devices then "set_bindy_key" is optional.
-    # In Python make sure to pass byte-array object to this function (b"string literal").
-    result = libximc.lib.set_bindy_key("keyfile.sqlite".encode("utf-8"))
-    if result != libximc.Result.Ok:
-        print_flush("keyfile not found")
-
-    # This is device search and enumeration with probing. It gives more information about devices
-    probe_flags = libximc.EnumerateFlags.ENUMERATE_PROBE + libximc.EnumerateFlags.ENUMERATE_NETWORK
-    enum_hints = b"addr="  # use this hint string for broadcast enumerate
-    devices = libximc.lib.enumerate_devices(probe_flags, enum_hints)
-
-    device_count = libximc.lib.get_device_count(devices)
-    print_flush(f"Real device count: {device_count}")
-
-    controller_name = libximc.controller_name_t()
-    found_devices = []
-    for device_index in range(device_count):
-        device_name = libximc.lib.get_device_name(devices, device_index)
-        result = libximc.lib.get_enumerate_device_controller_name(devices, device_index, ctypes.byref(controller_name))
-        if result == libximc.Result.Ok:
-            found_devices.append(("real", device_name.decode()))
-
-    if sys.version_info >= (3, 0):
-        virtual_device_file = _get_virtual_device_file()
-        virtual_device_name = f"xi-emu:///{virtual_device_file}"
-        found_devices.append(("virtual", virtual_device_name))
-
+    found_devices = find_devices(verbose=True)
     analyze_found_devices(found_devices)
 
     if not found_devices:
@@ -0,0 +1,370 @@
+import bisect
+import configparser
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from ximc_device.group import DeviceGroup
+from ximc_device.motion import MVCMD_RUNNING
+
+
+class AlarmLimits(NamedTuple):
+    """
+    Alarm conditions of watchdog. Temperature is in °C, voltage in V, current in mA,
+    timeouts in seconds. None disables condition.
+    """
+
+    max_temperature: Optional[float] = None
+    max_power_voltage: Optional[float] = None
+    min_power_voltage: Optional[float] = None
+    max_power_current: Optional[float] = None
+    heartbeat_timeout: Optional[float] = None
+    status_timeout: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: Union[str, configparser.ConfigParser], margin: float = 0.9, **kwargs
+                    ) -> "AlarmLimits":
+        """
+        Method creates alarm conditions from [Maximum_ratings] section of controller
+        profile. Upper limits are multiplied by margin so that watchdog stops motion
+        before controller protection works.
+        :param config: path to profile or parsed profile;
+        :param margin: coefficient for upper limits;
+        :param kwargs: other fields of alarm conditions (for example, heartbeat_timeout).
+        :return: alarm conditions.
+        """
+
+        if isinstance(config, str):
+            path = config
+            config = configparser.ConfigParser()
+            if not config.read(path, encoding="utf-8"):
+                raise ValueError(f"Failed to read profile {path}")
+        ratings = config["Maximum_ratings"]
+        # Temperature is given in tenths of degree, voltage in tens of millivolts
+        fields = {"max_temperature": ratings.getint("Critical_temperature") / 10 * margin,
+                  "max_power_voltage": ratings.getint("Critical_voltage") / 100 * margin,
+                  "max_power_current": ratings.getint("Critical_current") * margin}
+        if ratings.getboolean("Low_voltage_protection", fallback=False):
+            fields["min_power_voltage"] = ratings.getint("Low_voltage_off") / 100
+        fields.update(kwargs)
+        return cls(**fields)
+
+
+class LatencyHistogram:
+    """
+    Thread-safe histogram of latencies with logarithmic buckets.
+    """
+
+    BOUNDS: Sequence[float] = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1)
+
+    def __init__(self, bounds: Optional[Sequence[float]] = None) -> None:
+        """
+        :param bounds: upper bounds of buckets in seconds, the last bucket holds greater latencies.
+        """
+
+        self._bounds: List[float] = sorted(bounds or self.BOUNDS)
+        self._counts: List[int] = [0] * (len(self._bounds) + 1)
+        self._lock: threading.Lock = threading.Lock()
+        self._max: float = 0
+        self._total: float = 0
+
+    @property
+    def count(self) -> int:
+        """
+        :return: number of measured latencies.
+        """
+
+        return sum(self._counts)
+
+    @property
+    def max(self) -> float:
+        """
+        :return: maximum latency in seconds.
+        """
+
+        return self._max
+
+    @property
+    def mean(self) -> float:
+        """
+        :return: mean latency in seconds.
+        """
+
+        count = self.count
+        return self._total / count if count else 0
+
+    def add(self, latency: float) -> None:
+        """
+        :param latency: latency in seconds.
+        """
+
+        with self._lock:
+            self._counts[bisect.bisect_left(self._bounds, latency)] += 1
+            self._max = max(self._max, latency)
+            self._total += latency
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        :return: dictionary with statistics and counts of buckets.
+        """
+
+        with self._lock:
+            counts = list(self._counts)
+        buckets = {f"<={bound * 1000:g}ms": count for bound, count in zip(self._bounds, counts)}
+        buckets[f">{self._bounds[-1] * 1000:g}ms"] = counts[-1]
+        return {"count": sum(counts),
+                "mean_ms": self.mean * 1000,
+                "max_ms": self._max * 1000,
+                "p50_ms": self.percentile(50) * 1000,
+                "p99_ms": self.percentile(99) * 1000,
+                "buckets": buckets}
+
+    def percentile(self, percent: float) -> float:
+        """
+        :param percent: percent of latencies (from 0 to 100).
+        :return: upper bound of bucket that contains given percentile (maximum latency
+        for the last bucket), so the estimate is not less than real percentile.
+        """
+
+        with self._lock:
+            counts = list(self._counts)
+        total = sum(counts)
+        if not total:
+            return 0
+        threshold = total * percent / 100
+        accumulated = 0
+        for bound, count in zip(self._bounds, counts):
+            accumulated += count
+            if accumulated >= threshold:
+                return min(bound, self._max)
+        return self._max
+
+    def reset(self) -> None:
+        """
+        Method removes all measurements.
+        """
+
+        with self._lock:
+            self._counts = [0] * (len(self._bounds) + 1)
+            self._max = 0
+            self._total = 0
+
+
+class Watchdog:
+    """
+    Class checks status of device (or all axes of DeviceGroup) in its own thread and
+    stops motion when alarm condition occurs: over-temperature, power voltage or
+    current out of limits, lost heartbeat of application or lost status of device.
+    Stop command is sent with emergency_stop method that does not wait for commands
+    of other threads. Heartbeat is checked before status requests, and status is read
+    with get_latest_params without waiting for command lock, so a device busy with long
+    command does not delay the stop. Duration of check cycles and latency from the
+    moment alarm condition became true to sent stop command are recorded in histograms.
+    """
+
+    PERIOD: float = 0.01
+
+    def __init__(self, device, limits: AlarmLimits, period: Optional[float] = None, immediate: bool = False,
+                 on_trip: Optional[Callable[[str], None]] = None) -> None:
+        """
+        :param device: device (XimcDevice or SimulatedDevice) or DeviceGroup, alarm of any axis stops all axes;
+        :param limits: alarm conditions;
+        :param period: period of status checks in seconds;
+        :param immediate: if True then motion is stopped immediately (command_stop), otherwise
+        smoothly (command_sstp);
+        :param on_trip: function to call with reason of alarm after motion is stopped (once per trip).
+        """
+
+        self._cycle_latency: LatencyHistogram = LatencyHistogram()
+        self._devices: List[Any] = list(device) if isinstance(device, DeviceGroup) else [device]
+        self._immediate: bool = immediate
+        self._last_feed: Optional[float] = None
+        self._limits: AlarmLimits = limits
+        self._on_trip: Optional[Callable[[str], None]] = on_trip
+        self._period: float = period or self.PERIOD
+        self._stop_event: threading.Event = threading.Event()
+        self._stop_latency: LatencyHistogram = LatencyHistogram()
+        self._thread: Optional[threading.Thread] = None
+        self._trips: int = 0
+        self._tripped: Optional[str] = None
+
+    @property
+    def cycle_latency(self) -> LatencyHistogram:
+        """
+        :return: histogram of durations of check cycles (status requests and checks of conditions).
+        """
+
+        return self._cycle_latency
+
+    @property
+    def stop_latency(self) -> LatencyHistogram:
+        """
+        :return: histogram of latencies from the moment alarm condition became true to sent stop commands.
+        """
+
+        return self._stop_latency
+
+    @property
+    def tripped(self) -> Optional[str]:
+        """
+        :return: reason of the last alarm or None if watchdog has not tripped since reset.
+        """
+
+        return self._tripped
+
+    @property
+    def trips(self) -> int:
+        """
+        :return: number of alarms.
+        """
+
+        return self._trips
+
+    def _check_params(self, params: Dict[str, Any]) -> Optional[str]:
+        """
+        :param params: parameters of controller returned by get_params.
+        :return: reason of alarm or None.
+        """
+
+        limits = self._limits
+        if limits.max_temperature is not None and params["temperature"] > limits.max_temperature:
+            return f"Temperature {params['temperature']} °C is above {limits.max_temperature} °C"
+        if limits.max_power_voltage is not None and params["power_voltage"] > limits.max_power_voltage:
+            return f"Power voltage {params['power_voltage']} V is above {limits.max_power_voltage} V"
+        if limits.min_power_voltage is not None and params["power_voltage"] < limits.min_power_voltage:
+            return f"Power voltage {params['power_voltage']} V is below {limits.min_power_voltage} V"
+        if limits.max_power_current is not None and params["power_current"] > limits.max_power_current:
+            return f"Power current {params['power_current']} mA is above {limits.max_power_current} mA"
+        return None
+
+    def _check_devices(self, last_status: List[float]) -> Tuple[Optional[str], float, bool]:
+        """
+        Method reads status of devices without waiting for commands of other threads
+        and checks alarm conditions.
+        :param last_status: moments of time.monotonic when statuses of devices were received, they are updated.
+        :return: reason of alarm or None, moment of time.monotonic when alarm condition
+        became true and True if any device moves or its status is lost.
+        """
+
+        reason = None
+        alarm_time = time.monotonic()
+        moving = False
+        for index, device in enumerate(self._devices):
+            params = device.get_latest_params(max_age=self._period, timeout=0)
+            now = time.monotonic()
+            if params:
+                last_status[index] = now
+                moving = moving or bool(params["moving_status"] & MVCMD_RUNNING)
+                if reason is None:
+                    reason = self._check_params(params)
+                    alarm_time = now
+            elif self._limits.status_timeout is not None and now - last_status[index] > self._limits.status_timeout:
+                if reason is None:
+                    reason = f"No status from {device.device_uri} for {now - last_status[index]:.3f} sec"
+                    alarm_time = last_status[index] + self._limits.status_timeout
+                moving = True
+        return reason, alarm_time, moving
+
+    def _check_heartbeat(self) -> Tuple[Optional[str], float]:
+        """
+        :return: reason of alarm or None if heartbeat is not lost, and moment of
+        time.monotonic when heartbeat was lost.
+        """
+
+        now = time.monotonic()
+        last_feed = self._last_feed
+        if self._limits.heartbeat_timeout is None or last_feed is None:
+            return None, now
+        lost_time = last_feed + self._limits.heartbeat_timeout
+        if now <= lost_time:
+            return None, now
+        return f"No heartbeat for {now - last_feed:.3f} sec", lost_time
+
+    def _stop(self, reason: str, alarm_time: float) -> None:
+        """
+        Method stops all devices and records latency. Stop is repeated while alarm holds
+        and device moves, but trip is counted once until reset.
+        :param reason: reason of alarm;
+        :param alarm_time: moment of time.monotonic when alarm condition became true.
+        """
+
+        for device in self._devices:
+            device.emergency_stop(self._immediate)
+        self._stop_latency.add(time.monotonic() - alarm_time)
+        is_new = self._tripped is None
+        self._tripped = reason
+        if is_new:
+            self._trips += 1
+            if self._on_trip:
+                self._on_trip(reason)
+
+    def feed(self) -> None:
+        """
+        Method gives heartbeat of application. Heartbeat is checked only after the
+        first call of this method.
+        """
+
+        self._last_feed = time.monotonic()
+
+    def reset(self) -> None:
+        """
+        Method clears alarm, so the next alarm is counted as new trip.
+        """
+
+        self._tripped = None
+
+    def run_thread(self) -> None:
+        """
+        Method checks alarm conditions with fixed period. While alarm condition holds,
+        motion is stopped every time device is found moving.
+        """
+
+        last_status = [time.monotonic()] * len(self._devices)
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            cycle_start = time.monotonic()
+            # Heartbeat does not depend on devices, so its loss stops motion before status requests
+            reason, alarm_time = self._check_heartbeat()
+            stopped = bool(reason) and self._tripped is None
+            if stopped:
+                self._stop(reason, alarm_time)
+            device_reason, device_alarm_time, moving = self._check_devices(last_status)
+            if reason is None:
+                reason, alarm_time = device_reason, device_alarm_time
+            detected = time.monotonic()
+            self._cycle_latency.add(detected - cycle_start)
+            if reason and not stopped and (self._tripped is None or moving):
+                # Repeated stop of the same trip is counted from the moment motion was found
+                self._stop(reason, alarm_time if self._tripped is None else detected)
+            next_time += self._period
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                next_time = time.monotonic()
+            else:
+                self._stop_event.wait(delay)
+
+    def start_thread(self) -> None:
+        """
+        Method starts thread of watchdog.
+        """
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run_thread, name="ximc_watchdog", daemon=True)
+        self._thread.start()
+
+    def stop_thread(self) -> None:
+        """
+        Method stops thread of watchdog.
+        """
+
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def trip(self, reason: str = "Manual stop") -> None:
+        """
+        Method stops motion at once as if alarm condition occurred.
+        :param reason: reason of stop.
+        """
+
+        self._stop(reason, time.monotonic())